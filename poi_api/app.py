@@ -8,11 +8,17 @@ from flask_cors import CORS
 import logging 
 # --- 修改以下所有同包导入为相对导入 ---
 from .config import config_by_name
-from .extensions import db, bcrypt, limiter
+from .extensions import db, bcrypt, limiter, spatial_index, search_cache, request_coalescer, auth_cache, tile_cache, cluster_index
 from .models import User, Role, POI, APIKey # 确保 models.py 中没有其他导入问题
 from .resources.auth import auth_ns         # 假设 auth_ns 是在 resources/auth.py 中定义的
 from .resources.poi import poi_ns           # 假设 poi_ns 是在 resources/poi.py 中定义的
 from .errors import register_error_handlers, register_app_error_handlers # 确保 errors.py 内部导入也正确
+from .indexes import rebuild_indexes, ensure_indexes, on_snapshot_published, apply_changes
+from .snapshot import snapshot_store
+from .changes import change_feed
+from .cli import poi_cli
+from .schema import upgrade_schema
+from .utils import recent_apikey_revocations
 
 def create_app(config_name='dev'):
     # ---- 在函数最开始添加打印语句 ----
@@ -40,6 +46,20 @@ def create_app(config_name='dev'):
     db.init_app(app)
     bcrypt.init_app(app)
     limiter.init_app(app)
+    spatial_index.init_app(app)
+    search_cache.init_app(app)
+    request_coalescer.init_app(app)
+    auth_cache.init_app(app)
+    auth_cache.set_revocation_loader(recent_apikey_revocations) # 按撤销记录清除其他 worker 删除的 API Key
+    tile_cache.init_app(app)
+    cluster_index.init_app(app)
+    snapshot_store.init_app(app)
+    if not app.config.get('INDEX_BUILD_ON_STARTUP', True):
+        # 需在变更日志轮询之前注册: 先整体构建索引, 轮询再从构建时的序号开始
+        app.before_request(ensure_indexes)
+    snapshot_store.add_listener(on_snapshot_published) # 其他 worker 发布了新快照文件时重建本进程的内存索引
+    change_feed.init_app(app)
+    change_feed.add_listener(apply_changes) # 按变更日志增量应用其他 worker 的写入
 
     # API 定义
     # ... (这部分代码应该没问题，但如果它也从本地模块导入，确保那些导入也遵循规则)
@@ -72,6 +92,7 @@ def create_app(config_name='dev'):
     api.add_namespace(poi_ns, path='/pois')
 
     app.register_blueprint(api_bp)
+    app.cli.add_command(poi_cli)
 
     app.logger.info(f"--- DEBUG: API 蓝图已注册到 {api_bp.url_prefix} ---")
     app.logger.debug(f"--- DEBUG: 当前已注册路由规则: {list(app.url_map.iter_rules())} ---")
@@ -91,6 +112,9 @@ def create_app(config_name='dev'):
     # 创建数据库表和初始数据
     with app.app_context():
         db.create_all()
+        # create_all 不会修改已有的表, 给旧版本创建的表补上新增的列和索引
+        for statement in upgrade_schema():
+            app.logger.info(f"Schema upgraded: {statement}")
         if Role.query.filter_by(name='admin').first() is None:
             db.session.add(Role(name='admin'))
             app.logger.info("Created 'admin' role.")
@@ -108,6 +132,11 @@ def create_app(config_name='dev'):
                 db.session.commit()
                 app.logger.info("Created default admin user: admin@example.com / adminpassword")
                 app.logger.info("--- DEBUG: create_app 函数即将返回 app 实例 ---")
+
+        # 从 pois 表构建内存空间索引和名称索引; 命令行启动时推迟到首次请求 (见 INDEX_BUILD_ON_STARTUP)
+        if app.config.get('INDEX_BUILD_ON_STARTUP', True):
+            count = rebuild_indexes()
+            app.logger.info(f"POI indexes built with {count} POIs.")
     return app
 
 # 如果你打算直接运行 app.py (例如 python poi_api/app.py)，则需要以下代码块
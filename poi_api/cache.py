@@ -0,0 +1,346 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from .errors import BusinessException
+
+try: # 可选依赖: 使用 redis:// 后端时需要
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryCacheBackend:
+    """进程内 LRU + TTL 缓存后端"""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (过期时间, value)
+        self._generation = 0        # 每次 clear() 递增
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def generation(self):
+        return self._generation
+
+    def set(self, key, value, generation=None):
+        """写入缓存; generation 非空且已被 clear() 越过时不写入"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """移除条目, 返回条目是否存在"""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCacheBackend:
+    """Redis 协议缓存后端, 多个 worker 共享同一份缓存。
+
+    失效时只递增一个代数 (generation) 计数器, 旧代数的键不再被访问, 由 TTL 自然过期,
+    因此失效操作是 O(1) 的, 并且对所有 worker 同时生效。
+    """
+
+    def __init__(self, url, ttl=60, prefix='poi_api:cache:'):
+        if redis is None:
+            raise RuntimeError("使用 redis:// 缓存后端需要安装 redis 包")
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def generation(self):
+        return int(self._client.get(f"{self.prefix}generation") or 0)
+
+    def get(self, key):
+        raw = self._client.get(f"{self.prefix}{self.generation()}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, generation=None):
+        """写入缓存; 指定 generation 时写入该代数, 已失效的代数不会再被读取"""
+        if generation is None:
+            generation = self.generation()
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        self._client.set(f"{self.prefix}{generation}:{key}", raw, ex=self.ttl)
+
+    def clear(self):
+        self._client.incr(f"{self.prefix}generation")
+
+    def __len__(self):
+        return 0 # 共享后端不统计条目数
+
+
+class QueryCache:
+    """公众查询接口的结果缓存, 后端由 SEARCH_CACHE_URI 配置 (memory:// 或 redis://...)。
+
+    缓存键由归一化后的查询参数生成; 管理员写接口提交后调用 invalidate() 清空缓存。
+    计算结果前先取 generation(), 写入时带上该代数: 计算期间发生过失效的结果不会写回缓存。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.backend = MemoryCacheBackend()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SEARCH_CACHE_ENABLED', True)
+        uri = app.config.get('SEARCH_CACHE_URI', 'memory://')
+        ttl = app.config.get('SEARCH_CACHE_TTL', 60)
+        if uri.startswith('redis://') or uri.startswith('rediss://'):
+            self.backend = RedisCacheBackend(uri, ttl=ttl)
+        else:
+            self.backend = MemoryCacheBackend(max_entries=app.config.get('SEARCH_CACHE_MAX_ENTRIES', 1024), ttl=ttl)
+        app.extensions['poi_query_cache'] = self
+
+    @staticmethod
+    def make_key(namespace, args):
+        """由接口名和归一化后的参数字典生成缓存键"""
+        items = {k: v for k, v in args.items() if v is not None}
+        raw = json.dumps(items, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return f"{namespace}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def generation(self):
+        return self.backend.generation()
+
+    def set(self, key, value, generation=None):
+        if self.enabled:
+            self.backend.set(key, value, generation)
+
+    def invalidate(self):
+        self.backend.clear()
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'backend': type(self.backend).__name__,
+                'entries': len(self.backend),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """请求合并 (single-flight): 同一个键同时只执行一次计算。
+
+    第一个到达的请求 (leader) 执行计算, 同时到达的相同请求 (follower) 等待并共享其结果或异常;
+    结果应为编码后的响应内容, follower 不再重复序列化。follower 等待超过 timeout 秒后以 503 失败,
+    不自行计算: leader 变慢时通常是数据库繁忙, 让等待的请求一齐重新查询只会加重负载。
+    """
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+        self.leaders = 0
+        self.collapsed = 0
+        self.timeouts = 0
+
+    def init_app(self, app):
+        self.timeout = app.config.get('SINGLEFLIGHT_TIMEOUT', self.timeout)
+        app.extensions['poi_singleflight'] = self
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            if not call.event.wait(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise BusinessException("相同的查询正在执行, 等待超时, 请稍后重试", status_code=503,
+                                        error_code="REQUEST_COALESCE_TIMEOUT")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'leaders': self.leaders,
+                'collapsed': self.collapsed,
+                'timeouts': self.timeouts,
+                'in_flight': len(self._calls),
+            }
+
+
+class AuthCache:
+    """认证信息缓存: API Key -> user_id, user_id -> 用户快照 (Principal)。
+
+    只缓存认证成功的结果; 删除 API Key 时本进程立即使对应条目失效, 其他 worker 每隔 revocation_interval 秒
+    (在请求开始时) 调用 set_revocation_loader 注册的 loader(window) 读取最近 window 秒内撤销的 API Key 并清除对应条目。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.ttl = 60
+        self.revocation_interval = 1.0
+        self._keys = MemoryCacheBackend(max_entries=4096, ttl=60)
+        self._users = MemoryCacheBackend(max_entries=4096, ttl=60)
+        self._revocation_loader = None
+        self._polled_at = 0.0
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db_queries = 0
+        self.revocations = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('AUTH_CACHE_ENABLED', True)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', 60)
+        self.revocation_interval = app.config.get('AUTH_CACHE_REVOCATION_POLL_INTERVAL', self.revocation_interval)
+        max_entries = app.config.get('AUTH_CACHE_MAX_ENTRIES', 4096)
+        self._keys = MemoryCacheBackend(max_entries=max_entries, ttl=self.ttl)
+        self._users = MemoryCacheBackend(max_entries=max_entries, ttl=self.ttl)
+        if self.enabled and self.revocation_interval:
+            app.before_request(self.poll_revocations_if_due)
+        app.extensions['poi_auth_cache'] = self
+
+    def set_revocation_loader(self, loader):
+        self._revocation_loader = loader
+
+    @property
+    def revocation_window(self):
+        """需要读取的撤销记录的时间范围 (秒): 更早撤销的 Key 即使曾被缓存也已过期, 多留一个 TTL 容忍各机器的时钟偏差"""
+        return 2 * self.ttl + self.revocation_interval
+
+    def poll_revocations_if_due(self):
+        if self._revocation_loader is None or time.monotonic() - self._polled_at < self.revocation_interval \
+                or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._polled_at = time.monotonic()
+            # 撤销很少发生, 每次读取时间窗口内的全部记录, 不依赖序号连续; 重复清除已清除的条目没有影响
+            for key_value in self._revocation_loader(self.revocation_window):
+                if self._keys.pop(key_value):
+                    with self._lock:
+                        self.revocations += 1
+        except Exception:
+            current_app.logger.exception('API Key 撤销记录轮询失败')
+        finally:
+            self._poll_lock.release()
+
+    def _count(self, hit, queries=0):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.db_queries += queries
+
+    def get_user(self, user_id, loader):
+        """按 user_id 取用户快照, 未命中时调用 loader(user_id) 查询数据库"""
+        principal = self._users.get(user_id) if self.enabled else None
+        if principal is not None:
+            self._count(True)
+            return principal
+        principal = loader(user_id)
+        self._count(False, queries=1)
+        if principal is not None and self.enabled:
+            self._users.set(user_id, principal)
+        return principal
+
+    def get_apikey_user(self, key_value, loader):
+        """按 API Key 取用户快照, 未命中时调用 loader(key_value) 查询数据库"""
+        user_id = self._keys.get(key_value) if self.enabled else None
+        if user_id is not None:
+            principal = self._users.get(user_id)
+            if principal is not None:
+                self._count(True)
+                return principal
+        principal = loader(key_value)
+        self._count(False, queries=1)
+        if principal is not None and self.enabled:
+            self._keys.set(key_value, principal.id)
+            self._users.set(principal.id, principal)
+        return principal
+
+    def invalidate_apikey(self, key_value):
+        self._keys.pop(key_value)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'db_queries': self.db_queries,
+                'db_queries_per_lookup': round(self.db_queries / lookups, 4) if lookups else 0.0,
+                'revocations': self.revocations,
+            }
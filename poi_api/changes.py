@@ -0,0 +1,227 @@
+import datetime
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import DateTime, event, func, insert, select
+
+from .extensions import db
+from .models import POIChange
+
+# POI 变更日志的写入、读取与进程内轮询。
+# 写接口在提交前调用 record_changes, 日志与 POI 的修改在同一事务中提交;
+# GET /pois/changes 与各 worker 的 ChangeFeed 都通过 read_changes 按变更序号增量读取。
+
+_PENDING_KEY = 'poi_change_seqs' # 会话 info 中尚未提交的变更序号
+
+
+def db_utcnow(dialect_name):
+    """数据库时钟的当前 UTC 时间 (不带时区): 变更时间与空缺等待都以数据库时钟为准, 不受各应用服务器时钟偏差影响"""
+    if dialect_name == 'postgresql': # now() 是事务开始时间, 长事务中会偏早
+        return func.timezone('UTC', func.clock_timestamp(), type_=DateTime)
+    if dialect_name == 'mysql':
+        return func.utc_timestamp(type_=DateTime)
+    if dialect_name == 'sqlite': # CURRENT_TIMESTAMP 只精确到秒
+        return func.strftime('%Y-%m-%d %H:%M:%f', 'now', type_=DateTime)
+    return func.current_timestamp(type_=DateTime)
+
+
+def _dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def record_changes(entries):
+    """在当前事务中写入变更日志, entries 为 (poi_id, op, version) 序列, 返回分配的变更序号"""
+    rows = [{'poi_id': poi_id, 'op': op, 'version': version} for poi_id, op, version in entries]
+    if not rows:
+        return []
+    stmt = insert(POIChange).values(changed_on=db_utcnow(_dialect_name()))
+    seqs = db.session.scalars(stmt.returning(POIChange.id, sort_by_parameter_order=True), rows).all()
+    db.session.info.setdefault(_PENDING_KEY, []).extend(seqs)
+    return seqs
+
+
+def record_change(poi_id, op, version):
+    return record_changes([(poi_id, op, version)])[0]
+
+
+def record_reset():
+    """批量导入等无法逐条记录的写入: 记录一条 reset, 消费者收到后整体重新载入"""
+    return record_change(None, 'reset', None)
+
+
+def latest_change_seq():
+    return db.session.scalar(select(func.max(POIChange.id))) or 0
+
+
+def read_changes(since, limit=500, gap_wait=5.0, skipped=None):
+    """读取序号大于 since 的变更, 返回 (变更列表, 下一次的 since, 是否还有更多, 是否需要整体重新载入)。
+
+    序号在插入时分配, 事务的提交顺序可能与序号不同: 遇到序号空缺且空缺之后的变更写入 (按数据库时钟) 不足
+    gap_wait 秒时, 停在空缺之前等待该事务提交; 更早的空缺视为已回滚的事务, skipped 非空时把跳过的序号追加到其中,
+    供 ChangeFeed 检查其后是否又提交了 (见 ChangeFeed.check_late)。since 之后的日志已被清理时返回 reset,
+    此时变更列表为空, 下一次的 since 为当前最新的序号, 消费者应整体重新载入后从该序号继续。
+    """
+    rows = db.session.execute(
+        select(POIChange.id, POIChange.poi_id, POIChange.op, POIChange.version, POIChange.changed_on)
+        .where(POIChange.id > since).order_by(POIChange.id).limit(limit + 1)).all()
+    if since > 0 and rows and rows[0].id > since + 1:
+        oldest = db.session.scalar(select(func.min(POIChange.id)))
+        if oldest is not None and oldest >= rows[0].id:
+            return [], latest_change_seq(), False, True
+    has_more = len(rows) > limit
+    changes, expected = [], since + 1
+    if rows and rows[-1].id - since > len(rows): # 有空缺时才需要数据库时间
+        waited_since = db.session.scalar(select(db_utcnow(_dialect_name()))) - datetime.timedelta(seconds=gap_wait)
+    for row in rows[:limit]:
+        if row.id != expected:
+            if row.changed_on > waited_since:
+                has_more = False
+                break
+            if skipped is not None:
+                skipped.extend(range(expected, row.id))
+        changes.append({'seq': row.id, 'poi_id': row.poi_id, 'op': row.op, 'version': row.version,
+                        'changed_on': row.changed_on.isoformat()})
+        expected = row.id + 1
+    return changes, expected - 1, has_more, False
+
+
+class ChangeFeed:
+    """进程内的变更日志轮询。
+
+    每隔 interval 秒 (在请求开始时检查, 同一时刻只有一个线程轮询) 读取 position 之后的变更,
+    跳过本进程自己提交的变更, 把其余变更交给 add_listener 注册的回调 callback(changes, position) 增量应用。
+    position 为本进程内存索引已包含的最大变更序号, 整体重建索引时由 reset() 重新设定。
+    read_changes 视为已回滚而跳过的序号会在 late_horizon 秒内被记住, 期间发现其实是晚提交的事务时 (check_late)
+    写入一条 reset, 本进程与所有消费者都整体重新载入, 不会永久漏掉这些变更。
+    """
+
+    def __init__(self):
+        self.interval = 1.0
+        self.gap_wait = 5.0
+        self.batch_size = 1000
+        self.late_horizon = 600.0
+        self.position = 0
+        self.polls = 0
+        self.applied = 0
+        self._local = set()    # 本进程已提交、尚未被轮询越过的变更序号
+        self._skipped = {}     # 视为已回滚而跳过的序号 -> 跳过的时间 (monotonic)
+        self.late = 0
+        self._resets = 0
+        self._polled_at = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config.get('CHANGE_FEED_POLL_INTERVAL', self.interval)
+        self.gap_wait = app.config.get('CHANGE_FEED_GAP_WAIT', self.gap_wait)
+        self.batch_size = app.config.get('CHANGE_FEED_BATCH_SIZE', self.batch_size)
+        self.late_horizon = app.config.get('CHANGE_FEED_LATE_HORIZON', self.late_horizon)
+        if not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+        if self.interval:
+            app.before_request(self.poll_if_due)
+        app.extensions['poi_change_feed'] = self
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _after_commit(self, session):
+        seqs = session.info.pop(_PENDING_KEY, None)
+        if seqs:
+            with self._lock:
+                self._local.update(seqs)
+
+    def _after_rollback(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    def reset(self, position):
+        """内存索引已整体重建到 position 时调用"""
+        with self._lock:
+            self.position = position
+            self._local = {seq for seq in self._local if seq > position}
+            self._resets += 1
+
+    def covers(self, seq):
+        """本进程的内存索引是否已包含序号 seq 及之前的全部变更"""
+        return seq is not None and seq <= self.position
+
+    def poll_if_due(self):
+        if time.monotonic() - self._polled_at < self.interval or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._polled_at = time.monotonic()
+            self.poll()
+        except Exception:
+            current_app.logger.exception('变更日志轮询失败')
+        finally:
+            self._poll_lock.release()
+
+    def check_late(self):
+        """检查跳过的序号是否在之后提交了; 有则确保其后有一条 reset, 需要本进程整体重建时返回 True"""
+        with self._lock:
+            expired = time.monotonic() - self.late_horizon
+            for seq in [seq for seq, skipped_at in self._skipped.items() if skipped_at < expired]:
+                del self._skipped[seq]
+            skipped = sorted(self._skipped)
+        late = []
+        for i in range(0, len(skipped), 500):
+            late += db.session.scalars(select(POIChange.id).where(POIChange.id.in_(skipped[i:i + 500]))).all()
+        if not late:
+            return False
+        with self._lock:
+            for seq in late:
+                self._skipped.pop(seq, None)
+            self.late += len(late)
+        current_app.logger.warning('变更 %s 在被视为已回滚后才提交 (事务耗时超过 CHANGE_FEED_GAP_WAIT), '
+                                   '记录 reset 让所有消费者整体重新载入', late)
+        if db.session.scalar(select(POIChange.id).where(POIChange.op == 'reset', POIChange.id > max(late)).limit(1)):
+            return False # 其他 worker 已记录 reset, 轮询读到它时整体重建
+        with db.engine.begin() as connection: # 单独的事务, 不影响当前请求的会话
+            seq = connection.scalar(insert(POIChange).values(op='reset', changed_on=db_utcnow(connection.dialect.name))
+                                    .returning(POIChange.id))
+        with self._lock:
+            self._local.add(seq) # 本进程直接整体重建, 轮询到这条 reset 时不再重复
+        return True
+
+    def poll(self):
+        """读取并应用 position 之后的变更 (需在应用上下文中调用), 返回应用的变更数"""
+        with self._lock:
+            start, resets = self.position, self._resets
+        skipped = []
+        changes, position, _, reset = read_changes(start, self.batch_size, self.gap_wait, skipped)
+        with self._lock:
+            remote = [change for change in changes if change['seq'] not in self._local]
+            now = time.monotonic()
+            self._skipped.update((seq, now) for seq in skipped)
+        if self._skipped and self.check_late():
+            reset = True
+        if reset:
+            remote = [{'seq': position, 'poi_id': None, 'op': 'reset', 'version': None, 'changed_on': None}]
+        self.polls += 1
+        if remote:
+            for callback in self._listeners:
+                callback(remote, position)
+        with self._lock:
+            if self._resets == resets: # 回调中整体重建了索引时, 以重建时设定的 position 为准
+                self.position = max(self.position, position)
+            self._local = {seq for seq in self._local if seq > self.position}
+            self.applied += len(remote)
+        return len(remote)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': bool(self.interval),
+                'position': self.position,
+                'polls': self.polls,
+                'applied': self.applied,
+                'pending_local': len(self._local),
+                'late': self.late,
+            }
+
+
+# 依赖 models, 与 snapshot_store 一样不放在 extensions 中, 由 create_app 调用 init_app
+change_feed = ChangeFeed()
@@ -0,0 +1,159 @@
+import datetime
+import json
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .extensions import db
+from .models import POIChange
+from .importer import open_source, iter_features, import_features, sync_features, RejectLog
+from .dedup import find_duplicates, merge_proposal
+from .schema import upgrade_schema
+from .changes import change_feed
+from .snapshot import snapshot_store, write_snapshot_file, open_snapshot_file
+
+# POI 数据维护命令, 用法: flask --app poi_api.app poi <命令>
+poi_cli = AppGroup('poi', help='POI 数据导入与维护命令')
+
+# 未指定 --workers 时, 超过该大小的文件使用多进程校验
+PARALLEL_IMPORT_MIN_BYTES = 64 * 1024 * 1024
+
+
+@poi_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True, help='每批写入的行数')
+@click.option('--truncate', is_flag=True, help='导入前清空 pois 表')
+@click.option('--sync', is_flag=True, help='增量同步: 只写入新增、变化和已删除的行')
+@click.option('--no-prune', is_flag=True, help='增量同步时保留本次数据中已不存在的行')
+@click.option('--workers', type=int, default=None, help='坐标校验进程数, 0 为不使用进程池; 默认大文件使用全部 CPU')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False), default=None,
+              help='被拒绝 feature 的 NDJSON 旁路文件, 默认为 <PATH>.rejects.ndjson')
+def import_command(path, batch_size, truncate, sync, no_prune, workers, rejects_path):
+    """流式导入 GeoJSON FeatureCollection (支持 .gz) 到 pois 表"""
+    if sync and truncate:
+        raise click.UsageError("--sync 与 --truncate 不能同时使用")
+    if workers is None:
+        workers = (os.cpu_count() or 1) if os.path.getsize(path) >= PARALLEL_IMPORT_MIN_BYTES else 0
+    reject_log = RejectLog(rejects_path or f"{path}.rejects.ndjson")
+    def progress(stats):
+        click.echo(f"  已处理 {stats.read} 个 feature, {stats.rows_per_second:,.0f} rows/s")
+
+    try:
+        with open_source(path) as fp:
+            if sync:
+                stats = sync_features(iter_features(fp), batch_size=batch_size, prune=not no_prune, progress=progress,
+                                      workers=workers, on_reject=reject_log)
+            else:
+                stats = import_features(iter_features(fp), batch_size=batch_size, progress=progress,
+                                        workers=workers, on_reject=reject_log, truncate=truncate)
+    finally:
+        reject_log.close()
+    if sync:
+        click.echo(f"同步完成: 读取 {stats.read} 个 feature, 新增 {stats.inserted} 行, 更新 {stats.updated} 行, "
+                   f"删除 {stats.deleted} 行, 未变化 {stats.unchanged} 行, 跳过 {stats.skipped} 行, "
+                   f"重复 {stats.duplicates} 行")
+    else:
+        if truncate:
+            click.echo(f"已清空 pois 表 ({stats.deleted} 行)")
+        click.echo(f"导入完成: 读取 {stats.read} 个 feature, 写入 {stats.inserted} 行, 跳过 {stats.skipped} 行")
+    if reject_log.count:
+        reasons = ', '.join(f"{reason} {count}" for reason, count in stats.reject_reasons.most_common())
+        click.echo(f"拒绝 {reject_log.count} 个 feature ({reasons}), 明细见 {reject_log.path}")
+    click.echo(f"用时 {stats.elapsed:.2f}s (数据库 {stats.db_elapsed * 1000:.1f}ms), {stats.rows_per_second:,.0f} rows/s")
+    _announce_changes()
+
+
+def _announce_changes():
+    """批量写入后: 配置了快照文件时重新发布; 运行中的进程通过变更日志轮询自动更新内存索引, 关闭轮询时提示重启"""
+    if snapshot_store.path:
+        rows = snapshot_store.publish()
+        click.echo(f"已重新发布快照文件 {snapshot_store.path} ({rows} 行)")
+    if change_feed.interval:
+        click.echo("运行中的 API 进程将通过变更日志轮询自动更新内存索引")
+    else:
+        click.echo("变更日志轮询已关闭 (CHANGE_FEED_POLL_INTERVAL=0), 正在运行的 API 进程需重启以重建内存索引")
+
+
+@poi_cli.command('upgrade-schema')
+@click.option('--dry-run', is_flag=True, help='只输出需要执行的 DDL, 不修改数据库')
+def upgrade_schema_command(dry_run):
+    """给旧版本创建的表补上新增的列和索引 (应用启动时也会自动执行)"""
+    statements = upgrade_schema(dry_run=dry_run)
+    for statement in statements:
+        click.echo(f"{statement};")
+    if not statements:
+        click.echo("数据库结构已是最新")
+    elif not dry_run:
+        click.echo(f"已执行 {len(statements)} 条 DDL")
+
+
+@poi_cli.command('dedup')
+@click.option('--radius', 'radius_m', default=200.0, show_default=True, help='视为同一地点的最大距离 (米)')
+@click.option('--threshold', default=0.75, show_default=True, help='输出合并建议的名称相似度下限')
+@click.option('--merge-above', type=float, default=None, help='自动合并组内最高相似度不低于该值的重复组')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='把全部合并建议写入 JSON 文件')
+def dedup_command(radius_m, threshold, merge_above, output):
+    """检测近似重复的 POI (距离相近且名称相似), 输出合并建议或自动合并"""
+    started = time.perf_counter()
+    proposals = find_duplicates(radius_m=radius_m, threshold=threshold)
+    click.echo(f"发现 {len(proposals)} 组近似重复, 涉及 {sum(len(p['merge_ids']) + 1 for p in proposals)} 个 POI, "
+               f"用时 {time.perf_counter() - started:.2f}s")
+    for proposal in proposals[:10]:
+        names = ' / '.join(proposal['names'].values())
+        click.echo(f"  保留 {proposal['keep_id']}, 合并 {proposal['merge_ids']}: {names}")
+    if output:
+        with open(output, 'w', encoding='utf-8') as fp:
+            json.dump(proposals, fp, ensure_ascii=False, indent=2)
+        click.echo(f"合并建议已写入 {output}")
+
+    if merge_above is not None:
+        merged = skipped = 0
+        for proposal in proposals:
+            if max(pair['score'] for pair in proposal['pairs']) < merge_above:
+                continue
+            deleted = merge_proposal(proposal)
+            if deleted:
+                merged += deleted
+            else:
+                skipped += 1
+        db.session.commit()
+        click.echo(f"自动合并删除 {merged} 个重复 POI, {skipped} 组因包含多条数据源记录而跳过")
+        _announce_changes()
+
+
+snapshot_cli = AppGroup('snapshot', help='列式快照文件命令')
+poi_cli.add_command(snapshot_cli)
+
+
+@snapshot_cli.command('build')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='快照文件路径, 默认为配置的 SNAPSHOT_FILE')
+def snapshot_build_command(output):
+    """从 pois 表构建二进制快照文件 (原子替换, 运行中的进程会自动载入新文件)"""
+    output = output or snapshot_store.path
+    if not output:
+        raise click.UsageError("未配置 SNAPSHOT_FILE, 请用 --output 指定快照文件路径")
+    started = time.perf_counter()
+    snapshot = snapshot_store.build()
+    write_snapshot_file(snapshot, output)
+    snapshot, _ = open_snapshot_file(output) # 读回校验
+    click.echo(f"快照文件已写入 {output}: {len(snapshot)} 行, {os.path.getsize(output) / 1024 / 1024:.1f} MiB, "
+               f"用时 {time.perf_counter() - started:.2f}s")
+
+
+changes_cli = AppGroup('changes', help='POI 变更日志命令')
+poi_cli.add_command(changes_cli)
+
+
+@changes_cli.command('prune')
+@click.option('--days', type=float, default=None, help='保留最近多少天的变更, 默认为配置的 CHANGE_LOG_RETENTION_DAYS')
+def changes_prune_command(days):
+    """清理过期的变更日志 (since 早于清理范围的消费者会收到 reset, 需整体重新载入)"""
+    if days is None:
+        days = current_app.config.get('CHANGE_LOG_RETENTION_DAYS', 7)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    deleted = db.session.query(POIChange).filter(POIChange.changed_on < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f"已清理 {deleted} 条 {days:g} 天前的变更日志")
@@ -0,0 +1,149 @@
+import math
+import threading
+
+import numpy as np
+
+from .tiles import world_xy
+
+# 低缩放级别地图的点聚合: 在 Web 墨卡托上按缩放级别预先建立分层网格,
+# 每个网格单元按类别 (景区等级) 保存 [数量, 经度和, 纬度和, id 和], 查询时只读取视野内的单元, 不扫描 POI。
+
+
+class ClusterGrid:
+    """分层网格聚合索引。
+
+    第 z 层的单元边长为 z 级地图上的 cell_px 像素 (256 像素瓦片), 与矢量瓦片使用同一套墨卡托坐标。
+    每个 POI 在每一层各计入一个单元; 写入时只需对旧坐标所在单元做减法、对新坐标所在单元做加法,
+    代价为 O(层数)。单元内只有一个点时, id 和即为该点的 POI ID。
+    """
+
+    def __init__(self, max_zoom=16, cell_px=64):
+        self.max_zoom = max_zoom
+        self.cell_px = cell_px
+        self.ready = False
+        self._lock = threading.RLock()
+        self._points = {}  # poi_id -> (lon, lat, category)
+        self._levels = [{} for _ in range(max_zoom + 1)]  # 每层: 单元键 -> {category: [数量, 经度和, 纬度和, id 和]}
+
+    def init_app(self, app):
+        self.max_zoom = app.config.get('CLUSTER_MAX_ZOOM', self.max_zoom)
+        self.cell_px = app.config.get('CLUSTER_CELL_PX', self.cell_px)
+        self._levels = [{} for _ in range(self.max_zoom + 1)]
+        app.extensions['poi_cluster_index'] = self
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cells_per_axis(self, z):
+        return (2 ** z) * 256 // self.cell_px
+
+    def _cell_keys(self, lons, lats, z):
+        """各点在第 z 层的单元键 (cx * 每轴单元数 + cy)"""
+        n = self._cells_per_axis(z)
+        scale = 256 / self.cell_px
+        wx, wy = world_xy(lons, lats, z)
+        cx = np.clip(np.floor(wx * scale), 0, n - 1).astype(np.int64)
+        cy = np.clip(np.floor(wy * scale), 0, n - 1).astype(np.int64)
+        return cx * n + cy
+
+    def rebuild(self, rows):
+        """用 (id, lon, lat, category) 序列整体重建"""
+        points = {poi_id: (lon, lat, category or None) for poi_id, lon, lat, category in rows
+                  if lon is not None and lat is not None}
+        levels = [{} for _ in range(self.max_zoom + 1)]
+        if points:
+            ids = np.fromiter(points.keys(), dtype=np.int64, count=len(points))
+            lons = np.fromiter((p[0] for p in points.values()), dtype=np.float64, count=len(points))
+            lats = np.fromiter((p[1] for p in points.values()), dtype=np.float64, count=len(points))
+            categories, codes = np.unique([p[2] or '' for p in points.values()], return_inverse=True)
+            categories = [category or None for category in categories.tolist()]
+            for z, cells in enumerate(levels):
+                keys = self._cell_keys(lons, lats, z) * len(categories) + codes
+                groups, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+                sum_lons = np.bincount(inverse, weights=lons)
+                sum_lats = np.bincount(inverse, weights=lats)
+                sum_ids = np.bincount(inverse, weights=ids) # float64 对 2^53 以内的 id 和是精确的
+                for group, count, sum_lon, sum_lat, sum_id in zip(groups.tolist(), counts.tolist(), sum_lons.tolist(),
+                                                                  sum_lats.tolist(), sum_ids.tolist()):
+                    key, code = divmod(group, len(categories))
+                    cells.setdefault(key, {})[categories[code]] = [count, sum_lon, sum_lat, int(sum_id)]
+        with self._lock:
+            self._points, self._levels = points, levels
+            self.ready = True
+
+    def _apply(self, poi_id, point, sign):
+        lon, lat, category = point
+        lons, lats = np.array([lon]), np.array([lat])
+        for z, cells in enumerate(self._levels):
+            key = int(self._cell_keys(lons, lats, z)[0])
+            stats = cells.setdefault(key, {}).setdefault(category, [0, 0.0, 0.0, 0])
+            stats[0] += sign
+            stats[1] += sign * lon
+            stats[2] += sign * lat
+            stats[3] += sign * poi_id
+            if stats[0] <= 0:
+                del cells[key][category]
+                if not cells[key]:
+                    del cells[key]
+
+    def upsert(self, poi_id, lon, lat, category):
+        category = category or None
+        with self._lock:
+            old = self._points.pop(poi_id, None)
+            if old == (lon, lat, category):
+                self._points[poi_id] = old
+                return
+            if old is not None:
+                self._apply(poi_id, old, -1)
+            if lon is None or lat is None:
+                return
+            self._points[poi_id] = (lon, lat, category)
+            self._apply(poi_id, self._points[poi_id], 1)
+
+    def remove(self, poi_id):
+        with self._lock:
+            old = self._points.pop(poi_id, None)
+            if old is not None:
+                self._apply(poi_id, old, -1)
+
+    def query(self, zoom, min_lon, min_lat, max_lon, max_lat, categories=None, breakdown=False):
+        """返回 (实际使用的层级, 视野内各单元的聚合结果列表), 每项为 {longitude, latitude, count, poi_id, breakdown}。
+
+        zoom 超过 max_zoom 时使用最细的一层; categories 非空时只统计这些类别; 结果按数量从多到少排列。
+        """
+        z = min(max(int(zoom), 0), self.max_zoom)
+        n = self._cells_per_axis(z)
+        scale = 256 / self.cell_px
+        wx, wy = world_xy(np.array([min_lon, max_lon]), np.array([max_lat, min_lat]), z)
+        cx0, cx1 = (min(max(math.floor(v * scale), 0), n - 1) for v in wx.tolist())
+        cy0, cy1 = (min(max(math.floor(v * scale), 0), n - 1) for v in wy.tolist())
+        clusters = []
+        with self._lock:
+            cells = self._levels[z]
+            # 视野覆盖的单元数多于非空单元数时, 直接遍历非空单元更省
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+                keys = [key for key in cells if cx0 <= key // n <= cx1 and cy0 <= key % n <= cy1]
+            else:
+                keys = [cx * n + cy for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if cx * n + cy in cells]
+            for key in keys:
+                count, sum_lon, sum_lat, sum_id = 0, 0.0, 0.0, 0
+                counts = {}
+                for category, stats in cells[key].items():
+                    if categories and category not in categories:
+                        continue
+                    count += stats[0]
+                    sum_lon += stats[1]
+                    sum_lat += stats[2]
+                    sum_id += stats[3]
+                    counts[category or '其他'] = stats[0]
+                if not count:
+                    continue
+                clusters.append({
+                    'longitude': round(sum_lon / count, 6),
+                    'latitude': round(sum_lat / count, 6),
+                    'count': count,
+                    'poi_id': sum_id if count == 1 else None,
+                    'breakdown': counts if breakdown else None,
+                })
+        clusters.sort(key=lambda c: -c['count'])
+        return z, clusters
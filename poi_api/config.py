@@ -12,6 +12,64 @@ class Config:
     
     # API 限流配置 (示例: 每分钟5次针对特定接口)
     RATELIMIT_STORAGE_URI = "memory://" # 或者使用 redis: "redis://localhost:6379/0"
+
+    # 内存空间索引的网格单元大小 (度)
+    SPATIAL_GRID_CELL_DEG = 0.25
+    # 启动时从 pois 表构建内存索引 (空间网格、名称索引、聚合、分面等)。经 flask 命令行启动时 (flask poi import 等
+    # 维护命令不需要这些索引, 也包括 flask run) 默认推迟到首次请求, 避免导入前先把整张表载入内存
+    INDEX_BUILD_ON_STARTUP = os.environ.get('FLASK_RUN_FROM_CLI') != 'true'
+
+    # 查询结果缓存: memory:// 为进程内 LRU, 多 worker 共享可使用 "redis://localhost:6379/1"
+    SEARCH_CACHE_ENABLED = True
+    SEARCH_CACHE_URI = "memory://"
+    SEARCH_CACHE_TTL = 60 # 秒
+    SEARCH_CACHE_MAX_ENTRIES = 1024
+    # 拉框查询的边界向外对齐到该网格 (度), 使相近的地图视野共用缓存 (只在扩出部分没有 POI 时对齐); 0 表示不对齐
+    SEARCH_CACHE_BBOX_SNAP_DEG = 0.001
+
+    # 相同查询并发到达时, 等待正在执行的那次计算的最长时间 (秒), 超时后返回 503 (不自行查询)
+    SINGLEFLIGHT_TIMEOUT = 5.0
+
+    # API Key / JWT 用户解析缓存, 删除 API Key 时本进程立即失效
+    AUTH_CACHE_ENABLED = True
+    AUTH_CACHE_TTL = 60 # 秒
+    AUTH_CACHE_MAX_ENTRIES = 4096
+    # 其他进程每隔该秒数 (在请求开始时) 读取 API Key 撤销记录并清除缓存条目, 0 表示不轮询 (最多延迟 TTL 秒)
+    AUTH_CACHE_REVOCATION_POLL_INTERVAL = 1.0
+
+    # POI 矢量瓦片: 缩放级别不超过 TILE_THIN_MAX_ZOOM 时按 TILE_THIN_GRID x TILE_THIN_GRID 网格抽稀
+    TILE_MAX_ZOOM = 18
+    TILE_EXTENT = 4096
+    TILE_THIN_MAX_ZOOM = 10
+    TILE_THIN_GRID = 64
+    # 瓦片缓存: 进程内 LRU, 设置 TILE_CACHE_DIR 时同时写入磁盘; POI 写入后只失效受影响的瓦片
+    TILE_CACHE_ENABLED = True
+    TILE_CACHE_MAX_ENTRIES = 4096
+    TILE_CACHE_TTL = 86400 # 秒
+    TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR')
+
+    # 点聚合分层网格: 第 z 层单元为 z 级地图上 CLUSTER_CELL_PX 像素见方, 更高的缩放级别使用第 CLUSTER_MAX_ZOOM 层
+    CLUSTER_MAX_ZOOM = 16
+    CLUSTER_CELL_PX = 64
+
+    # 列式只读快照: 启用后 /search 与 POI 详情在内存快照上查询, 不访问数据库; 写入后下一次读取时重新载入
+    SNAPSHOT_ENABLED = os.environ.get('SNAPSHOT_ENABLED', '').lower() in ('1', 'true', 'yes')
+    # 快照最长使用时间 (秒), 使未处理写请求的其他 worker 也能看到变更; 0 表示只在本进程写入后重新载入
+    SNAPSHOT_MAX_AGE = 30
+    # 快照文件路径: 配置后启用快照, 各 worker 以 mmap 共享快照的列数据 (其余内存索引仍由各 worker 自行构建), 写入后由写入方重新发布
+    SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE') or None
+    # 文件模式下检查快照文件是否被替换的间隔 (秒), 取代 SNAPSHOT_MAX_AGE
+    SNAPSHOT_CHECK_INTERVAL = 1.0
+
+    # 变更日志轮询: 每个 worker 每隔 CHANGE_FEED_POLL_INTERVAL 秒 (在请求开始时) 读取其他进程的写入并增量更新内存索引, 0 表示不轮询
+    CHANGE_FEED_POLL_INTERVAL = 1.0
+    # 变更序号出现空缺时等待未提交事务的最长时间 (秒, 按数据库时钟), 超过后视为已回滚
+    CHANGE_FEED_GAP_WAIT = 5.0
+    # 视为已回滚的序号在该时间 (秒) 内若又提交了, 记录 reset 让所有消费者整体重新载入
+    CHANGE_FEED_LATE_HORIZON = 600.0
+    CHANGE_FEED_BATCH_SIZE = 1000
+    # 变更日志保留天数, 由 flask poi changes prune 清理
+    CHANGE_LOG_RETENTION_DAYS = 7
     
     # 业务错误代码前缀
     SERVICE_ERROR_CODE_PREFIX = "POI_API_"
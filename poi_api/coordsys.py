@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+
+# 国内坐标系转换 (向量化): BD-09 (百度) -> GCJ-02 (国测局) -> WGS-84。
+# 参数均为同形状的 numpy 数组 (经度, 纬度), 返回新数组; 中国境外的点 GCJ-02 与 WGS-84 相同, 不做偏移。
+
+_X_PI = math.pi * 3000.0 / 180.0
+_KRASOVSKY_A = 6378245.0
+_KRASOVSKY_EE = 0.00669342162296594323
+
+# 中国大致范围 (经度 min, 纬度 min, 经度 max, 纬度 max)
+CHINA_BOUNDS = (73.5, 3.8, 135.1, 53.6)
+
+
+def in_china(lons, lats):
+    min_lon, min_lat, max_lon, max_lat = CHINA_BOUNDS
+    return (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+
+
+def bd09_to_gcj02(lons, lats):
+    x, y = lons - 0.0065, lats - 0.006
+    z = np.sqrt(x * x + y * y) - 0.00002 * np.sin(y * _X_PI)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * _X_PI)
+    return z * np.cos(theta), z * np.sin(theta)
+
+
+def _gcj02_offset(lons, lats):
+    x, y = lons - 105.0, lats - 35.0
+    common = (20.0 * np.sin(6.0 * x * np.pi) + 20.0 * np.sin(2.0 * x * np.pi)) * 2.0 / 3.0
+    dlat = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * np.sqrt(np.abs(x)) + common
+    dlat += (20.0 * np.sin(y * np.pi) + 40.0 * np.sin(y / 3.0 * np.pi)) * 2.0 / 3.0
+    dlat += (160.0 * np.sin(y / 12.0 * np.pi) + 320.0 * np.sin(y * np.pi / 30.0)) * 2.0 / 3.0
+    dlon = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * np.sqrt(np.abs(x)) + common
+    dlon += (20.0 * np.sin(x * np.pi) + 40.0 * np.sin(x / 3.0 * np.pi)) * 2.0 / 3.0
+    dlon += (150.0 * np.sin(x / 12.0 * np.pi) + 300.0 * np.sin(x / 30.0 * np.pi)) * 2.0 / 3.0
+
+    rad_lat = np.radians(lats)
+    magic = 1 - _KRASOVSKY_EE * np.sin(rad_lat) ** 2
+    sqrt_magic = np.sqrt(magic)
+    dlat = (dlat * 180.0) / ((_KRASOVSKY_A * (1 - _KRASOVSKY_EE)) / (magic * sqrt_magic) * np.pi)
+    dlon = (dlon * 180.0) / (_KRASOVSKY_A / sqrt_magic * np.cos(rad_lat) * np.pi)
+    return np.where(in_china(lons, lats), dlon, 0.0), np.where(in_china(lons, lats), dlat, 0.0)
+
+
+def gcj02_to_wgs84(lons, lats, iterations=2):
+    """GCJ-02 -> WGS-84, 用迭代逼近加密偏移的逆, 两次迭代误差在厘米级"""
+    wgs_lons, wgs_lats = lons, lats
+    for _ in range(iterations):
+        dlon, dlat = _gcj02_offset(wgs_lons, wgs_lats)
+        wgs_lons, wgs_lats = lons - dlon, lats - dlat
+    return wgs_lons, wgs_lats
+
+
+def bd09_to_wgs84(lons, lats):
+    return gcj02_to_wgs84(*bd09_to_gcj02(lons, lats))
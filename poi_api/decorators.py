@@ -1,5 +1,6 @@
 from functools import wraps
 from flask import request, current_app, g
+from flask_limiter.util import get_remote_address
 from .utils import decode_token, get_user_from_payload, get_user_by_apikey
 from .errors import BusinessException
 from .extensions import limiter
@@ -63,16 +64,19 @@ def apikey_required(f):
 # 装饰器：API 限流 (可以根据 API Key 或 IP)
 # rate_limit_string: e.g., "5/minute", "100/hour"
 # key_func: a callable that returns the identifier for the rate limit (e.g., lambda: g.current_apikey)
-def rate_limit_decorator(rate_limit_string, key_prefix="rl_"):
+# cost: 单次请求计入的次数, 可以是整数或在请求上下文中计算权重的 callable (用于批量接口)
+def rate_limit_decorator(rate_limit_string, key_prefix="rl_", cost=1):
+    # 限流规则只创建一次: Resource.method_decorators 会在每次请求时重新应用装饰器,
+    # 若在 decorator 内部调用 limiter.limit, 每次请求都会向 limiter 注册一条新的规则
+    # key_func 必须在请求上下文中才能正确获取 g.current_apikey
+    route_limit = limiter.limit(rate_limit_string, key_func=lambda: g.get('current_apikey', get_remote_address()),
+                                error_message="Rate limit exceeded. Please try again later.", cost=cost)
+
     def decorator(f):
-        # 将限流应用到函数上
-        # 注意：limiter.limit 返回的是一个装饰器工厂
-        # 我们需要直接调用它来获取实际的装饰器，然后应用到函数 f
-        # key_func 必须在请求上下文中才能正确获取 g.current_apikey
-        
+        # 先 wraps 再交给 limiter: limiter 按被装饰函数的限定名 (如 POISearchPublic.get) 区分规则,
+        # 否则所有接口都会以 rate_limited_function 的名义共用同一组规则和计数
+        @route_limit
         @wraps(f)
-        @limiter.limit(rate_limit_string, key_func=lambda: g.get('current_apikey', get_remote_address()),
-                       error_message="Rate limit exceeded. Please try again later.")
         def rate_limited_function(*args, **kwargs):
             # 如果限流检查通过，limiter 会自动调用被装饰的函数 f
             # 如果超限，limiter 会抛出 RateLimitExceeded 异常，会被全局错误处理器捕获或显示默认信息
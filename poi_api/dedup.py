@@ -0,0 +1,169 @@
+import math
+import re
+
+import numpy as np
+
+from .extensions import db
+from .models import POI
+from .changes import record_changes
+from .spatial import EARTH_RADIUS_KM, haversine_pairs_km
+from .textindex import normalize_text
+
+# 近似重复 POI 检测: 先用空间网格分块, 只比较距离在 radius_km 以内的点对, 再按名称相似度打分,
+# 最后用并查集把高分点对合并成重复组, 输出合并建议或自动合并。
+
+# 比较名称前去掉的通用后缀, 如 "XX风景名胜区" 与 "XX景区" 视为同名
+GENERIC_SUFFIXES = ('风景名胜区', '旅游度假区', '旅游风景区', '旅游景区', '风景区', '旅游区', '度假区', '景区', '景点')
+_PUNCTUATION = re.compile(r"[\s·・.,，、'\"“”‘’()（）\[\]【】<>《》\-—_]+")
+
+# 合并时从重复项补全到保留项的字段 (保留项为空时才补)
+MERGE_FILL_FIELDS = ('address', 'city', 'province', 'category', 'description', 'image_url', 'website_url')
+
+
+def core_name(name):
+    """去掉标点和通用后缀后的名称主体"""
+    text = _PUNCTUATION.sub('', normalize_text(name))
+    for suffix in GENERIC_SUFFIXES:
+        if text.endswith(suffix) and len(text) > len(suffix) + 1:
+            return text[:-len(suffix)]
+    return text
+
+
+def _grams(text):
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def name_similarity(a, b):
+    """名称主体的二字组 Dice 系数, 取值 0~1"""
+    a, b = core_name(a), core_name(b)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    grams_a, grams_b = _grams(a), _grams(b)
+    return 2.0 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def candidate_pairs(lats, lons, radius_km):
+    """空间网格分块找出距离不超过 radius_km 的所有点对, 返回 (i, j, 距离公里) 三个数组, 且 i、j 为输入下标。
+
+    网格单元的边长不小于 radius_km, 因此每个点只需与本单元及相邻单元比较; 每对单元只比较一次
+    (本单元和 "右上半" 的 4 个相邻单元)。全部计算用 numpy 完成, 没有逐点的 Python 循环。
+    """
+    n = len(lats)
+    empty = np.empty(0, dtype=np.int64)
+    if n < 2:
+        return empty, empty, np.empty(0)
+    cell_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    max_abs_lat = min(float(np.abs(lats).max()), 89.0)
+    cell_lon = cell_lat / math.cos(math.radians(max_abs_lat))
+    cy = np.floor(lats / cell_lat).astype(np.int64)
+    cx = np.floor(lons / cell_lon).astype(np.int64)
+    cy -= cy.min() - 1
+    span = int(cy.max()) + 2
+    keys = cx * span + cy
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    positions = np.arange(n)
+    pair_i, pair_j = [], []
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        target = sorted_keys + dx * span + dy
+        hi = np.searchsorted(sorted_keys, target, side='right')
+        lo = positions + 1 if dx == 0 and dy == 0 else np.searchsorted(sorted_keys, target, side='left')
+        counts = np.maximum(hi - lo, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+        starts = np.repeat(lo, counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_i.append(order[np.repeat(positions, counts)])
+        pair_j.append(order[starts + within])
+    if not pair_i:
+        return empty, empty, np.empty(0)
+    i, j = np.concatenate(pair_i), np.concatenate(pair_j)
+    dists = haversine_pairs_km(lats[i], lons[i], lats[j], lons[j])
+    close = dists <= radius_km
+    return i[close], j[close], dists[close]
+
+
+def _groups(pairs):
+    """并查集: 把点对连成重复组"""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for x in parent:
+        groups.setdefault(find(x), []).append(x)
+    return list(groups.values())
+
+
+def find_duplicates(radius_m=200, threshold=0.75):
+    """扫描 pois 表找出近似重复组, 返回合并建议列表 (需在应用上下文中调用)。
+
+    每条建议包含保留项 keep_id、待合并的 merge_ids, 以及组内各点对的名称相似度和距离;
+    保留项优先选来自数据源的行 (有 source_id), 以免下次增量同步又把它导入回来, 其次选 id 最小的。
+    """
+    rows = db.session.query(POI.id, POI.name, POI.longitude, POI.latitude, POI.source_id).all()
+    if not rows:
+        return []
+    ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+    lons = np.fromiter((row.longitude for row in rows), dtype=np.float64, count=len(rows))
+    lats = np.fromiter((row.latitude for row in rows), dtype=np.float64, count=len(rows))
+    i, j, dists = candidate_pairs(lats, lons, radius_m / 1000.0)
+
+    matches = []
+    for a, b, dist in zip(i.tolist(), j.tolist(), dists.tolist()):
+        score = name_similarity(rows[a].name, rows[b].name)
+        if score >= threshold:
+            matches.append((a, b, score, dist))
+
+    proposals = []
+    for members in _groups((a, b) for a, b, _, _ in matches):
+        keep = min(members, key=lambda m: (rows[m].source_id is None, rows[m].id))
+        member_set = set(members)
+        proposals.append({
+            'keep_id': int(ids[keep]),
+            'merge_ids': sorted(int(ids[m]) for m in members if m != keep),
+            'names': {int(ids[m]): rows[m].name for m in members},
+            'sourced': sum(rows[m].source_id is not None for m in members),
+            'pairs': [{'ids': [int(ids[a]), int(ids[b])], 'score': round(score, 3), 'distance_m': round(dist * 1000, 1)}
+                      for a, b, score, dist in matches if a in member_set],
+        })
+    proposals.sort(key=lambda p: -max(pair['score'] for pair in p['pairs']))
+    return proposals
+
+
+def merge_proposal(proposal):
+    """执行一条合并建议: 用重复项补全保留项的空字段后删除重复项并记录变更日志, 返回删除的行数。
+
+    组内有多条来自数据源的行时不合并 (下次增量同步会重新导入被删除的行), 返回 0。调用方负责提交事务。
+    """
+    if proposal['sourced'] > 1:
+        return 0
+    keep = db.session.get(POI, proposal['keep_id'])
+    duplicates = POI.query.filter(POI.id.in_(proposal['merge_ids'])).order_by(POI.id).all()
+    if keep is None or not duplicates:
+        return 0
+    for duplicate in duplicates:
+        for field in MERGE_FILL_FIELDS:
+            if not getattr(keep, field) and getattr(duplicate, field):
+                setattr(keep, field, getattr(duplicate, field))
+        keep.has_image = bool(keep.has_image or duplicate.has_image)
+        keep.has_website = bool(keep.has_website or duplicate.has_website)
+        db.session.delete(duplicate)
+    keep.version += 1
+    record_changes([(keep.id, 'update', keep.version)] + [(duplicate.id, 'delete', duplicate.version) for duplicate in duplicates])
+    return len(duplicates)
@@ -1,3 +1,4 @@
+import copy
 from flask_restx import fields
 
 # 基础响应模型
@@ -63,6 +64,7 @@ poi_output_dto = {
     **poi_base_dto_fields,
     'created_on': fields.DateTime(description='创建时间'),
     'updated_on': fields.DateTime(description='更新时间'),
+    'version': fields.Integer(description='版本号, 每次修改递增 (响应头 ETag 与之对应)'),
 }
 
 poi_input_dto = { # 用于创建和更新
@@ -80,13 +82,208 @@ poi_input_dto = { # 用于创建和更新
     'website_url': fields.String(description='官网主页地址', example="[https://www.dpm.org.cn/](https://www.dpm.org.cn/)")
 }
 
+def _optional(dto):
+    """复制 DTO 并把所有字段改为非必填, 用于部分更新"""
+    optional = {}
+    for name, field in dto.items():
+        field = copy.copy(field)
+        field.required = False
+        optional[name] = field
+    return optional
+
+poi_patch_input_dto = _optional(poi_input_dto) # 用于部分更新 (PATCH)
+
+poi_batch_operation_dto = {
+    'op': fields.String(required=True, enum=['create', 'update', 'delete'], description='操作类型'),
+    'id': fields.Integer(description='POI的ID (update/delete 时必填)'),
+    'data': fields.Raw(description='POI字段, 按 POIInput 校验 (create 时必填全部必填字段, update 只需要修改的字段)'),
+}
+
+poi_batch_input_dto = {
+    'operations': fields.List(fields.Nested(poi_batch_operation_dto), required=True, description='操作列表 (最多5000项)'),
+    'atomic': fields.Boolean(default=True, description='为 true 时任意一项失败则整批不生效; 为 false 时分块提交, 失败项单独报告'),
+}
+
+poi_batch_result_dto = {
+    'index': fields.Integer(description='操作在请求中的序号'),
+    'op': fields.String(description='操作类型'),
+    'id': fields.Integer(description='POI的ID (create 成功时为新ID)'),
+    'status': fields.String(description='ok、error, 或 skipped (原子模式下因其他项无效而未执行)'),
+    'error_code': fields.String(description='失败时的错误代码'),
+    'message': fields.String(description='失败原因'),
+}
+
+poi_batch_response_dto = {
+    **base_response_model,
+    'results': fields.List(fields.Nested(poi_batch_result_dto)),
+    'created': fields.Integer(description='创建数量'),
+    'updated': fields.Integer(description='更新数量'),
+    'deleted': fields.Integer(description='删除数量'),
+    'failed': fields.Integer(description='失败数量'),
+}
+
+poi_search_item_dto = {
+    **poi_output_dto,
+    'distance_m': fields.Float(description='到查询中心点的大圆距离 (米, 仅圆形查询时返回)'),
+}
+
 poi_list_response_dto = {
     **base_response_model,
-    'pois': fields.List(fields.Nested(poi_output_dto)),
-    'total': fields.Integer(description='总数'),
-    'page': fields.Integer(description='当前页码'),
+    'pois': fields.List(fields.Nested(poi_search_item_dto)),
+    'total': fields.Integer(description='总数 (include_total=false 时为空)'),
+    'total_estimated': fields.Boolean(description='total 是否为估计值'),
+    'page': fields.Integer(description='当前页码 (游标分页时为空)'),
     'pages': fields.Integer(description='总页数'),
-    'per_page': fields.Integer(description='每页数量')
+    'per_page': fields.Integer(description='每页数量'),
+    'next_cursor': fields.String(description='下一页游标, 没有更多数据时为空'),
+    'facets': fields.Raw(description='分面计数 (请求 facets= 时返回), 如 {"province": {"北京": 245}}; 每个分面忽略自身字段的筛选条件')
+}
+
+poi_nearest_response_dto = {
+    **base_response_model,
+    'pois': fields.List(fields.Nested(poi_search_item_dto), description='按距离由近到远排列的POI'),
+    'count': fields.Integer(description='返回数量')
+}
+
+point_input_dto = {
+    'lat': fields.Float(required=True, description='纬度', example=39.916345),
+    'lon': fields.Float(required=True, description='经度', example=116.397155),
+}
+
+poi_nearest_batch_input_dto = {
+    'points': fields.List(fields.Nested(point_input_dto), required=True, description='查询点列表 (最多10000个)'),
+    'k': fields.Integer(description='每个查询点返回的最近POI数量 (默认1, 最大20)', default=1),
+    'max_km': fields.Float(description='最大搜索距离 (公里, 可选)'),
+}
+
+poi_neighbor_dto = {
+    'id': fields.Integer(description='POI唯一标识符'),
+    'name': fields.String(description='POI名称'),
+    'latitude': fields.Float(description='纬度'),
+    'longitude': fields.Float(description='经度'),
+    'category': fields.String(description='POI类别'),
+    'distance_m': fields.Float(description='到查询点的大圆距离 (米)'),
+}
+
+poi_nearest_batch_response_dto = {
+    **base_response_model,
+    'results': fields.List(fields.Nested({
+        'index': fields.Integer(description='查询点在请求中的序号'),
+        'pois': fields.List(fields.Nested(poi_neighbor_dto), description='按距离由近到远排列的POI'),
+    })),
+    'count': fields.Integer(description='查询点数量')
+}
+
+poi_suggestion_dto = {
+    'id': fields.Integer(description='POI唯一标识符'),
+    'name': fields.String(description='POI名称'),
+    'category': fields.String(description='POI类别 (景区等级)'),
+    'province': fields.String(description='省份'),
+}
+
+poi_suggest_response_dto = {
+    **base_response_model,
+    'suggestions': fields.List(fields.Nested(poi_suggestion_dto), description='联想结果, 高等级优先')
+}
+
+poi_change_dto = {
+    'seq': fields.Integer(description='变更序号 (单调递增)'),
+    'poi_id': fields.Integer(description='POI ID, reset 时为空'),
+    'op': fields.String(description='insert / update / delete / reset (批量导入, 需整体重新载入)'),
+    'version': fields.Integer(description='变更后的版本号, 删除时为删除前的版本号'),
+    'changed_on': fields.String(description='变更时间 (UTC, ISO 8601)'),
+}
+
+poi_changes_response_dto = {
+    **base_response_model,
+    'changes': fields.List(fields.Nested(poi_change_dto), description='按序号排列的变更'),
+    'next_since': fields.Integer(description='下一次请求使用的 since'),
+    'has_more': fields.Boolean(description='是否还有更多变更可以立即读取'),
+    'reset': fields.Boolean(description='since 之后的日志已被清理, 需整体重新载入后从 next_since 继续'),
+}
+
+poi_cluster_dto = {
+    'longitude': fields.Float(description='单元内POI的平均经度'),
+    'latitude': fields.Float(description='单元内POI的平均纬度'),
+    'count': fields.Integer(description='单元内POI数量'),
+    'poi_id': fields.Integer(description='单元内只有一个POI时为其ID, 否则为空'),
+    'breakdown': fields.Raw(description='按景区等级的数量, 如 {"5A": 3, "4A": 12} (breakdown=true 时返回)'),
+}
+
+poi_cluster_response_dto = {
+    **base_response_model,
+    'zoom': fields.Integer(description='实际使用的聚合层级'),
+    'total': fields.Integer(description='视野内POI总数'),
+    'clusters': fields.List(fields.Nested(poi_cluster_dto), description='聚合结果, 按数量从多到少排列'),
+}
+
+cache_stats_dto = {
+    'enabled': fields.Boolean(description='缓存是否启用'),
+    'backend': fields.String(description='缓存后端'),
+    'entries': fields.Integer(description='当前条目数 (仅进程内后端)'),
+    'hits': fields.Integer(description='命中次数'),
+    'misses': fields.Integer(description='未命中次数'),
+    'hit_rate': fields.Float(description='命中率'),
+    'invalidations': fields.Integer(description='失效次数'),
+}
+
+singleflight_stats_dto = {
+    'leaders': fields.Integer(description='实际执行的计算次数'),
+    'collapsed': fields.Integer(description='被合并到进行中计算的请求数'),
+    'timeouts': fields.Integer(description='等待超时后以 503 失败的请求数'),
+    'in_flight': fields.Integer(description='当前进行中的计算数'),
+}
+
+auth_cache_stats_dto = {
+    'enabled': fields.Boolean(description='认证缓存是否启用'),
+    'hits': fields.Integer(description='命中次数'),
+    'misses': fields.Integer(description='未命中次数'),
+    'hit_rate': fields.Float(description='命中率'),
+    'db_queries': fields.Integer(description='认证产生的数据库查询次数'),
+    'db_queries_per_lookup': fields.Float(description='平均每次认证的数据库查询次数'),
+    'revocations': fields.Integer(description='按撤销记录清除的其他进程删除的 API Key 缓存条目数'),
+}
+
+tile_cache_stats_dto = {
+    'enabled': fields.Boolean(description='瓦片缓存是否启用'),
+    'entries': fields.Integer(description='进程内缓存的瓦片数'),
+    'disk_dir': fields.String(description='磁盘缓存目录 (未配置时为空)'),
+    'hits': fields.Integer(description='内存命中次数'),
+    'disk_hits': fields.Integer(description='磁盘命中次数'),
+    'misses': fields.Integer(description='未命中次数'),
+    'hit_rate': fields.Float(description='命中率 (内存与磁盘)'),
+    'invalidated_tiles': fields.Integer(description='因 POI 写入而失效的瓦片数'),
+}
+
+snapshot_stats_dto = {
+    'enabled': fields.Boolean(description='列式快照是否启用'),
+    'file': fields.String(description='快照文件路径 (未配置时为空, 快照只在进程内存中)'),
+    'rows': fields.Integer(description='当前快照的行数'),
+    'version': fields.Integer(description='数据版本号 (写入时递增)'),
+    'loaded_version': fields.Integer(description='当前快照对应的版本号'),
+    'reloads': fields.Integer(description='载入次数'),
+    'publishes': fields.Integer(description='本进程发布快照文件的次数'),
+    'change_seq': fields.Integer(description='当前快照包含的最大变更序号'),
+    'last_load_ms': fields.Float(description='最近一次载入耗时 (毫秒)'),
+}
+
+change_feed_stats_dto = {
+    'enabled': fields.Boolean(description='本进程是否轮询变更日志'),
+    'position': fields.Integer(description='本进程内存索引已包含的最大变更序号'),
+    'polls': fields.Integer(description='轮询次数'),
+    'applied': fields.Integer(description='已应用的其他进程的变更数'),
+    'pending_local': fields.Integer(description='本进程已提交、尚未被轮询越过的变更数'),
+    'late': fields.Integer(description='被视为已回滚后才提交 (因而触发整体重新载入) 的变更数'),
+}
+
+cache_stats_response_dto = {
+    **base_response_model,
+    'cache': fields.Nested(cache_stats_dto),
+    'singleflight': fields.Nested(singleflight_stats_dto),
+    'auth': fields.Nested(auth_cache_stats_dto),
+    'tiles': fields.Nested(tile_cache_stats_dto),
+    'snapshot': fields.Nested(snapshot_stats_dto),
+    'changes': fields.Nested(change_feed_stats_dto)
 }
 
 # 错误响应 DTO
@@ -109,7 +306,17 @@ def create_api_models(api):
 
         'poi_item_response': api.model('POIItemResponse', {**base_response_model, 'poi': fields.Nested(api.model('POIOutput', poi_output_dto))}),
         'poi_input': api.model('POIInput', poi_input_dto),
+        'poi_patch_input': api.model('POIPatchInput', poi_patch_input_dto),
+        'poi_batch_input': api.model('POIBatchInput', poi_batch_input_dto),
+        'poi_batch_response': api.model('POIBatchResponse', poi_batch_response_dto),
         'poi_list_response': api.model('POIListResponse', poi_list_response_dto),
+        'poi_nearest_response': api.model('POINearestResponse', poi_nearest_response_dto),
+        'poi_nearest_batch_input': api.model('POINearestBatchInput', poi_nearest_batch_input_dto),
+        'poi_nearest_batch_response': api.model('POINearestBatchResponse', poi_nearest_batch_response_dto),
+        'poi_suggest_response': api.model('POISuggestResponse', poi_suggest_response_dto),
+        'poi_cluster_response': api.model('POIClusterResponse', poi_cluster_response_dto),
+        'poi_changes_response': api.model('POIChangesResponse', poi_changes_response_dto),
+        'cache_stats_response': api.model('CacheStatsResponse', cache_stats_response_dto),
         
         'error_response': api.model('ErrorResponse', error_response_dto_fields)
     }
@@ -0,0 +1,74 @@
+import csv
+import io
+import zlib
+
+from .serializers import dumps
+
+# 全量导出的流式编码: 输入为按批产生的 POI 输出字典列表 (serialize_poi_rows 的结果),
+# 逐批编码为 bytes 块交给生成器响应, 内存占用只与批大小有关, 与结果总行数无关。
+
+# 格式 -> (MIME 类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'geojson': ('application/geo+json', 'geojson'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+def _geojson_feature(item):
+    """把输出字典转为 GeoJSON Feature, 经纬度移入 geometry"""
+    lon, lat = item.pop('longitude'), item.pop('latitude')
+    feature = {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': item}
+    if 'id' in item:
+        feature['id'] = item['id']
+    return feature
+
+
+def _encode_geojson(batches):
+    yield b'{"type":"FeatureCollection","features":['
+    first = True
+    for items in batches:
+        if not items:
+            continue
+        chunk = b','.join(dumps(_geojson_feature(item)) for item in items)
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b']}\n'
+
+
+def _encode_ndjson(batches):
+    for items in batches:
+        if items:
+            yield b'\n'.join(dumps(item) for item in items) + b'\n'
+
+
+def _encode_csv(batches, names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(names)
+    for items in batches:
+        writer.writerows([item.get(name) for name in names] for item in items)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def encode_export(batches, fmt, names):
+    """按格式把批次流编码为 bytes 块; names 为 CSV 的表头 (输出字段顺序)"""
+    if fmt == 'geojson':
+        return _encode_geojson(batches)
+    if fmt == 'ndjson':
+        return _encode_ndjson(batches)
+    return _encode_csv(batches, names)
+
+
+def gzip_chunks(chunks, level=6):
+    """边生成边压缩为 gzip 流, 不缓存完整结果"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -2,8 +2,32 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from .spatial import SpatialGridIndex
+from .textindex import NGramIndex, PrefixSuggester
+from .cache import QueryCache, SingleFlight, AuthCache
+from .tiles import TileCache
+from .clusters import ClusterGrid
+from .facets import FacetIndex
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
 # 限流器，key_func 可以根据需求调整，例如基于 API Key 或用户 ID
-limiter = Limiter(key_func=get_remote_address)
\ No newline at end of file
+limiter = Limiter(key_func=get_remote_address)
+# POI 坐标的内存空间索引, 在 create_app 中从 pois 表构建
+spatial_index = SpatialGridIndex()
+# POI 名称的 n-gram 倒排索引, 用于名称模糊查询
+name_index = NGramIndex()
+# POI 名称前缀联想索引
+name_suggester = PrefixSuggester()
+# 公众查询接口的结果缓存
+search_cache = QueryCache()
+# 相同公众查询的并发请求合并
+request_coalescer = SingleFlight()
+# API Key / JWT 用户解析缓存
+auth_cache = AuthCache()
+# POI 矢量瓦片缓存
+tile_cache = TileCache()
+# 低缩放级别地图的分层网格点聚合
+cluster_index = ClusterGrid()
+# 查询结果的分面计数 (省份 × 类别 × 是否有图片 × 是否有官网)
+facet_index = FacetIndex()
\ No newline at end of file
@@ -0,0 +1,87 @@
+import threading
+from collections import Counter
+
+# 查询结果的分面计数: 按 (省份, 类别, 是否有图片, 是否有官网) 组合维护一个计数立方体,
+# 组合数只有几百个, 属性条件下的分面计数直接在立方体上汇总; 有名称或空间条件时对候选 ID 现场统计组合。
+
+FACET_FIELDS = ('province', 'category', 'has_image', 'has_website')
+FACET_OTHER = '其他' # 字段为空时的分面取值
+
+
+def _label(value):
+    if value is None or value == '':
+        return FACET_OTHER
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+class FacetIndex:
+    """分面计数索引。
+
+    计数采用多选分面的语义: 某个分面的计数忽略该字段自身的筛选条件, 但应用其余全部条件,
+    这样侧边栏在选中一个省份后仍能显示其他省份的数量。写入时只需调整新旧组合的计数。
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._combos = {}      # poi_id -> (province, category, has_image, has_website)
+        self._cube = Counter() # 组合 -> 数量
+
+    def __len__(self):
+        return len(self._combos)
+
+    def rebuild(self, rows):
+        """用 (id, province, category, has_image, has_website) 序列整体重建"""
+        combos = {row[0]: tuple(row[1:]) for row in rows}
+        cube = Counter(combos.values())
+        with self._lock:
+            self._combos, self._cube = combos, cube
+            self.ready = True
+
+    def upsert(self, poi_id, province, category, has_image, has_website):
+        combo = (province, category, has_image, has_website)
+        with self._lock:
+            old = self._combos.get(poi_id)
+            if old == combo:
+                return
+            if old is not None:
+                self._discard(old)
+            self._combos[poi_id] = combo
+            self._cube[combo] += 1
+
+    def remove(self, poi_id):
+        with self._lock:
+            old = self._combos.pop(poi_id, None)
+            if old is not None:
+                self._discard(old)
+
+    def _discard(self, combo):
+        self._cube[combo] -= 1
+        if self._cube[combo] <= 0:
+            del self._cube[combo]
+
+    def counts(self, facets, where=None, ids=None):
+        """返回 {分面字段: {取值: 数量}}, 每个分面内按数量从多到少排列。
+
+        where 为 {字段: 取值} 形式的属性条件; ids 非空时只统计这些 POI (名称或空间条件的候选集合)。
+        """
+        conditions = [(FACET_FIELDS.index(name), value) for name, value in (where or {}).items()]
+        positions = [FACET_FIELDS.index(name) for name in facets]
+        with self._lock:
+            if ids is None:
+                source = list(self._cube.items())
+            else:
+                combos = self._combos
+                source = Counter(combos[poi_id] for poi_id in ids if poi_id in combos).items()
+        results = [Counter() for _ in positions]
+        for combo, count in source:
+            failed = [position for position, value in conditions if combo[position] != value]
+            if len(failed) > 1:
+                continue
+            for position, result in zip(positions, results):
+                # 只有本分面自身的条件不满足时仍计入本分面
+                if not failed or failed[0] == position:
+                    result[_label(combo[position])] += count
+        return {name: dict(result.most_common()) for name, result in zip(facets, results)}
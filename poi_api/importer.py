@@ -0,0 +1,437 @@
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sqlalchemy import select, bindparam
+
+from .extensions import db
+from .models import POI
+from .changes import record_changes, record_reset
+from .coordsys import bd09_to_wgs84, in_china
+
+# GeoJSON 批量导入: 逐个 feature 流式解析, 分批写入 pois 表。
+# PostgreSQL 使用 COPY, 其他数据库 (如 SQLite) 使用 executemany; 内存占用只与批大小有关, 与文件大小无关。
+# 数据集重新发布时使用 sync_features 做增量同步: 按来源标识和内容摘要对比, 只写入新增、变化和已删除的行。
+# 写入前 feature 按块做向量化坐标校验 (validate_features), 大文件可分发到进程池; 被拒绝的 feature 交给 on_reject 回调。
+
+_FEATURES_START = re.compile(r'"features"\s*:\s*\[')
+
+# 写入的列, COPY 与 executemany 共用
+IMPORT_COLUMNS = ('name', 'latitude', 'longitude', 'province', 'category', 'source_id', 'content_hash',
+                  'has_image', 'has_website', 'created_on', 'updated_on')
+# 参与内容摘要的列; 增量同步时数据变化只覆盖这些列, created_on 以及管理员维护的图片、网站等字段保持不变
+CONTENT_COLUMNS = ('name', 'latitude', 'longitude', 'province', 'category')
+
+# 同时有 BD-09 与 WGS-84 坐标时, 两者换算后相差超过该距离 (公里) 视为异常数据
+MAX_BD_WGS_MISMATCH_KM = 1.0
+_KM_PER_DEG = 111.195
+
+
+def open_source(path):
+    """以文本方式打开 GeoJSON 文件, .gz 结尾的按 gzip 解压读取"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_features(fp, chunk_size=1 << 20):
+    """从 FeatureCollection 文本流中逐个产出 feature dict, 不把整个文件读入内存"""
+    decoder = json.JSONDecoder()
+    buf, eof = '', False
+
+    def fill(keep_from):
+        nonlocal buf, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[keep_from:] + chunk
+
+    # 定位 "features": [
+    while True:
+        m = _FEATURES_START.search(buf)
+        if m:
+            pos = m.end()
+            break
+        if eof:
+            raise ValueError("不是有效的 FeatureCollection: 未找到 features 数组")
+        fill(max(len(buf) - 64, 0)) # 保留尾部, 防止 "features" 被分块截断
+
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("GeoJSON 文件不完整: features 数组未结束")
+            fill(pos)
+            pos = 0
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            feature, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill(pos) # 当前 feature 跨越了分块边界, 读入下一块后重试
+            pos = 0
+            continue
+        pos = end
+        yield feature
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def source_id_of(props, name, lat, lon):
+    """数据源中的稳定标识: 优先使用 F1 序号, 缺失时使用名称加 5 位小数坐标的摘要"""
+    f1 = _to_float(props.get('F1'))
+    if np.isfinite(f1):
+        return f"f1:{f1:g}"
+    raw = f"{name}|{lat:.5f}|{lon:.5f}"
+    return f"nc:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+
+def content_hash_of(row):
+    raw = json.dumps([row[col] for col in CONTENT_COLUMNS], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _usable(lons, lats):
+    return np.isfinite(lons) & np.isfinite(lats) & (np.abs(lons) <= 180) & (np.abs(lats) <= 90) & in_china(lons, lats)
+
+
+def validate_features(features, start=0, max_mismatch_km=MAX_BD_WGS_MISMATCH_KM):
+    """校验一块 feature 并映射为 pois 表的行, 返回 (rows, rejects)。
+
+    坐标优先取 经度BD_wgs/纬度BD_wgs, 其次 Point geometry, 都不可用时由 经度BD/纬度BD 从 BD-09 换算为 WGS-84。
+    rejects 为 (feature 序号, 原因, feature) 列表。函数只依赖参数, 可在子进程中执行。
+    """
+    n = len(features)
+    props = [feature.get('properties') or {} for feature in features]
+    names = [_to_text(p.get('景区名称')) for p in props]
+    coords = np.full((n, 6), np.nan) # WGS 经纬度, geometry 经纬度, BD 经纬度
+    for i, (feature, p) in enumerate(zip(features, props)):
+        coords[i, 0] = _to_float(p.get('经度BD_wgs'))
+        coords[i, 1] = _to_float(p.get('纬度BD_wgs'))
+        geometry = feature.get('geometry') or {}
+        point = geometry.get('coordinates') if geometry.get('type') == 'Point' else None
+        if isinstance(point, (list, tuple)) and len(point) >= 2:
+            coords[i, 2] = _to_float(point[0])
+            coords[i, 3] = _to_float(point[1])
+        coords[i, 4] = _to_float(p.get('经度BD'))
+        coords[i, 5] = _to_float(p.get('纬度BD'))
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        wgs_ok = _usable(coords[:, 0], coords[:, 1])
+        geom_ok = _usable(coords[:, 2], coords[:, 3])
+        bd_ok = _usable(coords[:, 4], coords[:, 5])
+        bd_lons, bd_lats = bd09_to_wgs84(np.where(bd_ok, coords[:, 4], 0.0), np.where(bd_ok, coords[:, 5], 0.0))
+        lons = np.where(wgs_ok, coords[:, 0], np.where(geom_ok, coords[:, 2], bd_lons))
+        lats = np.where(wgs_ok, coords[:, 1], np.where(geom_ok, coords[:, 3], bd_lats))
+        has_coord = wgs_ok | geom_ok | bd_ok
+        mismatch_km = _KM_PER_DEG * np.hypot((lons - bd_lons) * np.cos(np.radians(lats)), lats - bd_lats)
+        mismatch = (wgs_ok | geom_ok) & bd_ok & (mismatch_km > max_mismatch_km)
+        # 无可用坐标时按第一个给出的坐标说明原因
+        first = np.where(np.isfinite(coords[:, 0]) & np.isfinite(coords[:, 1]), 0,
+                         np.where(np.isfinite(coords[:, 2]) & np.isfinite(coords[:, 3]), 2, 4))
+        first_lons = coords[np.arange(n), first]
+        first_lats = coords[np.arange(n), first + 1]
+        given = np.isfinite(first_lons) & np.isfinite(first_lats)
+        in_range = given & (np.abs(first_lons) <= 180) & (np.abs(first_lats) <= 90)
+
+    rows, rejects = [], []
+    for i in range(n):
+        if not names[i]:
+            reason = '缺少名称'
+        elif not has_coord[i]:
+            reason = '坐标超出中国范围' if in_range[i] else ('坐标超出经纬度范围' if given[i] else '坐标缺失或无法解析')
+        elif mismatch[i]:
+            reason = 'BD-09 与 WGS-84 坐标不一致'
+        else:
+            reason = None
+        if reason is not None:
+            rejects.append((start + i, reason, features[i]))
+            continue
+        lon, lat = round(float(lons[i]), 6), round(float(lats[i]), 6)
+        name = names[i][:255]
+        row = {
+            'name': name,
+            'latitude': lat,
+            'longitude': lon,
+            'province': _to_text(props[i].get('地区')),
+            'category': _to_text(props[i].get('景区等级')),
+            'source_id': source_id_of(props[i], name, lat, lon),
+            'has_image': False,
+            'has_website': False,
+        }
+        row['content_hash'] = content_hash_of(row)
+        rows.append(row)
+    return rows, rejects
+
+
+def validated_rows(features, stats, chunk_size=5000, workers=0, on_reject=None):
+    """把 feature 流按块校验后逐行产出, 保持原有顺序。
+
+    workers > 1 时各块分发到进程池并行校验, 同时在途的块数有上限, 内存占用不随文件增长。
+    on_reject(序号, 原因, feature) 接收被拒绝的 feature。
+    """
+    def chunks():
+        chunk, start = [], 0
+        for feature in features:
+            chunk.append(feature)
+            if len(chunk) >= chunk_size:
+                yield start, chunk
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield start, chunk
+
+    def accept(result, count):
+        rows, rejects = result
+        stats.read += count
+        stats.skipped += len(rejects)
+        for index, reason, feature in rejects:
+            stats.reject_reasons[reason] += 1
+            if on_reject is not None:
+                on_reject(index, reason, feature)
+        return rows
+
+    if workers <= 1:
+        for start, chunk in chunks():
+            yield from accept(validate_features(chunk, start), len(chunk))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, chunk in chunks():
+            pending.append((executor.submit(validate_features, chunk, start), len(chunk)))
+            if len(pending) >= workers * 2:
+                future, count = pending.popleft()
+                yield from accept(future.result(), count)
+        while pending:
+            future, count = pending.popleft()
+            yield from accept(future.result(), count)
+
+
+class RejectLog:
+    """把被拒绝的 feature 以 NDJSON 追加写入旁路文件, 第一次写入时才创建文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._fp = None
+
+    def __call__(self, index, reason, feature):
+        if self._fp is None:
+            self._fp = open(self.path, 'w', encoding='utf-8')
+        self._fp.write(json.dumps({'index': index, 'reason': reason, 'feature': feature}, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+
+
+def _copy_batch(cursor, batch):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in batch:
+        writer.writerow([row[col] for col in IMPORT_COLUMNS])
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {POI.__tablename__} ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+class ImportStats:
+    """一次导入或同步的计数与耗时"""
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.reject_reasons = Counter()
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.db_elapsed = 0.0 # 其中写数据库的耗时
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def import_features(features, batch_size=5000, progress=None, workers=0, on_reject=None, truncate=False):
+    """把 feature 序列校验后分批写入 pois 表并在结束时提交, 返回 ImportStats (需在应用上下文中调用)。
+
+    progress(stats) 在每批写入后回调, 可用于输出进度; workers 与 on_reject 见 validated_rows。
+    truncate 为真时先在同一事务中清空 pois 表, 清空的行数计入 stats.deleted。
+    """
+    stats = ImportStats()
+    connection = db.session.connection()
+    cursor = None
+    if connection.dialect.name == 'postgresql':
+        dbapi_cursor = connection.connection.cursor()
+        if hasattr(dbapi_cursor, 'copy_expert'): # psycopg2
+            cursor = dbapi_cursor
+    insert = POI.__table__.insert()
+
+    def flush(batch):
+        now = datetime.datetime.utcnow()
+        for row in batch:
+            row['created_on'] = row['updated_on'] = now
+        t0 = time.perf_counter()
+        if cursor is not None:
+            _copy_batch(cursor, batch)
+        else:
+            connection.execute(insert, batch)
+        stats.db_elapsed += time.perf_counter() - t0
+        stats.inserted += len(batch)
+        stats.elapsed = time.perf_counter() - stats.started
+        if progress is not None:
+            progress(stats)
+
+    batch = []
+    try:
+        if truncate:
+            stats.deleted = db.session.query(POI).delete(synchronize_session=False)
+        for row in validated_rows(features, stats, chunk_size=batch_size, workers=workers, on_reject=on_reject):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        if stats.inserted or stats.deleted:
+            record_reset() # 不逐行记录变更日志, 由消费者整体重新载入
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if cursor is not None:
+            cursor.close()
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+
+def _upsert_statement(dialect_name):
+    """按 source_id 冲突更新的 INSERT 语句; 冲突时不覆盖 created_on"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    stmt = insert(POI.__table__)
+    update_columns = CONTENT_COLUMNS + ('content_hash', 'updated_on')
+    return stmt.on_conflict_do_update(index_elements=[POI.__table__.c.source_id],
+                                      set_={**{col: stmt.excluded[col] for col in update_columns},
+                                            'version': POI.__table__.c.version + 1})
+
+
+def sync_features(features, batch_size=5000, prune=True, progress=None, workers=0, on_reject=None):
+    """把 feature 序列与 pois 表中已导入的行做增量同步, 返回 ImportStats (需在应用上下文中调用)。
+
+    先读出已有行的 (source_id, content_hash), 流式对比后只把新增和内容变化的行以批量 upsert
+    (INSERT ... ON CONFLICT (source_id) DO UPDATE) 写入; prune 为真时删除本次数据中已不存在的行。
+    没有 source_id 的行 (管理员手工创建的 POI) 不参与同步。写入的每一行都在同一事务中记录变更日志,
+    运行中的进程只需增量更新这些 POI。
+    """
+    stats = ImportStats()
+    connection = db.session.connection()
+    existing = dict(connection.execute(
+        select(POI.source_id, POI.content_hash).where(POI.source_id.isnot(None))).all())
+    upsert = _upsert_statement(connection.dialect.name)
+    table = POI.__table__
+
+    def write(stmt, params):
+        t0 = time.perf_counter()
+        connection.execute(stmt, params)
+        stats.db_elapsed += time.perf_counter() - t0
+
+    def current_rows(source_ids):
+        """按 source_id 查出 (id, version, source_id), 用于记录变更日志"""
+        rows = []
+        for i in range(0, len(source_ids), 500):
+            rows += connection.execute(select(POI.id, POI.version, POI.source_id)
+                                       .where(POI.source_id.in_(source_ids[i:i + 500])).order_by(POI.id)).all()
+        return rows
+
+    def flush(batch):
+        now = datetime.datetime.utcnow()
+        for row in batch:
+            row['created_on'] = row['updated_on'] = now
+        if upsert is not None:
+            write(upsert, batch)
+        else: # 不支持 ON CONFLICT 的数据库: 新行插入, 变化的行按 source_id 更新
+            new_rows = [row for row in batch if row['source_id'] not in existing]
+            changed = [{**{f"b_{col}": row[col] for col in CONTENT_COLUMNS + ('content_hash', 'updated_on')},
+                        'b_source_id': row['source_id']} for row in batch if row['source_id'] in existing]
+            if new_rows:
+                write(table.insert(), new_rows)
+            if changed:
+                write(table.update().where(table.c.source_id == bindparam('b_source_id')).values(
+                    {**{col: bindparam(f"b_{col}") for col in CONTENT_COLUMNS + ('content_hash', 'updated_on')},
+                     'version': table.c.version + 1}), changed)
+        record_changes([(poi_id, 'update' if source_id in existing else 'insert', version)
+                        for poi_id, version, source_id in current_rows([row['source_id'] for row in batch])])
+        stats.elapsed = time.perf_counter() - stats.started
+        if progress is not None:
+            progress(stats)
+
+    seen = set()
+    batch = []
+    try:
+        for row in validated_rows(features, stats, chunk_size=batch_size, workers=workers, on_reject=on_reject):
+            source_id = row['source_id']
+            if source_id in seen:
+                stats.duplicates += 1 # 同一来源标识在本次数据中重复出现, 只保留第一条
+                continue
+            seen.add(source_id)
+            if source_id not in existing:
+                stats.inserted += 1
+            elif existing[source_id] != row['content_hash']:
+                stats.updated += 1
+            else:
+                stats.unchanged += 1
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        if prune:
+            stale = [source_id for source_id in existing if source_id not in seen]
+            for i in range(0, len(stale), 500):
+                deleted = current_rows(stale[i:i + 500])
+                write(table.delete().where(table.c.source_id.in_(stale[i:i + 500])), None)
+                record_changes([(poi_id, 'delete', version) for poi_id, version, _ in deleted])
+            stats.deleted = len(stale)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
@@ -0,0 +1,133 @@
+import threading
+
+from flask import current_app
+
+from .extensions import db, spatial_index, name_index, name_suggester, search_cache, tile_cache, cluster_index, facet_index
+from .models import POI
+from .tiles import fingerprint_rows
+from .snapshot import snapshot_store
+from .changes import change_feed, latest_change_seq
+
+# POI 的各类内存派生索引统一在这里构建和维护,
+# 管理员写接口在提交事务后调用 index_poi / unindex_poi 保持索引与 pois 表一致, 同时使查询缓存失效,
+# 并失效包含该 POI 新旧坐标的矢量瓦片、递增列式快照的版本号。
+# 快照版本先于查询缓存失效, 这样查询缓存失效之后开始的查询不会拿旧快照的结果写回缓存。
+# 其他进程的写入由变更日志轮询 (apply_changes) 以同样的方式增量应用
+
+
+INDEX_FIELDS = ('id', 'name', 'longitude', 'latitude', 'category', 'province', 'has_image', 'has_website')
+
+_build_lock = threading.Lock()
+
+
+def rebuild_indexes(snapshot=None):
+    """从 pois 表整体重建所有内存索引 (需在应用上下文中调用)。
+
+    配置了快照文件时从映射的快照读取, 不查询数据库; snapshot 为其他进程新发布的快照 (快照文件更新的回调)。
+    """
+    if snapshot is None and snapshot_store.path:
+        snapshot = snapshot_store.current()
+    if snapshot is not None:
+        rows = snapshot.records(INDEX_FIELDS)
+        position = snapshot.change_seq
+    else:
+        position = latest_change_seq() # 先取序号再读数据, 之后的变更由轮询重复应用也无妨
+        rows = db.session.query(*(getattr(POI, name) for name in INDEX_FIELDS)).all()
+    spatial_index.rebuild((row.id, row.longitude, row.latitude) for row in rows)
+    name_index.rebuild((row.id, row.name) for row in rows)
+    name_suggester.rebuild((row.id, row.name, row.category, row.province) for row in rows)
+    cluster_index.rebuild((row.id, row.longitude, row.latitude, row.category) for row in rows)
+    facet_index.rebuild((row.id, row.province, row.category, row.has_image, row.has_website) for row in rows)
+    tile_cache.reset(fingerprint_rows((row.id, row.name, row.longitude, row.latitude, row.category) for row in rows))
+    if snapshot is None:
+        snapshot_store.invalidate()
+        if snapshot_store.enabled:
+            snapshot_store.load()
+    search_cache.invalidate()
+    change_feed.reset(position)
+    return len(rows)
+
+
+def ensure_indexes():
+    """内存索引尚未构建时构建: 未在启动时构建索引 (INDEX_BUILD_ON_STARTUP) 的进程在首次请求时调用"""
+    if spatial_index.ready:
+        return
+    with _build_lock:
+        if not spatial_index.ready:
+            count = rebuild_indexes()
+            current_app.logger.info(f"POI indexes built with {count} POIs on first request.")
+
+
+def on_snapshot_published(snapshot):
+    """其他进程发布了新快照文件: 变更日志轮询已应用到该快照包含的全部变更时不必重建"""
+    if not change_feed.covers(snapshot.change_seq):
+        rebuild_indexes(snapshot)
+
+
+def index_poi(poi):
+    """新建或更新一个 POI 后同步内存索引"""
+    old_point = spatial_index.point(poi.id)
+    spatial_index.upsert(poi.id, poi.longitude, poi.latitude)
+    name_index.upsert(poi.id, poi.name)
+    name_suggester.upsert(poi.id, poi.name, poi.category, poi.province)
+    cluster_index.upsert(poi.id, poi.longitude, poi.latitude, poi.category)
+    facet_index.upsert(poi.id, poi.province, poi.category, poi.has_image, poi.has_website)
+    snapshot_store.invalidate()
+    search_cache.invalidate()
+    tile_cache.invalidate_points([old_point, (poi.longitude, poi.latitude)])
+
+
+def unindex_poi(poi_id):
+    """删除一个 POI 后同步内存索引"""
+    old_point = spatial_index.point(poi_id)
+    spatial_index.remove(poi_id)
+    name_index.remove(poi_id)
+    name_suggester.remove(poi_id)
+    cluster_index.remove(poi_id)
+    facet_index.remove(poi_id)
+    snapshot_store.invalidate()
+    search_cache.invalidate()
+    tile_cache.invalidate_points([old_point])
+
+
+def reindex_pois(changed_ids=(), deleted_ids=(), change_seq=None):
+    """批量写入提交后同步内存索引: 重新读取变更的 POI, 移除已删除的 POI, 查询缓存只失效一次。
+
+    change_seq 非空表示变更来自其他进程 (变更日志), 列式快照只需包含到该序号。
+    """
+    changed_ids = list(changed_ids)
+    touched = [] # 新旧坐标, 用于失效瓦片
+    for start in range(0, len(changed_ids), 5000):
+        chunk = changed_ids[start:start + 5000]
+        rows = db.session.query(POI.id, POI.name, POI.longitude, POI.latitude, POI.category, POI.province,
+                                POI.has_image, POI.has_website).filter(POI.id.in_(chunk)).all()
+        for row in rows:
+            touched += (spatial_index.point(row.id), (row.longitude, row.latitude))
+            spatial_index.upsert(row.id, row.longitude, row.latitude)
+            name_index.upsert(row.id, row.name)
+            name_suggester.upsert(row.id, row.name, row.category, row.province)
+            cluster_index.upsert(row.id, row.longitude, row.latitude, row.category)
+            facet_index.upsert(row.id, row.province, row.category, row.has_image, row.has_website)
+    for poi_id in deleted_ids:
+        touched.append(spatial_index.point(poi_id))
+        spatial_index.remove(poi_id)
+        name_index.remove(poi_id)
+        name_suggester.remove(poi_id)
+        cluster_index.remove(poi_id)
+        facet_index.remove(poi_id)
+    snapshot_store.invalidate(change_seq)
+    search_cache.invalidate()
+    tile_cache.invalidate_points(touched)
+
+
+def apply_changes(changes, position):
+    """变更日志轮询的回调: 增量应用其他进程的写入, 遇到 reset (批量导入) 时整体重建"""
+    if any(change['op'] == 'reset' for change in changes):
+        snapshot_store.invalidate(position)
+        rebuild_indexes()
+        return
+    final = {} # 同一个 POI 只看最后一次变更
+    for change in changes:
+        final[change['poi_id']] = change['op']
+    reindex_pois([poi_id for poi_id, op in final.items() if op != 'delete'],
+                 [poi_id for poi_id, op in final.items() if op == 'delete'], change_seq=position)
@@ -48,6 +48,13 @@ class APIKey(db.Model):
     def __repr__(self):
         return f"<APIKey for User {self.user_id}>"
 
+# API Key 撤销记录: 删除 API Key 时写入, 各 worker 定期读取最近的记录并清除本进程认证缓存中的对应条目
+class APIKeyRevocation(db.Model):
+    __tablename__ = "api_key_revocations"
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(128), nullable=False)
+    revoked_on = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+
 # POI (Point of Interest) 模型
 class POI(db.Model):
     __tablename__ = "pois"
@@ -66,6 +73,12 @@ class POI(db.Model):
     has_website = db.Column(db.Boolean, default=False, index=True)
     website_url = db.Column(db.String(500))
     
+    # 批量导入数据的来源标识与内容摘要, 用于增量同步; 管理员手工创建的 POI 为空
+    source_id = db.Column(db.String(64), unique=True, index=True)
+    content_hash = db.Column(db.String(40))
+    # 每次修改递增, 作为 ETag 用于 If-Match 乐观并发控制
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
     created_by = db.Column(db.Integer, db.ForeignKey('users.id')) # 记录创建者
     created_on = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_on = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -91,7 +104,22 @@ class POI(db.Model):
             'website_url': self.website_url,
             'created_on': self.created_on.isoformat() if self.created_on else None,
             'updated_on': self.updated_on.isoformat() if self.updated_on else None,
+            'version': self.version,
         }
 
     def __repr__(self):
-        return f"<POI {self.name}>"
\ No newline at end of file
+        return f"<POI {self.name}>"
+
+# POI 变更日志: 管理员写接口在写入 POI 的同一事务中记录新增、修改和删除, id 为单调递增的变更序号,
+# 供其他 worker 进程和下游消费者按序号增量同步; 命令行批量导入记录一条 reset, 表示需要整体重新载入
+class POIChange(db.Model):
+    __tablename__ = "poi_changes"
+    __table_args__ = {'sqlite_autoincrement': True} # SQLite 下删除 (清理) 最新的行后也不复用序号
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    poi_id = db.Column(db.Integer, index=True) # reset 记录为空; 不设外键, 删除的 POI 仍保留日志
+    op = db.Column(db.String(10), nullable=False) # insert / update / delete / reset
+    version = db.Column(db.Integer) # 变更后的版本号, 删除时为删除前的版本号
+    changed_on = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<POIChange {self.id} {self.op} {self.poi_id}>"
@@ -1,8 +1,8 @@
 from flask import request, current_app, g
 from flask_restx import Namespace, Resource, fields
 from ..models import User, Role, APIKey as APIKeyModel
-from ..extensions import db, bcrypt
-from ..utils import generate_token
+from ..extensions import db, bcrypt, auth_cache
+from ..utils import generate_token, revoke_apikey
 from ..dtos import create_api_models
 from ..decorators import token_required
 from ..errors import BusinessException
@@ -152,6 +152,7 @@ class APIKeyDetailResource(Resource):
         if not api_key_obj:
             raise BusinessException("API Key未找到或不属于当前用户", status_code=404, error_code="APIKEY_NOT_FOUND_OR_FORBIDDEN")
 
-        db.session.delete(api_key_obj)
+        revoke_apikey(api_key_obj) # 写入撤销记录, 其他 worker 在下一次轮询时清除缓存
         db.session.commit()
+        auth_cache.invalidate_apikey(key_value) # 本进程立即生效
         return "", 204 # No Content
\ No newline at end of file
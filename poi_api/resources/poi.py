@@ -1,11 +1,29 @@
-from flask import request, current_app, g
-from flask_restx import Namespace, Resource, reqparse, fields
+from flask import request, current_app, g, stream_with_context
+from flask_restx import Namespace, Resource, reqparse, inputs
 from ..models import POI, User
-from ..extensions import db, limiter
+from ..extensions import db, limiter, spatial_index, name_index, name_suggester, search_cache, request_coalescer, auth_cache, tile_cache, cluster_index, facet_index
+from ..indexes import index_poi, unindex_poi, reindex_pois
 from ..dtos import create_api_models
 from ..decorators import admin_required, apikey_required, rate_limit_decorator
 from ..errors import BusinessException
+from ..spatial import bbox_around, haversine_km
+from ..serializers import POI_OUTPUT_FIELDS, parse_fields, poi_columns, serialize_poi_rows, json_response, shaped, dumps
+from ..exporter import EXPORT_FORMATS, encode_export, gzip_chunks
+from ..tiles import build_tile
+from ..facets import FACET_FIELDS
+from ..snapshot import snapshot_store
+from ..changes import change_feed, record_change, record_changes, read_changes
 from sqlalchemy import or_, and_ # 用于复杂查询
+from sqlalchemy import insert, update, delete, select, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from jsonschema import Draft4Validator
+from werkzeug.http import quote_etag
+from itertools import islice
+import base64
+import datetime
+import json
+import math
+import numpy as np
 
 # 创建 Namespace
 poi_ns = Namespace('pois', description='POI数据管理')
@@ -43,7 +61,10 @@ class POIListAdmin(Resource):
             created_by=current_user_id
         )
         db.session.add(new_poi)
+        db.session.flush() # 取得新 ID, 与变更日志在同一事务中提交
+        record_change(new_poi.id, 'insert', new_poi.version)
         db.session.commit()
+        index_poi(new_poi)
         return {'status': 'success', 'message': 'POI创建成功', 'poi': new_poi}, 201
 
 @poi_ns.route('/<int:poi_id>')
@@ -52,22 +73,35 @@ class POIDetailAdmin(Resource):
     @admin_required # 只有管理员可以修改
     @poi_ns.expect(models['poi_input'], validate=True)
     @poi_ns.marshal_with(models['poi_item_response'])
+    @poi_ns.doc(params={'If-Match': {'in': 'header', 'description': '可选, 上次获取的 ETag, 版本不符时返回412'}})
     @poi_ns.response(400, '输入无效', models['error_response'])
     @poi_ns.response(401, 'Token无效或缺失', models['error_response'])
     @poi_ns.response(403, '无管理员权限', models['error_response'])
     @poi_ns.response(404, 'POI未找到', models['error_response'])
+    @poi_ns.response(412, 'POI已被他人修改 (If-Match 不符)', models['error_response'])
     def put(self, poi_id):
-        """[管理员] 更新指定ID的POI信息"""
-        poi = POI.query.get_or_404(poi_id, description=f"ID为 {poi_id} 的POI未找到")
-        data = poi_ns.payload
-        
-        # 更新字段
-        for key, value in data.items():
-            if hasattr(poi, key):
-                setattr(poi, key, value)
-        
-        db.session.commit()
-        return {'status': 'success', 'message': 'POI更新成功', 'poi': poi}, 200
+        """[管理员] 更新指定ID的POI信息 (只写入有变化的列)"""
+        return _update_poi(poi_id, _validated_poi_fields(poi_ns.payload, partial=False))
+
+    @admin_required
+    @poi_ns.expect(models['poi_patch_input'])
+    @poi_ns.marshal_with(models['poi_item_response'])
+    @poi_ns.doc(params={'If-Match': {'in': 'header', 'description': '可选, 上次获取的 ETag, 版本不符时返回412'}})
+    @poi_ns.response(400, '输入无效', models['error_response'])
+    @poi_ns.response(401, 'Token无效或缺失', models['error_response'])
+    @poi_ns.response(403, '无管理员权限', models['error_response'])
+    @poi_ns.response(404, 'POI未找到', models['error_response'])
+    @poi_ns.response(412, 'POI已被他人修改 (If-Match 不符)', models['error_response'])
+    def patch(self, poi_id):
+        """
+        [管理员] 部分更新指定ID的POI
+        只需提交要修改的字段; 只写入值确实变化的列, 没有变化时不写库、不刷新缓存。
+        带 If-Match 头时仅在版本一致时更新, 响应头 ETag 为更新后的版本。
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
+            raise BusinessException("请求体必须是非空的JSON对象", status_code=400, error_code="POI_INVALID_DATA")
+        return _update_poi(poi_id, _validated_poi_fields(data, partial=True))
 
     @admin_required # 只有管理员可以删除
     @poi_ns.response(204, 'POI删除成功')
@@ -78,18 +112,271 @@ class POIDetailAdmin(Resource):
         """[管理员] 删除指定ID的POI"""
         poi = POI.query.get_or_404(poi_id, description=f"ID为 {poi_id} 的POI未找到")
         db.session.delete(poi)
+        record_change(poi_id, 'delete', poi.version)
         db.session.commit()
+        unindex_poi(poi_id)
         return "", 204
 
 
+BATCH_WRITE_MAX_OPS = 5000 # 单次批量写入的最大操作数
+BATCH_WRITE_CHUNK_SIZE = 500 # 非原子模式下每个事务包含的操作数
+_poi_input_schema = models['poi_input'].__schema__
+_poi_create_validator = Draft4Validator(_poi_input_schema)
+_poi_update_validator = Draft4Validator({k: v for k, v in _poi_input_schema.items() if k != 'required'})
+_POI_WRITABLE_FIELDS = tuple(_poi_input_schema['properties'])
+
+
+def _validated_poi_fields(data, partial):
+    """按 POIInput 校验写入的字段, 返回可写列的 dict; partial 为真时不要求必填字段"""
+    validator = _poi_update_validator if partial else _poi_create_validator
+    error = next(iter(sorted(validator.iter_errors(data), key=str)), None)
+    if error is not None:
+        field = '.'.join(str(p) for p in error.path) or 'data'
+        raise BusinessException(f"{field}: {error.message}", status_code=400, error_code="POI_INVALID_DATA")
+    fields_ = {k: v for k, v in data.items() if k in _POI_WRITABLE_FIELDS}
+    lat, lon = fields_.get('latitude'), fields_.get('longitude')
+    if (lat is not None and not -90 <= lat <= 90) or (lon is not None and not -180 <= lon <= 180):
+        raise BusinessException("经纬度超出有效范围", status_code=400, error_code="QUERY_INVALID_POINT")
+    return fields_
+
+
+def _poi_etag(poi):
+    return f"poi-{poi.id}-v{poi.version}"
+
+
+def _update_poi(poi_id, fields_):
+    """只写入值有变化的列并递增版本号; 请求带 If-Match 时版本不符返回412, 没有变化时不写库"""
+    poi = db.session.get(POI, poi_id)
+    if poi is None:
+        raise BusinessException(f"ID为 {poi_id} 的POI未找到", status_code=404, error_code="POI_NOT_FOUND")
+    if request.if_match and not request.if_match.contains(_poi_etag(poi)):
+        raise BusinessException("POI已被他人修改, 请重新获取后再提交", status_code=412, error_code="POI_VERSION_MISMATCH")
+    changed = {key: value for key, value in fields_.items() if getattr(poi, key) != value}
+    # 用 UPDATE 语句直接写入变化的列, 对象脱离会话, 提交后不必为返回结果重新查询
+    db.session.expunge(poi)
+    if changed:
+        now = datetime.datetime.utcnow()
+        result = db.session.execute(
+            update(POI).where(POI.id == poi_id, POI.version == poi.version)
+            .values(**changed, version=POI.version + 1, updated_on=now),
+            execution_options={'synchronize_session': False})
+        if result.rowcount != 1: # 读取之后被并发修改或删除
+            db.session.rollback()
+            raise BusinessException("POI已被他人修改, 请重新获取后再提交", status_code=412, error_code="POI_VERSION_MISMATCH")
+        record_change(poi_id, 'update', poi.version + 1)
+        db.session.commit()
+        for key, value in changed.items():
+            setattr(poi, key, value)
+        poi.version += 1
+        poi.updated_on = now
+        index_poi(poi)
+    message = 'POI更新成功' if changed else 'POI没有变化'
+    return {'status': 'success', 'message': message, 'poi': poi}, 200, {'ETag': quote_etag(_poi_etag(poi))}
+
+
+def _check_batch_operation(op):
+    """校验批量写入中的一项, 返回 (操作类型, POI ID, 字段 dict), 无效时抛出 BusinessException"""
+    if not isinstance(op, dict) or op.get('op') not in ('create', 'update', 'delete'):
+        raise BusinessException("op 必须是 create、update 或 delete", error_code="BATCH_INVALID_OP")
+    kind, poi_id, data = op['op'], op.get('id'), op.get('data')
+    if kind != 'create' and (not isinstance(poi_id, int) or isinstance(poi_id, bool)):
+        raise BusinessException(f"{kind} 操作必须提供整数 id", error_code="BATCH_MISSING_ID")
+    if kind == 'delete':
+        return kind, poi_id, None
+    if not isinstance(data, dict) or (kind == 'update' and not data):
+        raise BusinessException(f"{kind} 操作必须提供 data 对象", error_code="BATCH_MISSING_DATA")
+    return kind, poi_id, _validated_poi_fields(data, partial=(kind == 'update'))
+
+
+def _apply_batch(items, user_id):
+    """在当前事务中用批量语句执行一组已校验的操作并写入变更日志; 返回 (结果 {序号: POI ID}, 变更的ID, 删除的ID)"""
+    now = datetime.datetime.utcnow()
+    results, changed, deleted = {}, [], []
+    log = {} # 序号 -> (POI ID, 操作, 版本号)
+    creates = [(i, data) for i, kind, _, data in items if kind == 'create']
+    if creates:
+        # 每行的键一致, 才能作为一条 executemany 语句执行并按顺序返回新ID
+        blank = dict.fromkeys(_POI_WRITABLE_FIELDS)
+        rows = [{**blank, **data, 'has_image': bool(data.get('has_image')), 'has_website': bool(data.get('has_website')),
+                 'created_by': user_id, 'created_on': now, 'updated_on': now} for _, data in creates]
+        new_ids = db.session.scalars(insert(POI).returning(POI.id, sort_by_parameter_order=True), rows).all()
+        for (i, _), poi_id in zip(creates, new_ids):
+            results[i] = poi_id
+            changed.append(poi_id)
+            log[i] = (poi_id, 'insert', 1)
+    updates = [(i, poi_id, data) for i, kind, poi_id, data in items if kind == 'update']
+    if updates:
+        # 按修改的列分组, 每组一条 executemany 的 UPDATE, 同时递增版本号
+        table = POI.__table__
+        groups = {}
+        for _, poi_id, data in updates:
+            groups.setdefault(tuple(sorted(data)), []).append((poi_id, data))
+        for keys, group in groups.items():
+            stmt = update(table).where(table.c.id == bindparam('b_id')).values(
+                {**{key: bindparam(f"b_{key}") for key in keys}, 'version': table.c.version + 1, 'updated_on': now})
+            db.session.execute(stmt, [{'b_id': poi_id, **{f"b_{key}": value for key, value in data.items()}}
+                                      for poi_id, data in group])
+        versions = dict(db.session.execute(select(POI.id, POI.version).where(POI.id.in_([poi_id for _, poi_id, _ in updates]))).all())
+        for i, poi_id, _ in updates:
+            results[i] = poi_id
+            changed.append(poi_id)
+            log[i] = (poi_id, 'update', versions.get(poi_id))
+    deletes = [(i, poi_id) for i, kind, poi_id, _ in items if kind == 'delete']
+    if deletes:
+        versions = dict(db.session.execute(select(POI.id, POI.version).where(POI.id.in_([poi_id for _, poi_id in deletes]))).all())
+        db.session.execute(delete(POI).where(POI.id.in_([poi_id for _, poi_id in deletes])),
+                           execution_options={'synchronize_session': False})
+        for i, poi_id in deletes:
+            results[i] = poi_id
+            deleted.append(poi_id)
+            log[i] = (poi_id, 'delete', versions.get(poi_id))
+    record_changes(log[i] for i in sorted(log))
+    return results, changed, deleted
+
+
+@poi_ns.route(':batch')
+@poi_ns.doc(security='jsonWebToken')
+class POIBatchAdmin(Resource):
+    @admin_required
+    @poi_ns.expect(models['poi_batch_input'])
+    @poi_ns.marshal_with(models['poi_batch_response'])
+    @poi_ns.response(400, '输入无效 (原子模式下任意一项无效时整批不生效)', models['poi_batch_response'])
+    @poi_ns.response(401, 'Token无效或缺失', models['error_response'])
+    @poi_ns.response(403, '无管理员权限', models['error_response'])
+    def post(self):
+        """
+        [管理员] 批量创建、更新、删除POI
+        整批只做一次认证, 用批量 INSERT/UPDATE/DELETE 语句执行, 提交后内存索引和查询缓存只刷新一次。
+        atomic=true (默认) 时所有操作在一个事务中执行, 任意一项无效则整批不生效;
+        atomic=false 时每500项一个事务, 无效项和所在事务失败的项在结果中单独报告。
+        """
+        data = poi_ns.payload or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            raise BusinessException("operations 必须是非空的操作列表", status_code=400, error_code="BATCH_INVALID_OPS")
+        if len(operations) > BATCH_WRITE_MAX_OPS:
+            raise BusinessException(f"单次最多 {BATCH_WRITE_MAX_OPS} 项操作", status_code=400, error_code="BATCH_TOO_LARGE")
+        atomic = data.get('atomic', True) is not False
+
+        # 逐项校验, 并一次查询确认 update/delete 的目标存在
+        results = [{'index': i, 'op': op.get('op') if isinstance(op, dict) else None,
+                    'id': op.get('id') if isinstance(op, dict) else None, 'status': 'ok'}
+                   for i, op in enumerate(operations)]
+        items, seen_ids = [], set()
+        for i, op in enumerate(operations):
+            try:
+                kind, poi_id, fields_ = _check_batch_operation(op)
+                if poi_id is not None:
+                    if poi_id in seen_ids:
+                        raise BusinessException("同一个POI在一批操作中只能出现一次", error_code="BATCH_DUPLICATE_ID")
+                    seen_ids.add(poi_id)
+                items.append((i, kind, poi_id, fields_))
+            except BusinessException as e:
+                results[i].update(status='error', error_code=e.error_code, message=e.message)
+        if seen_ids:
+            existing = set()
+            target_ids = list(seen_ids)
+            for start in range(0, len(target_ids), 5000):
+                existing.update(db.session.scalars(select(POI.id).where(POI.id.in_(target_ids[start:start + 5000]))))
+            for i, kind, poi_id, _ in items:
+                if poi_id is not None and poi_id not in existing:
+                    results[i].update(status='error', error_code="POI_NOT_FOUND", message=f"ID为 {poi_id} 的POI未找到")
+            items = [item for item in items if results[item[0]]['status'] == 'ok']
+
+        failed = sum(r['status'] == 'error' for r in results)
+        if atomic and failed:
+            for r in results:
+                if r['status'] == 'ok':
+                    r['status'] = 'skipped'
+            return self._response(results, 'error', f"{failed} 项操作无效, 整批未执行"), 400
+
+        chunks = [items] if atomic else [items[i:i + BATCH_WRITE_CHUNK_SIZE] for i in range(0, len(items), BATCH_WRITE_CHUNK_SIZE)]
+        changed, deleted = [], []
+        for chunk in chunks:
+            if not chunk:
+                continue
+            try:
+                chunk_results, chunk_changed, chunk_deleted = _apply_batch(chunk, g.current_user.id)
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                if atomic:
+                    raise
+                current_app.logger.error(f"Batch write chunk failed: {e}")
+                for i, _, _, _ in chunk:
+                    results[i].update(status='error', error_code="BATCH_WRITE_FAILED", message="所在事务写入失败, 已回滚")
+                continue
+            for i, poi_id in chunk_results.items():
+                results[i]['id'] = poi_id
+            changed.extend(chunk_changed)
+            deleted.extend(chunk_deleted)
+
+        if changed or deleted:
+            reindex_pois(changed, deleted)
+        return self._response(results, 'success', None), 200
+
+    @staticmethod
+    def _response(results, status, message):
+        counts = {'create': 0, 'update': 0, 'delete': 0}
+        for r in results:
+            if r['status'] == 'ok':
+                counts[r['op']] += 1
+        return {'status': status, 'message': message, 'results': results, 'created': counts['create'],
+                'updated': counts['update'], 'deleted': counts['delete'],
+                'failed': sum(r['status'] == 'error' for r in results)}
+
+
+@poi_ns.route('/cache/stats')
+@poi_ns.doc(security='jsonWebToken')
+class POICacheStatsAdmin(Resource):
+    @admin_required
+    @poi_ns.marshal_with(models['cache_stats_response'])
+    @poi_ns.response(401, 'Token无效或缺失', models['error_response'])
+    @poi_ns.response(403, '无管理员权限', models['error_response'])
+    def get(self):
+        """[管理员] 查看查询结果缓存、请求合并、认证缓存、瓦片缓存与列式快照的统计"""
+        return {'status': 'success', 'cache': search_cache.stats(), 'singleflight': request_coalescer.stats(),
+                'auth': auth_cache.stats(), 'tiles': tile_cache.stats(), 'snapshot': snapshot_store.stats(),
+                'changes': change_feed.stats()}, 200
+
+
 # --- Public Routes (需要API Key, 并进行限流) ---
+def _add_attribute_arguments(parser):
+    """添加各公众查询接口共用的属性筛选参数"""
+    parser.add_argument('name', type=str, help='按名称查询 (模糊匹配)', location='args')
+    parser.add_argument('province', type=str, help='按省份查询', location='args')
+    parser.add_argument('category', type=str, help='按类别查询', location='args')
+    parser.add_argument('has_image', type=inputs.boolean, help='是否包含图片 (true/false)', location='args')
+    parser.add_argument('has_website', type=inputs.boolean, help='是否包含官网 (true/false)', location='args')
+    return parser
+
+
+def _attribute_filters(args):
+    """根据属性筛选参数构建 SQL 条件列表 (名称条件在名称索引就绪时由 _name_candidates 处理)"""
+    filters = []
+    if args.get('name') and not name_index.ready:
+        filters.append(POI.name.ilike(f"%{args['name']}%")) # 模糊查询
+    if args.get('province'):
+        filters.append(POI.province == args['province'])
+    if args.get('category'):
+        filters.append(POI.category == args['category'])
+
+    if args.get('has_image') is not None:
+        filters.append(POI.has_image == args['has_image'])
+    if args.get('has_website') is not None:
+        filters.append(POI.has_website == args['has_website'])
+    return filters
+
+
+def _name_candidates(args):
+    """通过名称 n-gram 索引把名称模糊条件解析为候选ID (升序数组); 无名称条件或索引未就绪时返回 None"""
+    if not args.get('name') or not name_index.ready:
+        return None
+    return name_index.search(args['name'])
+
+
 # 定义查询参数
-query_parser = reqparse.RequestParser()
-query_parser.add_argument('name', type=str, help='按名称查询 (模糊匹配)', location='args')
-query_parser.add_argument('province', type=str, help='按省份查询', location='args')
-query_parser.add_argument('category', type=str, help='按类别查询', location='args')
-query_parser.add_argument('has_image', type=fields.Boolean, help='是否包含图片 (true/false)', location='args')
-query_parser.add_argument('has_website', type=fields.Boolean, help='是否包含官网 (true/false)', location='args')
+query_parser = _add_attribute_arguments(reqparse.RequestParser())
 # 拉框查询参数 (min_lat, min_lon, max_lat, max_lon)
 query_parser.add_argument('min_lat', type=float, help='最小纬度 (用于拉框查询)', location='args')
 query_parser.add_argument('min_lon', type=float, help='最小经度 (用于拉框查询)', location='args')
@@ -99,9 +386,350 @@ query_parser.add_argument('max_lon', type=float, help='最大经度 (用于拉
 query_parser.add_argument('center_lat', type=float, help='中心点纬度 (用于圆形查询)', location='args')
 query_parser.add_argument('center_lon', type=float, help='中心点经度 (用于圆形查询)', location='args')
 query_parser.add_argument('radius_km', type=float, help='半径 (公里, 用于圆形查询)', location='args')
+# 排序参数
+query_parser.add_argument('order_by', type=str, choices=('name', 'distance'), default='name', help='排序方式: name 或 distance (distance 需配合圆形查询)', location='args')
 # 分页参数
 query_parser.add_argument('page', type=int, default=1, help='页码', location='args')
 query_parser.add_argument('per_page', type=int, default=10, help='每页数量 (最大100)', location='args')
+query_parser.add_argument('cursor', type=str, help='游标分页: 上一页响应中的 next_cursor (提供时忽略 page)', location='args')
+query_parser.add_argument('include_total', type=str, choices=('true', 'false', 'estimate'), default='true', help='是否返回总数: true 精确计数, false 不计数, estimate 估计值', location='args')
+query_parser.add_argument('fields', type=str, help='只返回指定字段, 逗号分隔, 如 id,name,latitude,longitude,category (可含 distance_m)', location='args')
+query_parser.add_argument('facets', type=str, help='同时返回分面计数, 逗号分隔, 可选 province,category,has_image,has_website', location='args')
+
+_SEARCH_ITEM_FIELDS = POI_OUTPUT_FIELDS + ('distance_m',)
+
+
+def _selected_fields(value, allowed):
+    try:
+        return parse_fields(value, allowed)
+    except ValueError as e:
+        raise BusinessException(str(e), status_code=400, error_code="QUERY_INVALID_FIELDS")
+
+
+def _normalize_search_args(args, snap_bbox=True):
+    """归一化查询参数: 既作为缓存键, 也是实际执行查询所用的参数。
+
+    snap_bbox 为 False 时保留调用方给出的拉框边界 (导出不经过缓存, 不需要对齐)。
+    """
+    args = {k: v for k, v in args.items() if v is not None}
+    args['page'] = max(args.get('page') or 1, 1)
+    args['per_page'] = max(min(args.get('per_page') or 10, 100), 1) # 每页最多100条
+    args['order_by'] = args.get('order_by') or 'name'
+    args['include_total'] = args.get('include_total') or 'true'
+    if args.get('name'):
+        args['name'] = args['name'].strip().casefold() # 名称匹配不区分大小写
+    selected = _selected_fields(args.pop('fields', None), _SEARCH_ITEM_FIELDS)
+    if selected:
+        args['fields'] = ','.join(selected)
+    facets = args.pop('facets', None)
+    if facets:
+        try:
+            facets = parse_fields(facets, FACET_FIELDS)
+        except ValueError as e:
+            raise BusinessException(str(e), status_code=400, error_code="QUERY_INVALID_FACETS")
+        args['facets'] = ','.join(facets)
+    if snap_bbox:
+        _snap_bbox(args)
+    return args
+
+
+def _snap_bbox(args):
+    """拉框边界向外对齐到 SEARCH_CACHE_BBOX_SNAP_DEG 网格, 相差不到一个网格的地图视野落到同一个缓存条目。
+
+    对齐后的框既是缓存键也是实际查询的范围, 因此只在扩出的边带内没有任何 POI (结果与原框完全相同) 时才对齐;
+    空间索引未就绪或边带内有 POI 时保留原框。
+    """
+    snap = current_app.config.get('SEARCH_CACHE_BBOX_SNAP_DEG', 0)
+    keys = ('min_lat', 'min_lon', 'max_lat', 'max_lon')
+    if not snap or not spatial_index.ready or not all(args.get(k) is not None and math.isfinite(args[k]) for k in keys):
+        return
+    min_lat, min_lon, max_lat, max_lon = (args[k] for k in keys)
+    if min_lat > max_lat or min_lon > max_lon: # 无效的框留给 _spatial_conditions 报错
+        return
+    s_min_lat, s_min_lon = round(math.floor(min_lat / snap) * snap, 9), round(math.floor(min_lon / snap) * snap, 9)
+    s_max_lat, s_max_lon = round(math.ceil(max_lat / snap) * snap, 9), round(math.ceil(max_lon / snap) * snap, 9)
+    # 扩出的部分为上下左右四条边带 (min_lon, min_lat, max_lon, max_lat), 宽度为 0 的边带跳过
+    strips = [
+        (s_min_lon, s_min_lat, s_max_lon, min_lat, s_min_lat < min_lat),
+        (s_min_lon, max_lat, s_max_lon, s_max_lat, max_lat < s_max_lat),
+        (s_min_lon, min_lat, min_lon, max_lat, s_min_lon < min_lon),
+        (max_lon, min_lat, s_max_lon, max_lat, max_lon < s_max_lon),
+    ]
+    for strip_min_lon, strip_min_lat, strip_max_lon, strip_max_lat, nonempty in strips:
+        # 边带与原框的公共边上的点也算在内: 宁可不对齐, 也不让结果多出原框外的 POI
+        if nonempty and len(spatial_index.query_bbox(strip_min_lon, strip_min_lat, strip_max_lon, strip_max_lat)[0]):
+            return
+    args.update(min_lat=s_min_lat, min_lon=s_min_lon, max_lat=s_max_lat, max_lon=s_max_lon)
+
+
+def _search_pois(args):
+    """执行 /search 查询, 返回响应字典"""
+    page, per_page = args['page'], args['per_page']
+    cursor = _decode_cursor(args['cursor']) if args.get('cursor') else None
+    include_total = args['include_total']
+
+    # 只查询输出需要的列, 结果为行元组; name 和 id 是排序和游标所需
+    selected = args['fields'].split(',') if args.get('fields') else None
+    names, columns = poi_columns(selected, required=('id', 'name'))
+    query = db.session.query(*columns)
+
+    # 构建查询条件
+    filters = _attribute_filters(args)
+    name_ids = _name_candidates(args)
+    if name_ids is not None and len(name_ids) == 0:
+        return _empty_page(page, per_page)
+
+    spatial_bbox, circle = _spatial_conditions(args)
+    if circle:
+        center_lat, center_lon, radius_km = circle
+
+    order_by = args['order_by']
+    if order_by == 'distance' and not circle:
+        raise BusinessException("按距离排序需要提供 center_lat, center_lon, radius_km", status_code=400, error_code="QUERY_INVALID_ORDER")
+    if order_by == 'distance' and cursor:
+        raise BusinessException("游标分页仅支持按名称排序", status_code=400, error_code="QUERY_INVALID_CURSOR")
+
+    distances = None # poi_id -> 到圆心的距离 (米)
+    if spatial_bbox is not None:
+        ids, lons, lats = _spatial_candidates(spatial_bbox)
+        if name_ids is not None: # 与名称索引的候选集合求交
+            keep = np.isin(ids, name_ids, assume_unique=True)
+            ids, lons, lats = ids[keep], lons[keep], lats[keep]
+        if circle:
+            # 对外包框内的候选点做精确的球面距离过滤
+            dist_m = haversine_km(center_lat, center_lon, lats, lons) * 1000.0
+            inside = dist_m <= radius_km * 1000.0
+            ids, dist_m = ids[inside], dist_m[inside]
+        if len(ids) == 0:
+            return _empty_page(page, per_page)
+
+        if order_by == 'distance':
+            # 距离排序在内存中完成: SQL 只负责筛掉不满足属性条件的ID, 再按页取整行
+            if filters:
+                matched = [row[0] for row in db.session.query(POI.id).filter(POI.id.in_(ids.tolist()), *filters)]
+                keep = np.isin(ids, np.array(matched, dtype=np.int64))
+                ids, dist_m = ids[keep], dist_m[keep]
+            order = np.argsort(dist_m, kind='stable')
+            page_slots = order[(page - 1) * per_page:page * per_page]
+            page_ids = ids[page_slots].tolist()
+            rows = {row.id: row for row in query.filter(POI.id.in_(page_ids))} if page_ids else {}
+            pois = serialize_poi_rows((rows[poi_id] for poi_id in page_ids), names, selected,
+                                      dict(zip(page_ids, dist_m[page_slots].tolist())))
+            total = len(ids)
+            return shaped(models['poi_list_response'],
+                status='success',
+                pois=pois,
+                total=total,
+                total_estimated=False,
+                page=page,
+                pages=math.ceil(total / per_page),
+                per_page=per_page,
+                next_cursor=None
+            )
+
+        if circle:
+            distances = dict(zip(ids.tolist(), dist_m.tolist()))
+        if len(ids) < len(spatial_index) or not spatial_index.ready: # 覆盖全部POI时无需再加ID条件
+            filters.append(POI.id.in_(ids.tolist()))
+    elif name_ids is not None:
+        filters.append(POI.id.in_(name_ids.tolist()))
+
+    if filters:
+        query = query.filter(and_(*filters))
+
+    # 按名称排序, 以 id 打破并列, 保证分页和游标的顺序稳定
+    query = query.order_by(POI.name, POI.id)
+    if cursor:
+        # 游标模式: 直接定位到上一页最后一行 (name, id) 之后, 代价与页码无关
+        last_name, last_id = cursor
+        page_query = query.filter(or_(POI.name > last_name, and_(POI.name == last_name, POI.id > last_id)))
+    else:
+        page_query = query.offset((page - 1) * per_page)
+    # 多取一行用于判断是否还有下一页, 不需要 COUNT(*)
+    items = page_query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    total, total_estimated = None, False
+    if include_total == 'true':
+        total = query.order_by(None).count()
+    elif include_total == 'estimate':
+        total, total_estimated = _estimate_total(query)
+
+    return shaped(models['poi_list_response'],
+        status='success',
+        pois=serialize_poi_rows(items, names, selected, distances),
+        total=total,
+        total_estimated=total_estimated,
+        page=None if cursor else page,
+        pages=math.ceil(total / per_page) if total is not None else None,
+        per_page=per_page,
+        next_cursor=_encode_cursor(items[-1].name, items[-1].id) if has_more else None
+    )
+
+
+def _search_snapshot(args, snapshot):
+    """在列式快照上执行 /search 查询, 条件、排序、分页与响应结构均与 _search_pois 相同, 不访问数据库"""
+    page, per_page = args['page'], args['per_page']
+    cursor = _decode_cursor(args['cursor']) if args.get('cursor') else None
+    include_total = args['include_total']
+    selected = args['fields'].split(',') if args.get('fields') else None
+    names, _ = poi_columns(selected, required=('id', 'name'))
+
+    where = {name: args[name] for name in ('province', 'category') if args.get(name)}
+    where.update({name: args[name] for name in ('has_image', 'has_website') if args.get(name) is not None})
+    name_ids = _name_candidates(args)
+    if name_ids is not None and len(name_ids) == 0:
+        return _empty_page(page, per_page)
+    if args.get('name') and name_ids is None: # 名称索引未就绪时在快照的名称取值表上做子串匹配
+        where['name'] = args['name']
+
+    spatial_bbox, circle = _spatial_conditions(args)
+    order_by = args['order_by']
+    if order_by == 'distance' and not circle:
+        raise BusinessException("按距离排序需要提供 center_lat, center_lon, radius_km", status_code=400, error_code="QUERY_INVALID_ORDER")
+    if order_by == 'distance' and cursor:
+        raise BusinessException("游标分页仅支持按名称排序", status_code=400, error_code="QUERY_INVALID_CURSOR")
+
+    mask, dist_m = snapshot.match(ids=name_ids, bbox=spatial_bbox, circle=circle)
+    if spatial_bbox is not None and not mask.any():
+        return _empty_page(page, per_page)
+    mask &= snapshot.match(where)[0]
+
+    if order_by == 'distance':
+        matched = np.flatnonzero(mask)
+        order = matched[np.argsort(dist_m[matched], kind='stable')]
+        page_slots = order[(page - 1) * per_page:page * per_page]
+        rows = snapshot.rows(page_slots, names)
+        total = len(order)
+        return shaped(models['poi_list_response'],
+            status='success',
+            pois=serialize_poi_rows(rows, names, selected, dict(zip(snapshot.ids[page_slots].tolist(), dist_m[page_slots].tolist()))),
+            total=total,
+            total_estimated=False,
+            page=page,
+            pages=math.ceil(total / per_page),
+            per_page=per_page,
+            next_cursor=None
+        )
+
+    order = snapshot.name_sorted(mask, after=cursor)
+    start = 0 if cursor else (page - 1) * per_page
+    page_slots = order[start:start + per_page + 1]
+    has_more = len(page_slots) > per_page
+    page_slots = page_slots[:per_page]
+    rows = snapshot.rows(page_slots, names)
+    distances = dict(zip(snapshot.ids[page_slots].tolist(), dist_m[page_slots].tolist())) if circle else None
+
+    total = int(mask.sum()) if include_total in ('true', 'estimate') else None
+    last = dict(zip(names, rows[-1])) if rows else None
+    return shaped(models['poi_list_response'],
+        status='success',
+        pois=serialize_poi_rows(rows, names, selected, distances),
+        total=total,
+        total_estimated=False,
+        page=None if cursor else page,
+        pages=math.ceil(total / per_page) if total is not None else None,
+        per_page=per_page,
+        next_cursor=_encode_cursor(last['name'], last['id']) if has_more else None
+    )
+
+
+def _search_facets(args):
+    """按 /search 的筛选条件从分面索引统计计数: 属性条件在计数立方体上汇总, 名称和空间条件先解析为候选 ID"""
+    if not facet_index.ready or (args.get('name') and not name_index.ready):
+        raise BusinessException("分面索引尚未就绪，请稍后重试", status_code=503, error_code="FACET_INDEX_NOT_READY")
+    where = {name: args[name] for name in ('province', 'category') if args.get(name)}
+    where.update({name: args[name] for name in ('has_image', 'has_website') if args.get(name) is not None})
+
+    ids = None
+    spatial_bbox, circle = _spatial_conditions(args)
+    if spatial_bbox is not None:
+        ids, lons, lats = _spatial_candidates(spatial_bbox)
+        if circle:
+            center_lat, center_lon, radius_km = circle
+            ids = ids[haversine_km(center_lat, center_lon, lats, lons) <= radius_km]
+    name_ids = _name_candidates(args)
+    if name_ids is not None:
+        ids = name_ids if ids is None else ids[np.isin(ids, name_ids, assume_unique=True)]
+    return facet_index.counts(args['facets'].split(','), where, ids.tolist() if ids is not None else None)
+
+
+def _spatial_conditions(args):
+    """校验空间查询参数, 返回 (外包框, 圆形条件)。
+
+    拉框 / 中心半径统一归结为一个经纬度外包框 (min_lon, min_lat, max_lon, max_lat), 没有空间条件时为 None;
+    圆形条件为 (center_lat, center_lon, radius_km), 没有时为 None。
+    """
+    spatial_bbox = None
+
+    # 拉框查询 (Bounding Box)
+    min_lat, min_lon, max_lat, max_lon = args.get('min_lat'), args.get('min_lon'), args.get('max_lat'), args.get('max_lon')
+    if all(v is not None for v in [min_lat, min_lon, max_lat, max_lon]):
+        if not all(math.isfinite(v) for v in [min_lat, min_lon, max_lat, max_lon]) or min_lat > max_lat or min_lon > max_lon:
+             raise BusinessException("拉框查询参数无效：最小纬度/经度不能大于最大纬度/经度", status_code=400, error_code="QUERY_INVALID_BBOX")
+        spatial_bbox = (min_lon, min_lat, max_lon, max_lat)
+    
+    # 中心半径查询 (Center Radius): 先取圆的外包框作为空间粗筛, 再按大圆距离精确过滤
+    center_lat, center_lon, radius_km = args.get('center_lat'), args.get('center_lon'), args.get('radius_km')
+    circle = None
+    if all(v is not None for v in [center_lat, center_lon, radius_km]):
+        if not all(math.isfinite(v) for v in [center_lat, center_lon, radius_km]):
+            raise BusinessException("圆形查询参数必须是有限数值", status_code=400, error_code="QUERY_INVALID_RADIUS")
+        if radius_km <= 0:
+            raise BusinessException("圆形查询半径必须大于0", status_code=400, error_code="QUERY_INVALID_RADIUS")
+        circle = (center_lat, center_lon, radius_km)
+        circle_bbox = bbox_around(center_lat, center_lon, radius_km)
+        if spatial_bbox is None:
+            spatial_bbox = circle_bbox
+        else: # 同时给出拉框和圆形条件时取两个外包框的交集
+            spatial_bbox = (max(spatial_bbox[0], circle_bbox[0]), max(spatial_bbox[1], circle_bbox[1]),
+                            min(spatial_bbox[2], circle_bbox[2]), min(spatial_bbox[3], circle_bbox[3]))
+    return spatial_bbox, circle
+
+
+def _spatial_candidates(bbox):
+    """返回外包框内的 POI (ids, lons, lats); 空间索引未就绪时回退到 SQL 范围查询"""
+    if spatial_index.ready:
+        return spatial_index.query_bbox(*bbox)
+    rows = db.session.query(POI.id, POI.longitude, POI.latitude).filter(
+        POI.longitude.between(bbox[0], bbox[2]), POI.latitude.between(bbox[1], bbox[3])).all()
+    coords = np.array([(lon, lat) for _, lon, lat in rows], dtype=np.float64).reshape(-1, 2)
+    return np.array([r[0] for r in rows], dtype=np.int64), coords[:, 0], coords[:, 1]
+
+
+def _empty_page(page, per_page):
+    return shaped(models['poi_list_response'], status='success', pois=[], total=0, total_estimated=False,
+                  page=page, pages=0, per_page=per_page)
+
+
+def _encode_cursor(name, poi_id):
+    """把当前页最后一行的排序键编码为不透明的游标字符串"""
+    raw = json.dumps([name, poi_id], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, poi_id = json.loads(raw.decode('utf-8'))
+        if not isinstance(name, str) or not isinstance(poi_id, int):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise BusinessException("cursor 参数无效", status_code=400, error_code="QUERY_INVALID_CURSOR")
+    return name, poi_id
+
+
+def _estimate_total(query):
+    """PostgreSQL 下用查询规划器的行数估计代替 COUNT(*); 其他数据库回退为精确计数"""
+    query = query.order_by(None)
+    if db.engine.dialect.name != 'postgresql':
+        return query.count(), False
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows']), True
 
 
 @poi_ns.route('/search')
@@ -112,97 +740,461 @@ class POISearchPublic(Resource):
     method_decorators = [apikey_required, rate_limit_decorator("10/minute")] 
 
     @poi_ns.expect(query_parser)
-    @poi_ns.marshal_with(models['poi_list_response'])
+    @poi_ns.response(200, 'Success', models['poi_list_response'])
     @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
     @poi_ns.response(429, '请求频率过高', models['error_response']) # Rate limit exceeded
+    @poi_ns.response(503, '相同的查询正在执行, 等待超时', models['error_response'])
     def get(self):
         """
         [公众] 查询POI列表 (需要X-API-KEY头)
         支持多种查询条件和分页。
         - 拉框查询: 提供 min_lat, min_lon, max_lat, max_lon
-        - 圆形查询: 提供 center_lat, center_lon, radius_km (此示例中未完整实现，需要空间数据库支持)
-        """
-        args = query_parser.parse_args()
-        page = args.get('page', 1)
-        per_page = min(args.get('per_page', 10), 100) # 每页最多100条
-
-        query = POI.query
-
-        # 构建查询条件
-        filters = []
-        if args.get('name'):
-            filters.append(POI.name.ilike(f"%{args['name']}%")) # 模糊查询
-        if args.get('province'):
-            filters.append(POI.province == args['province'])
-        if args.get('category'):
-            filters.append(POI.category == args['category'])
-        
-        if args.get('has_image') is not None:
-            filters.append(POI.has_image == args['has_image'])
-        if args.get('has_website') is not None:
-            filters.append(POI.has_website == args['has_website'])
-
-        # 拉框查询 (Bounding Box)
-        min_lat, min_lon, max_lat, max_lon = args.get('min_lat'), args.get('min_lon'), args.get('max_lat'), args.get('max_lon')
-        if all(v is not None for v in [min_lat, min_lon, max_lat, max_lon]):
-            if min_lat > max_lat or min_lon > max_lon:
-                 raise BusinessException("拉框查询参数无效：最小纬度/经度不能大于最大纬度/经度", status_code=400, error_code="QUERY_INVALID_BBOX")
-            filters.append(POI.latitude >= min_lat)
-            filters.append(POI.latitude <= max_lat)
-            filters.append(POI.longitude >= min_lon)
-            filters.append(POI.longitude <= max_lon)
-        
-        # 中心半径查询 (Center Radius)
-        # 注意: 这是一个简化的、不精确的基于经纬度的近似计算。
-        # 实际应用中，应使用数据库的空间函数 (如 PostGIS 的 ST_DWithin) 来进行精确的地理半径查询。
-        center_lat, center_lon, radius_km = args.get('center_lat'), args.get('center_lon'), args.get('radius_km')
-        if all(v is not None for v in [center_lat, center_lon, radius_km]):
-            if radius_km <= 0:
-                raise BusinessException("圆形查询半径必须大于0", status_code=400, error_code="QUERY_INVALID_RADIUS")
-            # 粗略的边界框近似，实际应使用球面距离计算或数据库空间函数
-            # 1度纬度约等于111km
-            # 1度经度约等于111km * cos(纬度)
-            # 这里为了简化，不进行精确的边界框计算，而是提示用户这部分需要后端空间能力
-            current_app.logger.warning("中心半径查询在此示例中为简化版，生产环境请使用PostGIS等空间数据库功能。")
-            # 示例性的粗略过滤 (非常不精确)
-            lat_diff = radius_km / 111.0
-            lon_diff = radius_km / (111.0 * math.cos(math.radians(center_lat)) if center_lat != 0 else 111.0)
-            filters.append(POI.latitude.between(center_lat - lat_diff, center_lat + lat_diff))
-            filters.append(POI.longitude.between(center_lon - lon_diff, center_lon + lon_diff))
-            # 更好的做法是，如果数据库不支持，就在应用层面获取一个更大的 BBox 内的数据，然后再用精确的 Haversine 公式过滤
-            # 此处仅作为提示，不添加不精确的过滤器
-            pass # 提示：此处应有空间查询逻辑
-
-        if filters:
-            query = query.filter(and_(*filters))
-
-        pagination = query.order_by(POI.name).paginate(page=page, per_page=per_page, error_out=False)
-        pois = pagination.items
-        
-        return {
-            'status': 'success',
-            'pois': [p.to_dict() for p in pois], # 使用 to_dict() 确保与 DTO 定义一致
-            'total': pagination.total,
-            'page': pagination.page,
-            'pages': pagination.pages,
-            'per_page': pagination.per_page
-        }, 200
+        - 圆形查询: 提供 center_lat, center_lon, radius_km (按大圆距离精确筛选, 结果附带 distance_m)
+        - 距离排序: 圆形查询时可指定 order_by=distance
+        - 游标分页: 按名称排序时响应中的 next_cursor 可作为下一次请求的 cursor 参数, 不再使用 OFFSET
+        - 总数: include_total=false 不统计总数, include_total=estimate 使用数据库规划器的估计值
+        - 分面: facets=province,category 同时返回各取值的数量 (由内存计数索引给出, 每个分面忽略自身字段的条件)
+        启用 SNAPSHOT_ENABLED 时在内存列式快照上查询, 不访问数据库 (名称按 Unicode 码位排序)。
+        结果按归一化后的查询参数缓存 (扩出部分没有 POI 时拉框边界向外对齐到 SEARCH_CACHE_BBOX_SNAP_DEG 网格), POI 写入后失效。
+        """
+        args = _normalize_search_args(query_parser.parse_args())
+        cache_key = search_cache.make_key('search', args)
+        result = search_cache.get(cache_key)
+        if result is not None:
+            return json_response(result, headers={'X-Cache': 'HIT'})
+
+        def compute():
+            # 先取缓存代数再读数据: 计算期间有写入 (缓存已失效) 时不把可能过期的结果写回缓存
+            generation = search_cache.generation()
+            if snapshot_store.enabled:
+                snapshot = snapshot_store.current()
+                result = _search_snapshot(args, snapshot)
+                cacheable = snapshot_store.is_current(snapshot) # 快照正在后台重新载入时结果可能过期
+            else:
+                result, cacheable = _search_pois(args), True
+            if args.get('facets'):
+                result['facets'] = _search_facets(args)
+            if cacheable:
+                search_cache.set(cache_key, result, generation)
+            return dumps(result)
+        # 同时到达的相同查询只执行一次, 其余请求共享这次编码后的响应
+        return json_response(request_coalescer.do(cache_key, compute), headers={'X-Cache': 'MISS'})
+
+
+# 全量导出参数: 与 /search 相同的筛选条件, 不分页、不排序 (按 id 顺序输出)
+export_parser = query_parser.copy()
+for _name in ('order_by', 'page', 'per_page', 'cursor', 'include_total'):
+    export_parser.remove_argument(_name)
+export_parser.add_argument('format', type=str, choices=tuple(EXPORT_FORMATS), default='geojson', help='导出格式: geojson, ndjson 或 csv', location='args')
+
+EXPORT_CHUNK_ROWS = 2000 # 服务端游标每批取出并编码的行数
+
+
+def _export_batches(args, selected):
+    """按筛选条件以服务端游标 (yield_per) 分批读取, 逐批产生输出字典列表"""
+    names, columns = poi_columns(selected)
+    filters = _attribute_filters(args)
+    name_ids = _name_candidates(args)
+    if name_ids is not None:
+        if len(name_ids) == 0:
+            return
+        filters.append(POI.id.in_(name_ids.tolist()))
+    spatial_bbox, circle = _spatial_conditions(args)
+    if spatial_bbox is not None: # 外包框用 SQL 范围条件, 圆形条件在每批内精确过滤
+        filters.append(POI.longitude.between(spatial_bbox[0], spatial_bbox[2]))
+        filters.append(POI.latitude.between(spatial_bbox[1], spatial_bbox[3]))
+        if circle: # 精确过滤需要经纬度, 未选择的列临时加入查询, 输出时不包含
+            for name, column in (('latitude', POI.latitude), ('longitude', POI.longitude)):
+                if name not in names:
+                    columns += (column,)
+                    names += (name,)
+
+    stmt = select(*columns).where(*filters).order_by(POI.id).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    for rows in db.session.execute(stmt).partitions():
+        distances = None
+        if circle:
+            center_lat, center_lon, radius_km = circle
+            lats = np.fromiter((row.latitude for row in rows), dtype=np.float64, count=len(rows))
+            lons = np.fromiter((row.longitude for row in rows), dtype=np.float64, count=len(rows))
+            dist_m = haversine_km(center_lat, center_lon, lats, lons) * 1000.0
+            inside = (dist_m <= radius_km * 1000.0).tolist()
+            rows = [row for row, keep in zip(rows, inside) if keep]
+            distances = dict(zip((row.id for row in rows), dist_m[np.array(inside, dtype=bool)].tolist()))
+        yield serialize_poi_rows(rows, names, selected, distances)
+
+
+@poi_ns.route('/export')
+@poi_ns.doc(security='apiKey')
+class POIExportPublic(Resource):
+    method_decorators = [apikey_required, rate_limit_decorator("2/minute")]
+
+    @poi_ns.expect(export_parser)
+    @poi_ns.response(200, '导出文件 (流式传输)')
+    @poi_ns.response(400, '查询参数无效', models['error_response'])
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    def get(self):
+        """
+        [公众] 导出满足筛选条件的全部POI (需要X-API-KEY头)
+        筛选参数与 /search 相同, 结果按 id 顺序以分块传输流式输出, 不分页也不统计总数。
+        - format=geojson: GeoJSON FeatureCollection, 经纬度在 geometry 中
+        - format=ndjson: 每行一个 POI 的 JSON 对象
+        - format=csv: 首行为表头
+        请求头带 Accept-Encoding: gzip 时边生成边压缩。
+        """
+        args = _normalize_search_args(export_parser.parse_args(), snap_bbox=False)
+        fmt = args.pop('format')
+        selected = args['fields'].split(',') if args.get('fields') else None
+        if selected and fmt == 'geojson': # geometry 需要经纬度
+            selected = [name for name in _SEARCH_ITEM_FIELDS if name in selected or name in ('latitude', 'longitude')]
+        names = selected or list(_SEARCH_ITEM_FIELDS)
+        # 先校验参数, 参数错误在开始输出前以 400 返回
+        _spatial_conditions(args)
+
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        chunks = encode_export(_export_batches(args, selected), fmt, names)
+        headers = {'Content-Disposition': f'attachment; filename=pois.{extension}', 'X-Accel-Buffering': 'no'}
+        if 'gzip' in request.accept_encodings:
+            chunks = gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        return current_app.response_class(stream_with_context(chunks), headers=headers, content_type=mimetype)
+
+@poi_ns.route('/tiles/<int:z>/<int:x>/<int:y>.mvt')
+@poi_ns.doc(security='apiKey', params={'z': '缩放级别', 'x': '瓦片列号', 'y': '瓦片行号 (XYZ 方案, 自上而下)'})
+class POITilePublic(Resource):
+    # 地图平移缩放时一屏会同时请求十几个瓦片, 限额按瓦片数放宽
+    method_decorators = [apikey_required, rate_limit_decorator("600/minute")]
+
+    @poi_ns.response(200, 'Mapbox Vector Tile (application/vnd.mapbox-vector-tile), 图层名 pois')
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(404, '瓦片超出范围', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    @poi_ns.response(503, '相同的查询正在执行, 等待超时', models['error_response'])
+    def get(self, z, x, y):
+        """
+        [公众] 获取 POI 矢量瓦片 (需要X-API-KEY头)
+        每个要素为一个点, id 为 POI ID, 属性为 name、category; 低缩放级别按网格抽稀,
+        每格保留等级最高的一个点, 并附带 point_count 表示该格内的 POI 数。
+        """
+        if not (0 <= z <= tile_cache.max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise BusinessException(f"瓦片 {z}/{x}/{y} 超出范围 (最大缩放级别 {tile_cache.max_zoom})", status_code=404, error_code="TILE_OUT_OF_RANGE")
+        data = tile_cache.get(z, x, y)
+        cache_status = 'HIT'
+        if data is None:
+            config = current_app.config
+
+            def compute():
+                # 先取失效计数再读索引: 生成期间有写入时不把可能过期的瓦片写入缓存
+                write_count = tile_cache.write_count()
+                tile = build_tile(spatial_index, name_suggester, z, x, y, extent=config.get('TILE_EXTENT', 4096),
+                                  thin_max_zoom=config.get('TILE_THIN_MAX_ZOOM', 10), thin_grid=config.get('TILE_THIN_GRID', 64))
+                tile_cache.set(z, x, y, tile, write_count)
+                return tile
+            data = request_coalescer.do(f"tile:{z}/{x}/{y}", compute)
+            cache_status = 'MISS'
+        return current_app.response_class(data, mimetype='application/vnd.mapbox-vector-tile', headers={'X-Cache': cache_status})
+
+# 最近邻查询参数
+nearest_parser = reqparse.RequestParser()
+nearest_parser.add_argument('lat', type=float, required=True, help='查询点纬度', location='args')
+nearest_parser.add_argument('lon', type=float, required=True, help='查询点经度', location='args')
+nearest_parser.add_argument('k', type=int, default=10, help='返回的最近POI数量 (最大100)', location='args')
+nearest_parser.add_argument('max_km', type=float, help='最大搜索距离 (公里, 可选)', location='args')
+_add_attribute_arguments(nearest_parser)
+
+
+NEAREST_DIRECT_MAX_CANDIDATES = 5000 # 名称候选不超过该数量时直接排序, 不做网格 best-first 搜索
+
+
+@poi_ns.route('/nearest')
+@poi_ns.doc(security='apiKey')
+class POINearestPublic(Resource):
+    method_decorators = [apikey_required, rate_limit_decorator("10/minute")]
+
+    @poi_ns.expect(nearest_parser)
+    @poi_ns.response(200, 'Success', models['poi_nearest_response'])
+    @poi_ns.response(400, '查询参数无效', models['error_response'])
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    @poi_ns.response(503, '空间索引尚未就绪', models['error_response'])
+    def get(self):
+        """
+        [公众] 查询距离指定点最近的 k 个POI (需要X-API-KEY头)
+        结果按大圆距离由近到远排列, 支持与 /search 相同的属性筛选条件。
+        """
+        args = nearest_parser.parse_args()
+        lat, lon = args['lat'], args['lon']
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise BusinessException("查询点经纬度超出有效范围", status_code=400, error_code="QUERY_INVALID_POINT")
+        k = args.get('k')
+        if k is None:
+            k = 10
+        if k <= 0:
+            raise BusinessException("k 必须大于0", status_code=400, error_code="QUERY_INVALID_K")
+        k = min(k, 100)
+        max_km = args.get('max_km')
+        if max_km is not None and (not math.isfinite(max_km) or max_km <= 0):
+            raise BusinessException("max_km 必须大于0", status_code=400, error_code="QUERY_INVALID_RADIUS")
+        if not spatial_index.ready:
+            raise BusinessException("空间索引尚未就绪，请稍后重试", status_code=503, error_code="SPATIAL_INDEX_NOT_READY")
+
+        filters = _attribute_filters(args)
+        name_ids = _name_candidates(args)
+        if name_ids is not None and len(name_ids) == 0:
+            return json_response(shaped(models['poi_nearest_response'], status='success', pois=[], count=0))
+        if name_ids is not None and len(name_ids) <= NEAREST_DIRECT_MAX_CANDIDATES:
+            # 名称候选较少时直接按距离排序, 避免为凑满 k 个而逐环展开整个网格
+            candidates = iter(spatial_index.nearest_among(name_ids.tolist(), lat, lon, max_km=max_km))
+        else:
+            candidates = spatial_index.nearest(lat, lon, max_km=max_km)
+            if name_ids is not None:
+                name_set = set(name_ids.tolist())
+                candidates = (item for item in candidates if item[0] in name_set)
+        nearest = [] # [(poi_id, 距离公里)]
+        if not filters:
+            nearest = list(islice(candidates, k))
+        else:
+            # 按距离分批取候选点交给 SQL 校验属性条件, 批大小逐次翻倍, 直到凑满 k 个
+            batch_size = max(k * 4, 64)
+            while len(nearest) < k:
+                batch = list(islice(candidates, batch_size))
+                if not batch:
+                    break
+                matched = {row[0] for row in db.session.query(POI.id).filter(POI.id.in_([poi_id for poi_id, _ in batch]), *filters)}
+                nearest.extend(item for item in batch if item[0] in matched)
+                batch_size *= 2
+            nearest = nearest[:k]
+
+        ids = [poi_id for poi_id, _ in nearest]
+        names, columns = poi_columns()
+        rows = {row.id: row for row in db.session.query(*columns).filter(POI.id.in_(ids))} if nearest else {}
+        pois = serialize_poi_rows((rows[poi_id] for poi_id in ids), names,
+                                  distances={poi_id: km * 1000.0 for poi_id, km in nearest})
+        return json_response(shaped(models['poi_nearest_response'], status='success', pois=pois, count=len(pois)))
+
+
+# 名称联想参数
+suggest_parser = reqparse.RequestParser()
+suggest_parser.add_argument('q', type=str, required=True, help='名称前缀或拼音首字母', location='args')
+suggest_parser.add_argument('limit', type=int, default=10, help='返回数量 (最大20)', location='args')
+
+
+@poi_ns.route('/suggest')
+@poi_ns.doc(security='apiKey')
+class POISuggestPublic(Resource):
+    # 搜索框每次按键都会调用, 限额比普通查询宽松
+    method_decorators = [apikey_required, rate_limit_decorator("120/minute")]
+
+    @poi_ns.expect(suggest_parser)
+    @poi_ns.marshal_with(models['poi_suggest_response'])
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    @poi_ns.response(503, '联想索引尚未就绪', models['error_response'])
+    def get(self):
+        """
+        [公众] POI名称前缀联想 (需要X-API-KEY头)
+        按名称前缀 (安装 pypinyin 时也支持拼音首字母) 返回候选POI, 景区等级高的优先。
+        结果直接由内存索引给出, 不查询数据库。
+        """
+        args = suggest_parser.parse_args()
+        limit = max(1, min(args.get('limit') or 10, 20))
+        if not name_suggester.ready:
+            raise BusinessException("联想索引尚未就绪，请稍后重试", status_code=503, error_code="SUGGEST_INDEX_NOT_READY")
+        return {'status': 'success', 'suggestions': name_suggester.suggest(args['q'], limit)}, 200
+
+
+# 点聚合参数
+cluster_parser = reqparse.RequestParser()
+cluster_parser.add_argument('bbox', type=str, required=True, help='地图视野: min_lon,min_lat,max_lon,max_lat', location='args')
+cluster_parser.add_argument('zoom', type=int, required=True, help='地图缩放级别', location='args')
+cluster_parser.add_argument('category', type=str, help='只统计指定类别 (景区等级), 多个用逗号分隔, 如 5A,4A', location='args')
+cluster_parser.add_argument('breakdown', type=inputs.boolean, default=False, help='是否返回各单元按景区等级的数量', location='args')
+
+
+def _parse_bbox(value):
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(','))
+    except ValueError:
+        raise BusinessException("bbox 参数格式应为 min_lon,min_lat,max_lon,max_lat", status_code=400, error_code="QUERY_INVALID_BBOX")
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)) or min_lat > max_lat or min_lon > max_lon:
+        raise BusinessException("拉框查询参数无效：最小纬度/经度不能大于最大纬度/经度", status_code=400, error_code="QUERY_INVALID_BBOX")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+@poi_ns.route('/clusters')
+@poi_ns.doc(security='apiKey')
+class POIClustersPublic(Resource):
+    # 地图每次平移缩放都会调用, 限额与联想接口相同
+    method_decorators = [apikey_required, rate_limit_decorator("120/minute")]
+
+    @poi_ns.expect(cluster_parser)
+    @poi_ns.response(200, 'Success', models['poi_cluster_response'])
+    @poi_ns.response(400, '查询参数无效', models['error_response'])
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    @poi_ns.response(503, '聚合索引尚未就绪', models['error_response'])
+    def get(self):
+        """
+        [公众] 按地图视野和缩放级别返回POI点聚合 (需要X-API-KEY头)
+        视野按 zoom 级地图上约 64 像素见方的网格聚合, 每个非空单元返回平均坐标和数量。
+        结果由内存中预先建立的分层网格给出, 不查询数据库, 管理员写入后增量更新。
+        """
+        args = cluster_parser.parse_args()
+        bbox = _parse_bbox(args['bbox'])
+        if not cluster_index.ready:
+            raise BusinessException("聚合索引尚未就绪，请稍后重试", status_code=503, error_code="CLUSTER_INDEX_NOT_READY")
+        categories = {c.strip() for c in args['category'].split(',') if c.strip()} if args.get('category') else None
+        zoom, clusters = cluster_index.query(args['zoom'], *bbox, categories=categories, breakdown=bool(args.get('breakdown')))
+        return json_response(shaped(models['poi_cluster_response'], status='success', zoom=zoom,
+                                    total=sum(c['count'] for c in clusters), clusters=clusters))
+
+
+# 变更日志参数
+CHANGES_MAX_LIMIT = 5000
+changes_parser = reqparse.RequestParser()
+changes_parser.add_argument('since', type=int, default=0, help='上次响应的 next_since, 首次请求为 0', location='args')
+changes_parser.add_argument('limit', type=int, default=500, help=f'返回数量 (最大{CHANGES_MAX_LIMIT})', location='args')
+
+
+@poi_ns.route('/changes')
+@poi_ns.doc(security='apiKey')
+class POIChangesPublic(Resource):
+    # 下游消费者定期轮询, 限额与联想接口相同
+    method_decorators = [apikey_required, rate_limit_decorator("120/minute")]
+
+    @poi_ns.expect(changes_parser)
+    @poi_ns.response(200, 'Success', models['poi_changes_response'])
+    @poi_ns.response(400, '查询参数无效', models['error_response'])
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    def get(self):
+        """
+        [公众] 按变更序号增量读取POI的新增、修改和删除 (需要X-API-KEY头)
+        返回序号大于 since 的变更, 下次请求以 next_since 作为 since; has_more 为真时可立即继续读取。
+        op 为 reset (命令行批量导入) 或响应 reset 为真 (日志已清理) 时, 应整体重新载入后从 next_since 继续。
+        """
+        args = changes_parser.parse_args()
+        since, limit = args.get('since') or 0, args.get('limit') or 500
+        if since < 0 or not 1 <= limit <= CHANGES_MAX_LIMIT:
+            raise BusinessException(f"since 不能为负数, limit 应在 1 到 {CHANGES_MAX_LIMIT} 之间", status_code=400,
+                                    error_code="QUERY_INVALID_CHANGES")
+        changes, next_since, has_more, reset = read_changes(since, limit, current_app.config.get('CHANGE_FEED_GAP_WAIT', 5.0))
+        return json_response(shaped(models['poi_changes_response'], status='success', changes=changes,
+                                    next_since=next_since, has_more=has_more, reset=reset))
+
+
+BATCH_NEAREST_MAX_POINTS = 10000
+BATCH_NEAREST_MAX_K = 20
+BATCH_NEAREST_POINTS_PER_COST = 100 # 批量接口每100个查询点计为一次请求
+
+
+def _batch_nearest_cost():
+    """按请求中的查询点数量计算限流权重"""
+    payload = request.get_json(silent=True) or {}
+    points = payload.get('points') if isinstance(payload, dict) else None
+    return max(1, math.ceil(len(points) / BATCH_NEAREST_POINTS_PER_COST)) if isinstance(points, list) else 1
+
+
+@poi_ns.route('/nearest:batch')
+@poi_ns.doc(security='apiKey')
+class POINearestBatchPublic(Resource):
+    # 整个批量请求只做一次 API Key 认证, 并按查询点数量加权计入限流
+    method_decorators = [apikey_required, rate_limit_decorator("100/minute", cost=_batch_nearest_cost)]
+
+    @poi_ns.expect(models['poi_nearest_batch_input'])
+    @poi_ns.marshal_with(models['poi_nearest_batch_response'])
+    @poi_ns.response(400, '请求参数无效', models['error_response'])
+    @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
+    @poi_ns.response(429, '请求频率过高', models['error_response'])
+    @poi_ns.response(503, '空间索引尚未就绪', models['error_response'])
+    def post(self):
+        """
+        [公众] 批量最近邻查询 (需要X-API-KEY头)
+        对请求中的每个查询点返回最近的 k 个POI, 可用 max_km 限制最大距离。
+        适用于轨迹、签到等批量地理标注场景, 每100个查询点计为一次限流请求。
+        """
+        data = poi_ns.payload or {}
+        points = data.get('points')
+        if not isinstance(points, list) or not points:
+            raise BusinessException("points 必须是非空的查询点列表", status_code=400, error_code="BATCH_INVALID_POINTS")
+        if len(points) > BATCH_NEAREST_MAX_POINTS:
+            raise BusinessException(f"单次最多查询 {BATCH_NEAREST_MAX_POINTS} 个点", status_code=400, error_code="BATCH_TOO_LARGE")
+        try:
+            lats = np.array([p['lat'] for p in points], dtype=np.float64)
+            lons = np.array([p['lon'] for p in points], dtype=np.float64)
+        except (KeyError, TypeError, ValueError):
+            raise BusinessException("每个查询点都必须包含数值型的 lat 和 lon", status_code=400, error_code="BATCH_INVALID_POINTS")
+        invalid = ~((np.abs(lats) <= 90) & (np.abs(lons) <= 180))
+        if invalid.any():
+            raise BusinessException(f"第 {int(np.argmax(invalid))} 个查询点的经纬度超出有效范围", status_code=400, error_code="QUERY_INVALID_POINT")
+        k = data.get('k') or 1
+        if not isinstance(k, int) or not 1 <= k <= BATCH_NEAREST_MAX_K:
+            raise BusinessException(f"k 必须是 1 到 {BATCH_NEAREST_MAX_K} 之间的整数", status_code=400, error_code="QUERY_INVALID_K")
+        max_km = data.get('max_km')
+        if max_km is not None and (not isinstance(max_km, (int, float)) or max_km <= 0):
+            raise BusinessException("max_km 必须大于0", status_code=400, error_code="QUERY_INVALID_RADIUS")
+        if not spatial_index.ready:
+            raise BusinessException("空间索引尚未就绪，请稍后重试", status_code=503, error_code="SPATIAL_INDEX_NOT_READY")
+
+        ids, dists = spatial_index.nearest_batch(lats, lons, k=k, max_km=max_km)
+
+        # 命中的POI去重后一次性取出需要返回的列
+        unique_ids = np.unique(ids[ids >= 0]).tolist()
+        rows = {}
+        for start in range(0, len(unique_ids), 5000):
+            chunk = unique_ids[start:start + 5000]
+            for row in db.session.query(POI.id, POI.name, POI.latitude, POI.longitude, POI.category).filter(POI.id.in_(chunk)):
+                rows[row.id] = row._asdict()
+
+        results = []
+        for i, (row_ids, row_dists) in enumerate(zip(ids.tolist(), dists.tolist())):
+            neighbors = []
+            for poi_id, dist_km in zip(row_ids, row_dists):
+                if poi_id < 0 or poi_id not in rows:
+                    continue
+                neighbors.append({**rows[poi_id], 'distance_m': round(dist_km * 1000.0, 1)})
+            results.append({'index': i, 'pois': neighbors})
+        return {'status': 'success', 'results': results, 'count': len(results)}, 200
+
+
+# POI详情参数
+detail_parser = reqparse.RequestParser()
+detail_parser.add_argument('fields', type=str, help='只返回指定字段, 逗号分隔, 如 id,name,latitude,longitude', location='args')
+
 
 @poi_ns.route('/<int:poi_id>/public') # 与管理员的 /<int:poi_id> 区分开
 @poi_ns.doc(security='apiKey', params={'poi_id': 'POI的ID'})
 class POIDetailPublic(Resource):
     method_decorators = [apikey_required, rate_limit_decorator("20/minute")]
 
-    @poi_ns.marshal_with(models['poi_item_response'])
+    @poi_ns.expect(detail_parser)
+    @poi_ns.response(200, 'Success', models['poi_item_response'])
+    @poi_ns.response(400, '查询参数无效', models['error_response'])
     @poi_ns.response(401, 'API Key无效或缺失', models['error_response'])
     @poi_ns.response(404, 'POI未找到', models['error_response'])
     @poi_ns.response(429, '请求频率过高', models['error_response'])
+    @poi_ns.response(503, '相同的查询正在执行, 等待超时', models['error_response'])
     def get(self, poi_id):
         """[公众] 获取指定ID的POI详情 (需要X-API-KEY头)"""
-        # 使用 get_or_404 会自动处理未找到的情况并返回404，但错误信息是 Werkzeug 默认的
-        # 为了统一错误格式，我们手动查询并抛出自定义异常
-        poi = POI.query.filter_by(id=poi_id).first()
-        if not poi:
-            raise BusinessException(f"ID为 {poi_id} 的POI未找到", status_code=404, error_code="POI_NOT_FOUND")
-        
-        return {'status': 'success', 'poi': poi.to_dict()}, 200
\ No newline at end of file
+        selected = _selected_fields(detail_parser.parse_args().get('fields'), POI_OUTPUT_FIELDS)
+        key = f"detail:{poi_id}:{','.join(selected)}" if selected else f"detail:{poi_id}"
+        def compute():
+            item, version = _get_poi_detail(poi_id, selected)
+            return dumps(shaped(models['poi_item_response'], status='success', poi=item)), version
+        body, version = request_coalescer.do(key, compute)
+        return json_response(body, headers={'ETag': quote_etag(f"poi-{poi_id}-v{version}")})
+
+
+def _get_poi_detail(poi_id, selected=None):
+    """查询POI详情, 返回 (输出字典, 版本号); 版本号总是查询, 用于 ETag"""
+    names, columns = poi_columns(selected, required=('id', 'version'))
+    if snapshot_store.enabled:
+        snapshot = snapshot_store.current()
+        position = snapshot.positions([poi_id])[0]
+        row = snapshot.rows([position], names)[0] if position >= 0 else None
+    else:
+        row = db.session.query(*columns).filter(POI.id == poi_id).first()
+    if row is None:
+        raise BusinessException(f"ID为 {poi_id} 的POI未找到", status_code=404, error_code="POI_NOT_FOUND")
+    return serialize_poi_rows([row], names, selected, distance_field=False)[0], row[names.index('version')]
\ No newline at end of file
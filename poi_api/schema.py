@@ -0,0 +1,46 @@
+from sqlalchemy import inspect, text
+
+from .extensions import db
+
+# 已部署数据库的结构升级: db.create_all() 只创建缺少的表, 不会给已有的表补列和索引。
+# 这里列出后续版本给已有表新增的列和索引, upgrade_schema() 检查后只执行缺少的部分, 可以重复执行。
+# 启动时 create_app 会自动执行; 也可以用 flask poi upgrade-schema --dry-run 查看需要的 DDL 后手工执行。
+
+# (表, 列, 列定义)
+SCHEMA_COLUMNS = [
+    ('pois', 'source_id', 'VARCHAR(64)'),       # 增量同步的来源标识
+    ('pois', 'content_hash', 'VARCHAR(40)'),    # 增量同步的内容摘要
+    ('pois', 'version', 'INTEGER NOT NULL DEFAULT 1'), # 乐观并发控制的版本号, 已有行从 1 开始
+]
+
+# (表, 索引名, 建索引语句)
+SCHEMA_INDEXES = [
+    # sync_features 的 ON CONFLICT (source_id) 依赖这个唯一索引
+    ('pois', 'ix_pois_source_id', 'CREATE UNIQUE INDEX IF NOT EXISTS ix_pois_source_id ON pois (source_id)'),
+]
+
+
+def pending_upgrades(connection):
+    """返回当前数据库缺少的列和索引对应的 DDL 语句列表"""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    # PostgreSQL 支持 IF NOT EXISTS, 多个 worker 同时启动时重复执行也不会失败
+    add_column = 'ADD COLUMN IF NOT EXISTS' if connection.dialect.name == 'postgresql' else 'ADD COLUMN'
+    statements = []
+    for table, column, definition in SCHEMA_COLUMNS:
+        if table in tables and column not in {c['name'] for c in inspector.get_columns(table)}:
+            statements.append(f"ALTER TABLE {table} {add_column} {column} {definition}")
+    for table, name, ddl in SCHEMA_INDEXES:
+        if table in tables and name not in {i['name'] for i in inspector.get_indexes(table)}:
+            statements.append(ddl)
+    return statements
+
+
+def upgrade_schema(dry_run=False):
+    """在一个事务中执行缺少的 DDL (需在应用上下文中调用), 返回执行 (dry_run 时为需要执行) 的语句"""
+    with db.engine.begin() as connection:
+        statements = pending_upgrades(connection)
+        if not dry_run:
+            for statement in statements:
+                connection.execute(text(statement))
+    return statements
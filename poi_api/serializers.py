@@ -0,0 +1,84 @@
+from flask import current_app
+from flask_restx import fields
+
+from .dtos import poi_output_dto
+from .models import POI
+
+try: # 可选依赖: 安装 orjson 后响应直接编码为 bytes, 速度明显快于标准库 json
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+# 列表类接口的快速序列化: 按 poi_output_dto 的字段只查询需要的列 (行元组, 不构造 ORM 对象),
+# 在这里一次性转换为输出结构后直接编码为 JSON 响应, 不再经过 to_dict() 和 marshal_with 两轮遍历。
+# 接口仍用 @poi_ns.response(200, ..., model) 声明同一个模型, Swagger 文档不变。
+# 请求带 fields= 时只查询并输出所选字段 (稀疏字段集)。
+
+POI_OUTPUT_FIELDS = tuple(poi_output_dto)
+POI_OUTPUT_COLUMNS = tuple(getattr(POI, name) for name in POI_OUTPUT_FIELDS)
+_DATETIME_FIELDS = tuple(name for name, field in poi_output_dto.items() if isinstance(field, fields.DateTime))
+
+
+def parse_fields(value, allowed=POI_OUTPUT_FIELDS):
+    """解析逗号分隔的 fields= 参数, 返回按 allowed 顺序排列的字段名元组; 参数为空时返回 None (全部字段)。
+
+    含未知字段时抛出 ValueError。
+    """
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+    return tuple(name for name in allowed if name in requested) or None
+
+
+def poi_columns(selected=None, required=('id',)):
+    """返回 (字段名, 列) 元组: selected 为空时为全部输出列, 否则为所选字段加上内部需要的 required 字段"""
+    if selected is None:
+        return POI_OUTPUT_FIELDS, POI_OUTPUT_COLUMNS
+    names = tuple(name for name in POI_OUTPUT_FIELDS if name in selected or name in required)
+    return names, tuple(getattr(POI, name) for name in names)
+
+
+def serialize_poi_rows(rows, names=POI_OUTPUT_FIELDS, selected=None, distances=None, distance_field=True):
+    """把按 poi_columns() 查询的行序列化为 POI 输出结构的字典列表。
+
+    selected 为所选字段 (为空时输出全部字段); distance_field 为真时按 poi_search_item_dto 附加 distance_m,
+    distances 为 {poi_id: 距离 (米)}, 为空时 distance_m 输出 null。
+    """
+    datetime_fields = [name for name in _DATETIME_FIELDS if name in names]
+    extra = [name for name in names if selected is not None and name not in selected]
+    if selected is not None and 'distance_m' not in selected:
+        distance_field = False
+    items = []
+    for row in rows:
+        item = dict(zip(names, row))
+        for name in datetime_fields:
+            value = item[name]
+            if value is not None:
+                item[name] = value.isoformat()
+        if distance_field:
+            item['distance_m'] = round(distances[item['id']], 1) if distances is not None else None
+        for name in extra: # 只为查询内部需要而取出的列不输出
+            del item[name]
+        items.append(item)
+    return items
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200, headers=None):
+    """把已是输出结构的字典直接编码为响应, flask-restx 对 Response 对象不再做处理; data 为 bytes 时视为已编码的 JSON"""
+    body = data if isinstance(data, bytes) else dumps(data)
+    return current_app.response_class(body, status=status, headers=headers, mimetype='application/json')
+
+
+def shaped(model, **values):
+    """按模型的字段顺序组装顶层响应, 缺少的字段输出 null, 与 marshal_with 的结果一致"""
+    return {name: values.get(name) for name in model}
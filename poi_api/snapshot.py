@@ -0,0 +1,546 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import Boolean, DateTime, Float, Integer, func, select
+
+try: # 快照文件发布时用文件锁串行化多个进程的写入; Windows 下没有 fcntl, 不加锁
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .extensions import db
+from .models import POI, POIChange
+from .serializers import POI_OUTPUT_FIELDS, POI_OUTPUT_COLUMNS
+from .spatial import haversine_km
+from .textindex import normalize_text
+
+# 只读列式快照: 把 pois 表按列载入内存, 公众查询接口在快照上用 numpy 掩码完成筛选、排序和分页, 不访问数据库。
+# 数值列为 numpy 数组, 字符串列做字典编码 (int32 编码 + 取值表), 时间列为 datetime64[us]。
+# 管理员写入后递增版本号, 下一次读取时重新载入整个快照 (POI 数量为数万级, 载入只需几十毫秒)。
+# 配置 SNAPSHOT_FILE 时快照写成二进制文件, 各 worker 以只读 mmap 共享快照各列数组的物理内存页 (文件格式见 write_snapshot_file)。
+# 共享的只是快照的 numpy 列; 空间网格、名称 n-gram 索引、补全、聚合网格和分面统计仍是每个 worker 各自的 Python 结构。
+
+# 快照文件损坏、被截断、不是本版本写出的文件, 或在检查与打开之间被其他进程替换、删除时
+# open_snapshot_file 可能抛出的异常, 遇到时从数据库重建并重新发布
+SNAPSHOT_FILE_ERRORS = (OSError, ValueError, KeyError, struct.error, json.JSONDecodeError)
+
+
+def _column_kind(column):
+    if isinstance(column.type, Float):
+        return 'float'
+    if isinstance(column.type, Boolean):
+        return 'bool'
+    if isinstance(column.type, Integer):
+        return 'int'
+    if isinstance(column.type, DateTime):
+        return 'datetime'
+    return 'str'
+
+
+# 输出字段 -> 列类型 ('float', 'int', 'bool', 'datetime', 'str')
+COLUMN_KINDS = {name: _column_kind(column) for name, column in zip(POI_OUTPUT_FIELDS, POI_OUTPUT_COLUMNS)}
+
+
+def _encode_strings(values):
+    """字典编码: 返回 (int32 编码数组, 取值列表), None 编码为 -1"""
+    lookup, table = {}, []
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(table)
+            table.append(value)
+        codes[i] = code
+    return codes, table
+
+
+class ColumnSnapshot:
+    """某一时刻 pois 表的列式只读副本, 行按 id 升序排列。
+
+    columns 为 {字段: numpy 数组}, 字符串字段的数组为编码, 取值表在 dictionaries 中;
+    布尔字段为 int8 (1 / 0 / -1 表示空)。构建后不再修改, 可以被多个请求线程同时读取。
+    change_seq 为构建时变更日志的最大序号, 快照包含该序号及之前的全部变更。
+    """
+
+    def __init__(self, columns, dictionaries, name_order=None, grid=None, source=None, change_seq=0):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.ids = columns['id']
+        self.lats = columns['latitude']
+        self.lons = columns['longitude']
+        self.grid = grid       # 空间网格 (单元边长, 单元键, 各单元起始位置, 按单元排列的行号), 用于拉框条件
+        self.source = source   # 映射的快照文件 (mmap), 数组直接引用其中的内存页
+        self._lookups = {}     # 字段 -> {取值: 编码}, 首次按取值筛选时建立
+        self.change_seq = change_seq
+        # 按 (名称, id) 排序的行号, 以及每行在该顺序中的名次, 供名称排序和游标定位
+        if name_order is None:
+            name_order = np.array(sorted(range(len(self.ids)), key=lambda i: (self.name_at(i), int(self.ids[i]))), dtype=np.int64)
+        self.name_order = name_order
+        self.name_ranks = np.empty(len(self.ids), dtype=np.int64)
+        self.name_ranks[name_order] = np.arange(len(self.ids))
+
+    @classmethod
+    def from_rows(cls, rows, grid_cell_deg=0.25, change_seq=0):
+        """由按 POI_OUTPUT_COLUMNS 查询、按 id 升序排列的行构建快照"""
+        values = list(zip(*rows)) if rows else [()] * len(POI_OUTPUT_FIELDS)
+        columns, dictionaries = {}, {}
+        for name, column_values in zip(POI_OUTPUT_FIELDS, values):
+            kind = COLUMN_KINDS[name]
+            if kind == 'str':
+                columns[name], dictionaries[name] = _encode_strings(column_values)
+            elif kind == 'bool':
+                columns[name] = np.array([-1 if v is None else int(v) for v in column_values], dtype=np.int8)
+            elif kind == 'datetime':
+                columns[name] = np.array(column_values, dtype='datetime64[us]')
+            elif kind == 'int':
+                columns[name] = np.array(column_values, dtype=np.int64)
+            else:
+                columns[name] = np.array(column_values, dtype=np.float64)
+        return cls(columns, dictionaries, grid=_build_grid(columns['longitude'], columns['latitude'], grid_cell_deg),
+                   change_seq=change_seq)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def name_at(self, position):
+        code = int(self.columns['name'][position])
+        return self.dictionaries['name'][code] if code >= 0 else ''
+
+    def positions(self, ids):
+        """POI id -> 行号, 不存在的 id 为 -1"""
+        ids = np.asarray(ids, dtype=np.int64)
+        slots = np.searchsorted(self.ids, ids)
+        slots[slots >= len(self.ids)] = 0
+        found = (self.ids[slots] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        return np.where(found, slots, -1)
+
+    def equals(self, name, value):
+        """字典编码列等于 value 的掩码"""
+        lookup = self._lookups.get(name)
+        if lookup is None:
+            lookup = self._lookups[name] = {value: code for code, value in enumerate(self.dictionaries[name])}
+        code = lookup.get(value)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.columns[name] == code
+
+    def contains_text(self, name, fragment):
+        """字符串列包含 fragment (不区分大小写) 的掩码, 只对取值表做一次子串匹配"""
+        fragment = normalize_text(fragment)
+        matched = [code for code, value in enumerate(self.dictionaries[name]) if fragment in normalize_text(value)]
+        return np.isin(self.columns[name], np.array(matched, dtype=np.int32))
+
+    def match(self, where=None, ids=None, bbox=None, circle=None):
+        """属性 / 候选 id / 拉框 / 圆形条件的组合掩码, 返回 (掩码, 到圆心的距离 (米) 或 None)。
+
+        where 为 {字段: 取值}, 字符串字段比较相等, 布尔字段比较真假, name 字段为子串匹配。
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in (where or {}).items():
+            kind = COLUMN_KINDS[name]
+            if name == 'name':
+                mask &= self.contains_text(name, value)
+            elif kind == 'str':
+                mask &= self.equals(name, value)
+            elif kind == 'bool':
+                mask &= self.columns[name] == int(bool(value))
+            else:
+                mask &= self.columns[name] == value
+        if ids is not None:
+            candidates = self.positions(ids)
+            keep = np.zeros(len(self), dtype=bool)
+            keep[candidates[candidates >= 0]] = True
+            mask &= keep
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            # 先用网格取出候选行, 只对候选行做精确的范围比较
+            candidates = self._grid_candidates(bbox)
+            lons, lats = self.lons[candidates], self.lats[candidates]
+            inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+            keep = np.zeros(len(self), dtype=bool)
+            keep[candidates[inside]] = True
+            mask &= keep
+        dist_m = None
+        if circle is not None:
+            center_lat, center_lon, radius_km = circle
+            dist_m = haversine_km(center_lat, center_lon, self.lats, self.lons) * 1000.0
+            mask &= dist_m <= radius_km * 1000.0
+        return mask, dist_m
+
+    def _grid_candidates(self, bbox):
+        """与拉框相交的网格单元内的全部行号"""
+        cell_deg, keys, starts, rows = self.grid
+        min_lon, min_lat = max(bbox[0], -180.0), max(bbox[1], -90.0)
+        max_lon, max_lat = min(bbox[2], 180.0), min(bbox[3], 90.0)
+        if min_lon > max_lon or min_lat > max_lat or len(keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        cx0, cy0 = math.floor(min_lon / cell_deg), math.floor(min_lat / cell_deg)
+        cx1, cy1 = math.floor(max_lon / cell_deg), math.floor(max_lat / cell_deg)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(keys): # 拉框覆盖的单元多于非空单元时, 直接筛选非空单元
+            cx, cy = keys // _GRID_SPAN - _GRID_BIAS, keys % _GRID_SPAN - _GRID_BIAS
+            cells = np.flatnonzero((cx >= cx0) & (cx <= cx1) & (cy >= cy0) & (cy <= cy1))
+        else:
+            wanted = ((np.arange(cx0, cx1 + 1)[:, None] + _GRID_BIAS) * _GRID_SPAN + np.arange(cy0, cy1 + 1)[None, :] + _GRID_BIAS).ravel()
+            slots = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+            cells = slots[keys[slots] == wanted]
+        if len(cells) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([rows[starts[cell]:starts[cell + 1]] for cell in cells.tolist()])
+
+    def _seek_after(self, key):
+        """(名称, id) 严格大于 key 的第一个名次"""
+        lo, hi = 0, len(self.name_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = int(self.name_order[mid])
+            if (self.name_at(position), int(self.ids[position])) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def name_sorted(self, mask, after=None):
+        """满足掩码的行号, 按 (名称, id) 排序; after 为游标 (name, id), 只返回其后的行"""
+        order = self.name_order[mask[self.name_order]]
+        if after is not None:
+            order = order[self.name_ranks[order] >= self._seek_after(tuple(after))]
+        return order
+
+    def rows(self, positions, names=POI_OUTPUT_FIELDS):
+        """取出若干行的指定字段, 返回 Python 值的元组列表 (与数据库查询的行结构相同)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = []
+        for name in names:
+            values = self.columns[name][positions]
+            kind = COLUMN_KINDS[name]
+            if kind == 'str':
+                table = self.dictionaries[name]
+                columns.append([table[code] if code >= 0 else None for code in values.tolist()])
+            elif kind == 'bool':
+                columns.append([None if v < 0 else bool(v) for v in values.tolist()])
+            else:
+                columns.append(values.tolist())
+        return list(zip(*columns))
+
+    def records(self, names):
+        """全部行的指定字段, 返回可按属性访问的具名元组列表 (与数据库查询的结果用法相同)"""
+        record = namedtuple('SnapshotRecord', names)
+        return [record(*row) for row in self.rows(np.arange(len(self)), names)]
+
+
+# --- 空间网格 ---
+
+_GRID_BIAS = 2 ** 30 # 单元坐标加上偏移后为非负数, 单元键 = (cx + 偏移) * 2^31 + (cy + 偏移)
+_GRID_SPAN = 2 ** 31
+
+
+def _build_grid(lons, lats, cell_deg):
+    """按单元键排序的 CSR 网格; 坐标为空的行不进入网格"""
+    rows = np.flatnonzero(np.isfinite(lons) & np.isfinite(lats))
+    keys = ((np.floor(lons[rows] / cell_deg).astype(np.int64) + _GRID_BIAS) * _GRID_SPAN
+            + np.floor(lats[rows] / cell_deg).astype(np.int64) + _GRID_BIAS)
+    order = np.argsort(keys, kind='stable')
+    cell_keys, starts = np.unique(keys[order], return_index=True)
+    return cell_deg, cell_keys, np.append(starts, len(order)).astype(np.int64), rows[order].astype(np.int64)
+
+
+# --- 快照文件 ---
+
+SNAPSHOT_MAGIC = b'POISNAP1'
+_ALIGN = 64
+
+
+class StringTable:
+    """快照文件中的字符串表: data[offsets[i]:offsets[i + 1]] 为第 i 个字符串的 UTF-8 字节, 按需解码"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code):
+        return self.data[int(self.offsets[code]):int(self.offsets[code + 1])].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for code in range(len(self)):
+            yield self[code]
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_snapshot_file(snapshot, path):
+    """把快照写成二进制文件, 先写临时文件再原子替换, 正在映射旧文件的进程不受影响。
+
+    文件结构: 8 字节魔数 | 8 字节头部长度 | JSON 头部 | 各数据段 (64 字节对齐)。
+    头部记录行数、字段类型和每个数据段的 dtype、相对偏移与元素个数; 数据段包括
+    定长的列数组 (col.*)、字符串表 (str.*.offsets / str.*.data)、名称排序 (name_order) 和空间网格 (grid.*)。
+    """
+    arrays = {f"col.{name}": array for name, array in snapshot.columns.items()}
+    for name, table in snapshot.dictionaries.items():
+        encoded = [value.encode('utf-8') for value in table]
+        arrays[f"str.{name}.offsets"] = np.concatenate(([0], np.cumsum([len(b) for b in encoded], dtype=np.int64))).astype(np.int64)
+        arrays[f"str.{name}.data"] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    arrays['name_order'] = np.asarray(snapshot.name_order, dtype=np.int64)
+    cell_deg, keys, starts, rows = snapshot.grid
+    arrays.update({'grid.keys': keys, 'grid.starts': starts, 'grid.rows': rows})
+
+    sections, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        sections[name] = {'dtype': array.dtype.str, 'offset': offset, 'count': len(array)}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({'format': 1, 'rows': len(snapshot), 'fields': COLUMN_KINDS, 'grid_cell_deg': cell_deg,
+                         'change_seq': snapshot.change_seq, 'created_at': time.time(), 'sections': sections}).encode('utf-8')
+    base = _aligned(16 + len(header))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as fp:
+        fp.write(SNAPSHOT_MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, array in arrays.items():
+            fp.seek(base + sections[name]['offset'])
+            fp.write(array.tobytes())
+        fp.truncate(base + offset)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp, path)
+
+
+def open_snapshot_file(path):
+    """只读映射快照文件, 返回 (快照, 文件标识); 格式或字段与当前代码不一致时抛出 ValueError"""
+    with open(path, 'rb') as fp:
+        stat = os.fstat(fp.fileno())
+        source = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    if source[:8] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} 不是 POI 快照文件")
+    header_len = struct.unpack('<Q', source[8:16])[0]
+    header = json.loads(source[16:16 + header_len].decode('utf-8'))
+    if header.get('format') != 1 or header.get('fields') != COLUMN_KINDS:
+        raise ValueError(f"{path} 的格式或字段与当前版本不一致")
+    base = _aligned(16 + header_len)
+
+    def section(name):
+        info = header['sections'][name]
+        if not info['count']:
+            return np.empty(0, dtype=info['dtype'])
+        return np.frombuffer(source, dtype=info['dtype'], count=info['count'], offset=base + info['offset'])
+
+    columns = {name: section(f"col.{name}") for name in COLUMN_KINDS}
+    dictionaries = {name: StringTable(section(f"str.{name}.offsets"), section(f"str.{name}.data"))
+                    for name, kind in COLUMN_KINDS.items() if kind == 'str'}
+    grid = (header['grid_cell_deg'], section('grid.keys'), section('grid.starts'), section('grid.rows'))
+    snapshot = ColumnSnapshot(columns, dictionaries, name_order=section('name_order'), grid=grid, source=source,
+                              change_seq=header.get('change_seq', 0))
+    return snapshot, (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+@contextmanager
+def _publish_lock(path):
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+class SnapshotStore:
+    """管理当前快照: 写接口调用 invalidate() 递增版本号, 读取时发现版本变化或超过 max_age 即重新载入。
+
+    重新载入期间其他请求继续使用旧快照; 只有尚无快照时才等待载入完成。
+    max_age 用于让没有处理写请求的其他 worker 进程也能在限定时间内看到变更。
+
+    配置 SNAPSHOT_FILE 时改为文件模式: 处理了写请求的进程从数据库重建快照并原子替换快照文件 (文件锁保证同一时刻只有一个进程发布),
+    其他进程每隔 check_interval 秒检查一次文件标识, 变化时映射新文件并调用 add_listener 注册的回调 (用于重建本进程的内存索引)。
+    从变更日志得知其他进程的写入时调用 invalidate(change_seq), 现有文件已包含该变更时直接映射, 不重复发布。
+    旧快照的映射在不再被引用后由垃圾回收释放, 正在使用旧快照的请求不受影响。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.max_age = 0
+        self.path = None
+        self.check_interval = 1.0
+        self.grid_cell_deg = 0.25
+        self.version = 0
+        self.required_seq = 0  # 快照至少应包含的变更序号
+        self._dirty = False    # 本进程有写入, 文件模式下需要重新发布
+        self._snapshot = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._file_id = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self.publishes = 0
+        self.last_load_ms = 0.0
+
+    def init_app(self, app):
+        self.path = app.config.get('SNAPSHOT_FILE')
+        self.enabled = app.config.get('SNAPSHOT_ENABLED', False) or bool(self.path)
+        self.max_age = app.config.get('SNAPSHOT_MAX_AGE', 0)
+        self.check_interval = app.config.get('SNAPSHOT_CHECK_INTERVAL', self.check_interval)
+        self.grid_cell_deg = app.config.get('SPATIAL_GRID_CELL_DEG', self.grid_cell_deg)
+        app.extensions['poi_snapshot'] = self
+
+    def add_listener(self, callback):
+        """注册回调 callback(snapshot), 在映射了其他进程发布的快照文件后调用"""
+        self._listeners.append(callback)
+
+    def invalidate(self, change_seq=None):
+        """本进程写入后调用; change_seq 非空表示变更来自其他进程 (变更日志), 只要求快照包含该序号"""
+        with self._lock:
+            if change_seq is None:
+                self._dirty = True
+            elif self._snapshot is not None and self._snapshot.change_seq >= change_seq:
+                return # 当前快照已包含该变更
+            else:
+                self.required_seq = max(self.required_seq, change_seq)
+            self.version += 1
+
+    def _stale(self):
+        if self._snapshot is None or self._loaded_version != self.version:
+            return True
+        if self.path:
+            return time.monotonic() - self._checked_at > self.check_interval
+        return bool(self.max_age) and time.monotonic() - self._loaded_at > self.max_age
+
+    def build(self):
+        """从数据库构建快照 (需在应用上下文中调用)"""
+        change_seq = db.session.scalar(select(func.max(POIChange.id))) or 0 # 先取序号再读数据, 宁可少算不可多算
+        rows = db.session.query(*POI_OUTPUT_COLUMNS).order_by(POI.id).all()
+        return ColumnSnapshot.from_rows(rows, self.grid_cell_deg, change_seq)
+
+    def _install(self, snapshot, version, file_id=None, started=None):
+        with self._lock:
+            self._snapshot, self._loaded_version = snapshot, version
+            self._loaded_at = self._checked_at = time.monotonic()
+            self._file_id = file_id
+            self.reloads += 1
+            if started is not None:
+                self.last_load_ms = (time.perf_counter() - started) * 1000
+
+    def _open_file(self):
+        """映射现有快照文件, 文件无法读取时返回 (None, None)"""
+        try:
+            return open_snapshot_file(self.path)
+        except SNAPSHOT_FILE_ERRORS as e:
+            current_app.logger.warning('快照文件 %s 无法读取, 将从数据库重建: %s', self.path, e)
+            return None, None
+
+    def _open_or_publish(self):
+        """文件模式: 映射现有文件; 本进程有写入、文件过旧或无法读取时从数据库重建并发布, 返回 (快照, 文件标识)"""
+        with _publish_lock(self.path):
+            snapshot = file_id = None
+            if not self._dirty and os.path.exists(self.path):
+                # 冷启动或其他进程有写入时优先使用已有的文件, 多个 worker 同时需要新快照也只有第一个访问数据库
+                snapshot, file_id = self._open_file()
+                if snapshot is not None and snapshot.change_seq < self.required_seq:
+                    snapshot = None
+            if snapshot is None:
+                self._dirty = False
+                snapshot = self.build()
+                write_snapshot_file(snapshot, self.path)
+                snapshot, file_id = open_snapshot_file(self.path)
+                self.publishes += 1
+        return snapshot, file_id
+
+    def load(self):
+        """载入新快照: 内存模式从数据库构建; 文件模式下本进程有写入或现有文件过旧、无法读取时重新发布, 否则映射现有文件"""
+        version = self.version
+        started = time.perf_counter()
+        if not self.path:
+            snapshot = self.build()
+            self._install(snapshot, version, started=started)
+            return snapshot
+        if self._snapshot is not None and self._loaded_version == version:
+            return self._refresh()
+        snapshot, file_id = self._open_or_publish()
+        self._install(snapshot, version, file_id, started)
+        return snapshot
+
+    def publish(self):
+        """从数据库重建快照文件 (命令行导入等批量写入后调用), 返回行数"""
+        self.invalidate()
+        return len(self.load()) if self.path else 0
+
+    def _refresh(self):
+        """文件模式: 文件标识变化时映射新文件并通知回调"""
+        try:
+            stat = os.stat(self.path)
+            file_id = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            file_id = self._file_id # 文件被删除时继续使用当前映射
+        if file_id == self._file_id:
+            with self._lock:
+                self._checked_at = time.monotonic()
+            return self._snapshot
+        started = time.perf_counter()
+        snapshot, file_id = self._open_file()
+        if snapshot is None: # 新文件损坏或被截断: 从数据库重建并重新发布, 不让各进程一直失败
+            snapshot, file_id = self._open_or_publish()
+        self._install(snapshot, self._loaded_version, file_id, started)
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception:
+                current_app.logger.exception('快照文件更新后的回调执行失败')
+        return snapshot
+
+    def current(self):
+        """返回可用的快照, 需要时重新载入"""
+        if not self._stale():
+            return self._snapshot
+        if self._snapshot is None:
+            with self._reload_lock:
+                return self._snapshot if not self._stale() else self.load()
+        if self._reload_lock.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self.load()
+            finally:
+                self._reload_lock.release()
+        return self._snapshot
+
+    def is_current(self, snapshot):
+        """snapshot 是否为已包含本进程全部写入的当前快照"""
+        return snapshot is self._snapshot and self._loaded_version == self.version
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'enabled': self.enabled,
+            'file': self.path,
+            'rows': len(snapshot) if snapshot is not None else 0,
+            'version': self.version,
+            'loaded_version': self._loaded_version,
+            'reloads': self.reloads,
+            'publishes': self.publishes,
+            'change_seq': snapshot.change_seq if snapshot is not None else 0,
+            'last_load_ms': round(self.last_load_ms, 2),
+        }
+
+
+# 依赖 models 与 serializers, 因此不放在 extensions 中, 由 create_app 调用 init_app
+snapshot_store = SnapshotStore()
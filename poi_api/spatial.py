@@ -0,0 +1,322 @@
+import heapq
+import math
+import threading
+
+import numpy as np
+
+try: # 可选依赖: 有 scipy 时批量最近邻使用 cKDTree, 否则回退到分块的 numpy 暴力计算
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0088 # 地球平均半径 (IUGG)
+
+_EMPTY_IDS = np.empty(0, dtype=np.int64)
+_EMPTY_COORDS = np.empty(0, dtype=np.float64)
+
+
+def bbox_around(lat, lon, radius_km):
+    """返回覆盖以 (lat, lon) 为圆心、radius_km 为半径的球面圆的经纬度外包框 (min_lon, min_lat, max_lon, max_lat)"""
+    angular = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angular)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    # 圆覆盖了极点, 经度方向不再有约束
+    if min_lat <= -90 or max_lat >= 90 or angular >= math.pi / 2:
+        return -180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0)
+    d_lon = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat)))))
+    return max(lon - d_lon, -180.0), min_lat, min(lon + d_lon, 180.0), max_lat
+
+
+def haversine_km(lat, lon, lats, lons):
+    """向量化计算点 (lat, lon) 到一组点 (lats, lons) 的大圆距离 (公里)"""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    d_lat = lat2 - lat1
+    d_lon = np.radians(lons) - math.radians(lon)
+    a = np.sin(d_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_pairs_km(lats1, lons1, lats2, lons2):
+    """向量化计算两组点逐对 (lats1[i], lons1[i]) - (lats2[i], lons2[i]) 的大圆距离 (公里)"""
+    lat1, lat2 = np.radians(lats1), np.radians(lats2)
+    d_lat = lat2 - lat1
+    d_lon = np.radians(lons2) - np.radians(lons1)
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _unit_vectors(lats, lons):
+    """经纬度 -> 单位球面三维坐标; 三维弦长与大圆距离单调对应, 可直接用欧氏 KD 树检索"""
+    phi = np.radians(lats)
+    lam = np.radians(lons)
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+def _km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class SpatialGridIndex:
+    """基于均匀经纬度网格的内存空间索引。
+
+    每个网格单元保存落在其中的 POI 的 id 与坐标。拉框查询只访问与查询框相交的单元:
+    完全落在框内的单元整体命中, 边缘单元再用 numpy 做一次精确的坐标过滤。
+    最近邻查询从查询点所在单元逐环向外做 best-first 搜索, 代价只取决于 k 与局部密度。
+    索引在启动时从 pois 表构建, 之后由管理员写接口增量维护。
+    """
+
+    def __init__(self, cell_size=0.25):
+        self.cell_size = cell_size
+        self.ready = False
+        self._lock = threading.RLock()
+        self._points = {}  # poi_id -> (lon, lat)
+        self._cells = {}   # (cx, cy) -> {poi_id: (lon, lat)}
+        self._arrays = {}  # (cx, cy) -> (ids, lons, lats), 单元内容变化时失效
+        self._extent = None  # 非空单元的范围 (min_cx, min_cy, max_cx, max_cy), 删除后只会偏大
+        self.version = 0     # 每次写入递增, 供派生的全量数组/KD 树判断是否过期
+        self._batch_tree = None  # (version, ids, tree 或单位向量数组)
+
+    def init_app(self, app):
+        self.cell_size = app.config.get('SPATIAL_GRID_CELL_DEG', self.cell_size)
+        app.extensions['poi_spatial_index'] = self
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell_of(self, lon, lat):
+        return math.floor(lon / self.cell_size), math.floor(lat / self.cell_size)
+
+    def rebuild(self, rows):
+        """用 (id, lon, lat) 序列整体重建索引"""
+        points, cells = {}, {}
+        for poi_id, lon, lat in rows:
+            if lon is None or lat is None:
+                continue
+            points[poi_id] = (lon, lat)
+            cells.setdefault(self._cell_of(lon, lat), {})[poi_id] = (lon, lat)
+        extent = None
+        if cells:
+            xs, ys = zip(*cells)
+            extent = (min(xs), min(ys), max(xs), max(ys))
+        with self._lock:
+            self._points, self._cells, self._arrays, self._extent = points, cells, {}, extent
+            self.version += 1
+            self.ready = True
+
+    def upsert(self, poi_id, lon, lat):
+        """插入或移动一个 POI"""
+        with self._lock:
+            self._discard(poi_id)
+            self.version += 1
+            if lon is None or lat is None:
+                return
+            key = self._cell_of(lon, lat)
+            self._points[poi_id] = (lon, lat)
+            self._cells.setdefault(key, {})[poi_id] = (lon, lat)
+            self._arrays.pop(key, None)
+            if self._extent is None:
+                self._extent = (key[0], key[1], key[0], key[1])
+            else:
+                min_cx, min_cy, max_cx, max_cy = self._extent
+                self._extent = (min(min_cx, key[0]), min(min_cy, key[1]), max(max_cx, key[0]), max(max_cy, key[1]))
+
+    def point(self, poi_id):
+        """返回 POI 当前在索引中的坐标 (lon, lat), 不存在时返回 None"""
+        return self._points.get(poi_id)
+
+    def remove(self, poi_id):
+        with self._lock:
+            self._discard(poi_id)
+            self.version += 1
+
+    def _discard(self, poi_id):
+        old = self._points.pop(poi_id, None)
+        if old is None:
+            return
+        key = self._cell_of(*old)
+        cell = self._cells.get(key)
+        if cell is not None:
+            cell.pop(poi_id, None)
+            if not cell:
+                del self._cells[key]
+        self._arrays.pop(key, None)
+
+    def _cell_arrays(self, key):
+        arrays = self._arrays.get(key)
+        if arrays is None:
+            cell = self._cells[key]
+            ids = np.fromiter(cell.keys(), dtype=np.int64, count=len(cell))
+            coords = np.array(list(cell.values()), dtype=np.float64).reshape(-1, 2)
+            arrays = (ids, coords[:, 0].copy(), coords[:, 1].copy())
+            self._arrays[key] = arrays
+        return arrays
+
+    def query_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """返回落在查询框内 (含边界) 的 POI: (ids, lons, lats) 三个 numpy 数组"""
+        cx0, cy0 = self._cell_of(max(min_lon, -180.0), max(min_lat, -90.0))
+        cx1, cy1 = self._cell_of(min(max_lon, 180.0), min(max_lat, 90.0))
+        parts = []
+        with self._lock:
+            # 查询框覆盖的单元数多于非空单元数时, 直接遍历非空单元更省
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+                keys = [k for k in self._cells if cx0 <= k[0] <= cx1 and cy0 <= k[1] <= cy1]
+            else:
+                keys = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in self._cells]
+            for key in keys:
+                ids, lons, lats = self._cell_arrays(key)
+                if cx0 < key[0] < cx1 and cy0 < key[1] < cy1:
+                    parts.append((ids, lons, lats))
+                else:
+                    mask = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+                    parts.append((ids[mask], lons[mask], lats[mask]))
+        if not parts:
+            return _EMPTY_IDS, _EMPTY_COORDS, _EMPTY_COORDS
+        ids, lons, lats = zip(*parts)
+        return np.concatenate(ids), np.concatenate(lons), np.concatenate(lats)
+
+    def nearest(self, lat, lon, max_km=None):
+        """按距离由近到远逐个产出 (poi_id, 距离公里) 的生成器。
+
+        以查询点所在单元为中心逐环展开网格, 展开环内的点按精确球面距离入堆;
+        只有当堆顶距离不大于下一环的距离下界时才弹出, 因此产出顺序是精确的,
+        且只会访问距离不超过第 k 个结果的那几环单元。
+        """
+        with self._lock:
+            extent = self._extent
+        if extent is None:
+            return
+        qx, qy = self._cell_of(lon, lat)
+        min_cx, min_cy, max_cx, max_cy = extent
+        max_ring = max(qx - min_cx, max_cx - qx, qy - min_cy, max_cy - qy, 0)
+        limit = math.inf if max_km is None else max_km
+
+        heap = []
+        ring, ring_bound = 0, 0.0
+        while True:
+            # 展开所有距离下界不超过当前堆顶的环
+            while ring <= max_ring and ring_bound <= limit and (not heap or ring_bound <= heap[0][0]):
+                for key in self._ring_cells(qx, qy, ring, extent):
+                    with self._lock:
+                        if key not in self._cells:
+                            continue
+                        ids, lons, lats = self._cell_arrays(key)
+                    dists = haversine_km(lat, lon, lats, lons)
+                    for item in zip(dists.tolist(), ids.tolist()):
+                        heapq.heappush(heap, item)
+                ring += 1
+                ring_bound = self._ring_lower_bound(lat, lon, qx, qy, ring)
+            if not heap:
+                return
+            dist, poi_id = heapq.heappop(heap)
+            if dist > limit:
+                return
+            yield poi_id, dist
+
+    def nearest_among(self, ids, lat, lon, max_km=None):
+        """只在给定的 POI 中按距离由近到远排序, 返回 [(poi_id, 距离公里)]; 候选集合较小时比逐环展开网格更省"""
+        with self._lock:
+            found = [(poi_id, self._points[poi_id]) for poi_id in ids if poi_id in self._points]
+        if not found:
+            return []
+        coords = np.array([point for _, point in found], dtype=np.float64)
+        dists = haversine_km(lat, lon, coords[:, 1], coords[:, 0])
+        order = np.argsort(dists, kind='stable')
+        if max_km is not None:
+            order = order[dists[order] <= max_km]
+        return [(found[i][0], dist) for i, dist in zip(order.tolist(), dists[order].tolist())]
+
+    @staticmethod
+    def _ring_cells(qx, qy, ring, extent):
+        """第 ring 环 (切比雪夫距离为 ring) 上且位于非空范围内的单元"""
+        min_cx, min_cy, max_cx, max_cy = extent
+        if ring == 0:
+            return [(qx, qy)]
+        x0, x1 = max(qx - ring, min_cx), min(qx + ring, max_cx)
+        y0, y1 = max(qy - ring + 1, min_cy), min(qy + ring - 1, max_cy)
+        cells = []
+        for cy in (qy - ring, qy + ring):
+            if min_cy <= cy <= max_cy:
+                cells.extend((cx, cy) for cx in range(x0, x1 + 1))
+        for cx in (qx - ring, qx + ring):
+            if min_cx <= cx <= max_cx:
+                cells.extend((cx, cy) for cy in range(y0, y1 + 1))
+        return cells
+
+    def _ring_lower_bound(self, lat, lon, qx, qy, ring):
+        """第 ring 环及更外侧任一点到查询点的球面距离下界 (公里)。
+
+        这些点都在内侧 ring 个环所围矩形之外, 到达它们至少要穿过矩形的某条纬线边
+        (距离不小于纬差对应的弧长) 或某条经线边 (距离不小于到该经线大圆的垂距)。
+        """
+        cs = self.cell_size
+        d_lat = min(lat - (qy - ring + 1) * cs, (qy + ring) * cs - lat)
+        d_lon = min(lon - (qx - ring + 1) * cs, (qx + ring) * cs - lon)
+        lat_km = math.radians(d_lat) * EARTH_RADIUS_KM
+        lon_km = math.asin(math.cos(math.radians(lat)) * math.sin(math.radians(min(d_lon, 90.0)))) * EARTH_RADIUS_KM
+        return min(lat_km, lon_km)
+
+    def _batch_searcher(self):
+        """返回与当前版本一致的 (ids, KD 树或单位向量数组), 过期时按全量坐标数组重建"""
+        with self._lock:
+            cached = self._batch_tree
+            if cached is not None and cached[0] == self.version:
+                return cached[1], cached[2]
+            version = self.version
+            ids = np.fromiter(self._points.keys(), dtype=np.int64, count=len(self._points))
+            coords = np.array(list(self._points.values()), dtype=np.float64).reshape(-1, 2)
+        xyz = _unit_vectors(coords[:, 1], coords[:, 0])
+        searcher = cKDTree(xyz) if cKDTree is not None else xyz
+        with self._lock:
+            if self.version == version:
+                self._batch_tree = (version, ids, searcher)
+        return ids, searcher
+
+    def nearest_batch(self, lats, lons, k=1, max_km=None, chunk_size=512):
+        """批量最近邻: 对每个查询点返回最近的 k 个 POI。
+
+        返回 (ids, dists) 两个形状为 (n, k) 的数组, 按距离升序; 不足 k 个 (或超出 max_km)
+        的位置 id 为 -1、距离为 inf。
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        n = len(lats)
+        out_ids = np.full((n, k), -1, dtype=np.int64)
+        out_dists = np.full((n, k), np.inf)
+        ids, searcher = self._batch_searcher()
+        if n == 0 or len(ids) == 0:
+            return out_ids, out_dists
+        queries = _unit_vectors(lats, lons)
+        bound = np.inf if max_km is None else _km_to_chord(max_km)
+
+        if cKDTree is not None:
+            chords, slots = searcher.query(queries, k=k, distance_upper_bound=bound)
+            chords = chords.reshape(n, k)
+            slots = slots.reshape(n, k)
+            found = np.isfinite(chords)
+            out_ids[found] = ids[slots[found]]
+            out_dists[found] = _chord_to_km(chords[found])
+            return out_ids, out_dists
+
+        # 无 scipy: 分块计算查询点与全部 POI 的弦长, 用 argpartition 取前 k 个
+        kk = min(k, len(ids))
+        for start in range(0, n, chunk_size):
+            block = queries[start:start + chunk_size]
+            sq = np.clip(2.0 - 2.0 * (block @ searcher.T), 0.0, None)
+            part = np.argpartition(sq, kk - 1, axis=1)[:, :kk] if kk < len(ids) else np.tile(np.arange(kk), (len(block), 1))
+            part_sq = np.take_along_axis(sq, part, axis=1)
+            order = np.argsort(part_sq, axis=1, kind='stable')
+            slots = np.take_along_axis(part, order, axis=1)
+            chords = np.sqrt(np.take_along_axis(part_sq, order, axis=1))
+            found = chords <= bound
+            rows = slice(start, start + len(block))
+            block_ids = np.where(found, ids[slots], -1)
+            block_dists = np.where(found, _chord_to_km(chords), np.inf)
+            out_ids[rows, :kk] = block_ids
+            out_dists[rows, :kk] = block_dists
+        return out_ids, out_dists
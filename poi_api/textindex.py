@@ -0,0 +1,211 @@
+import bisect
+import threading
+
+import numpy as np
+
+try: # 可选依赖: 安装 pypinyin 后联想接口同时支持拼音首字母 (如 "ggbwy" -> 故宫博物院)
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+
+
+def normalize_text(text):
+    """统一大小写与首尾空白, 与 ILIKE 的不区分大小写匹配语义保持一致"""
+    return (text or '').strip().casefold()
+
+
+class NGramIndex:
+    """字符 n-gram 倒排索引, 用于子串 (LIKE '%xx%') 查询。
+
+    每个文本按单字和相邻二字 (bigram) 建倒排表。查询片段先取其所有 bigram 的倒排表求交得到候选,
+    再对候选做一次真正的子串校验; 单字查询直接使用单字倒排表。中文景区名通常只有十来个字,
+    用户输入的也多是两三个字的片段, 因此候选集合通常很小。
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._texts = {}     # doc_id -> 归一化后的文本
+        self._postings = {}  # gram -> {doc_id}
+
+    def __len__(self):
+        return len(self._texts)
+
+    @staticmethod
+    def _grams(text):
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+
+    def rebuild(self, rows):
+        """用 (doc_id, text) 序列整体重建索引"""
+        texts, postings = {}, {}
+        for doc_id, text in rows:
+            text = normalize_text(text)
+            if not text:
+                continue
+            texts[doc_id] = text
+            for gram in self._grams(text):
+                postings.setdefault(gram, set()).add(doc_id)
+        with self._lock:
+            self._texts, self._postings = texts, postings
+            self.ready = True
+
+    def upsert(self, doc_id, text):
+        text = normalize_text(text)
+        with self._lock:
+            if self._texts.get(doc_id) == text:
+                return
+            self._discard(doc_id)
+            if not text:
+                return
+            self._texts[doc_id] = text
+            for gram in self._grams(text):
+                self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._discard(doc_id)
+
+    def _discard(self, doc_id):
+        old = self._texts.pop(doc_id, None)
+        if old is None:
+            return
+        for gram in self._grams(old):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def search(self, fragment):
+        """返回文本中包含 fragment 子串的 doc_id, 升序 numpy 数组"""
+        fragment = normalize_text(fragment)
+        if not fragment:
+            return np.empty(0, dtype=np.int64)
+        if len(fragment) == 1:
+            grams = [fragment]
+        else:
+            grams = {fragment[i:i + 2] for i in range(len(fragment) - 1)}
+        with self._lock:
+            postings = [self._postings.get(gram) for gram in grams]
+            if any(p is None for p in postings):
+                return np.empty(0, dtype=np.int64)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting
+                if not candidates:
+                    break
+            # bigram 全部出现不代表它们相邻且有序, 长片段需再做子串校验
+            if len(fragment) > 2:
+                candidates = [doc_id for doc_id in candidates if fragment in self._texts[doc_id]]
+            ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        ids.sort()
+        return ids
+
+
+_GRADE_TIERS = {'5A': 0, '4A': 1, '3A': 2, '2A': 3, 'A': 4, '1A': 4}
+_TIER_COUNT = 6 # 最后一档为无等级/其他类别
+
+
+def pinyin_initials(text):
+    """返回文本的拼音首字母串; 未安装 pypinyin 时返回空串"""
+    if lazy_pinyin is None or not text:
+        return ''
+    return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER)).casefold()
+
+
+class PrefixSuggester:
+    """按前缀联想 POI 名称的内存索引。
+
+    名称 (以及可选的拼音首字母) 按景区等级分档存放在有序数组中, 查询时从最高等级开始
+    在每档内二分定位前缀区间, 取满 limit 条即返回, 不需要扫描所有匹配项。
+    联想结果所需的展示字段也保存在内存中, 查询不访问数据库。
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        self._tiers = [[] for _ in range(_TIER_COUNT)]  # 每档为按 (key, doc_id) 排序的列表
+        self._docs = {}  # doc_id -> (tier, keys, 展示字段 dict)
+
+    def __len__(self):
+        return len(self._docs)
+
+    @staticmethod
+    def _tier_of(category):
+        return _GRADE_TIERS.get((category or '').strip().upper(), _TIER_COUNT - 1)
+
+    @staticmethod
+    def _keys_of(name):
+        keys = {normalize_text(name)}
+        keys.add(pinyin_initials(name))
+        keys.discard('')
+        return keys
+
+    def rebuild(self, rows):
+        """用 (doc_id, name, category, province) 序列整体重建索引"""
+        tiers = [[] for _ in range(_TIER_COUNT)]
+        docs = {}
+        for doc_id, name, category, province in rows:
+            if not name:
+                continue
+            tier, keys = self._tier_of(category), self._keys_of(name)
+            docs[doc_id] = (tier, keys, {'id': doc_id, 'name': name, 'category': category, 'province': province})
+            tiers[tier].extend((key, doc_id) for key in keys)
+        for entries in tiers:
+            entries.sort()
+        with self._lock:
+            self._tiers, self._docs = tiers, docs
+            self.ready = True
+
+    def upsert(self, doc_id, name, category, province):
+        with self._lock:
+            self._discard(doc_id)
+            if not name:
+                return
+            tier, keys = self._tier_of(category), self._keys_of(name)
+            self._docs[doc_id] = (tier, keys, {'id': doc_id, 'name': name, 'category': category, 'province': province})
+            for key in keys:
+                bisect.insort(self._tiers[tier], (key, doc_id))
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._discard(doc_id)
+
+    def _discard(self, doc_id):
+        old = self._docs.pop(doc_id, None)
+        if old is None:
+            return
+        tier, keys, _ = old
+        entries = self._tiers[tier]
+        for key in keys:
+            i = bisect.bisect_left(entries, (key, doc_id))
+            if i < len(entries) and entries[i] == (key, doc_id):
+                del entries[i]
+
+    def describe(self, doc_ids):
+        """返回 {doc_id: (等级档位, 展示字段 dict)}, 不在索引中的 id 不出现在结果中"""
+        with self._lock:
+            docs = self._docs
+            return {doc_id: (docs[doc_id][0], docs[doc_id][2]) for doc_id in doc_ids if doc_id in docs}
+
+    def suggest(self, prefix, limit=10):
+        """返回名称或拼音首字母以 prefix 开头的 POI, 高等级优先, 同等级按匹配键的字典序"""
+        prefix = normalize_text(prefix)
+        if not prefix or limit <= 0:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            for entries in self._tiers:
+                i = bisect.bisect_left(entries, (prefix,))
+                while i < len(entries) and entries[i][0].startswith(prefix):
+                    doc_id = entries[i][1]
+                    if doc_id not in seen:
+                        seen.add(doc_id)
+                        results.append(self._docs[doc_id][2])
+                        if len(results) >= limit:
+                            return results
+                    i += 1
+        return results
@@ -0,0 +1,293 @@
+import hashlib
+import math
+import os
+import shutil
+import struct
+import threading
+
+import numpy as np
+
+from .cache import MemoryCacheBackend
+
+# POI 矢量瓦片 (Mapbox Vector Tile 2.1): 按 Web 墨卡托 z/x/y 从内存空间索引取出瓦片内的点,
+# 低缩放级别按像素网格抽稀, 编码为 protobuf 后放入瓦片缓存。编码器只实现点要素所需的部分, 不依赖 protobuf 库。
+
+MAX_MERCATOR_LAT = 85.0511287798
+
+
+def tile_bounds(z, x, y):
+    """瓦片的经纬度范围 (min_lon, min_lat, max_lon, max_lat)"""
+    n = 2 ** z
+    min_lon, max_lon = x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def world_xy(lons, lats, z):
+    """经纬度 -> z 级的世界瓦片坐标 (浮点, 整数部分即瓦片号)"""
+    n = 2 ** z
+    lats = np.radians(np.clip(lats, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    wx = (np.asarray(lons) + 180.0) / 360.0 * n
+    wy = (1.0 - np.log(np.tan(lats) + 1.0 / np.cos(lats)) / math.pi) / 2.0 * n
+    return wx, wy
+
+
+def tiles_of(lons, lats, z):
+    """各点在 z 级所在的瓦片号 (xs, ys)"""
+    n = 2 ** z
+    wx, wy = world_xy(lons, lats, z)
+    return np.clip(np.floor(wx), 0, n - 1).astype(np.int64), np.clip(np.floor(wy), 0, n - 1).astype(np.int64)
+
+
+# --- protobuf 编码 ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, data):
+    return _key(field, 2) + _varint(len(data)) + data
+
+
+def _packed(field, values):
+    return _bytes_field(field, b''.join(_varint(v) for v in values))
+
+
+def _value(value):
+    """Layer.Value 消息"""
+    if isinstance(value, bool):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(6, 0) + _varint(_zigzag(value)) if value < 0 else _key(5, 0) + _varint(value)
+    if isinstance(value, float):
+        return _key(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def encode_point_layer(name, features, extent=4096):
+    """把 (id, px, py, 属性 dict) 列表编码为只含一个点图层的瓦片; 没有要素时返回空瓦片 b''"""
+    if not features:
+        return b''
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    body = [_key(15, 0) + _varint(2), _bytes_field(1, name.encode('utf-8'))]
+    for feature_id, px, py, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value), value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags += (key_index[key], value_index[value_key])
+        feature = _key(1, 0) + _varint(feature_id)
+        if tags:
+            feature += _packed(2, tags)
+        feature += _key(3, 0) + _varint(1) # GeomType.POINT
+        feature += _packed(4, (9, _zigzag(px), _zigzag(py))) # MoveTo(1) + 坐标
+        body.append(_bytes_field(2, feature))
+    body.extend(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    body.extend(_bytes_field(4, _value(value)) for value in values)
+    body.append(_key(5, 0) + _varint(extent))
+    return _bytes_field(3, b''.join(body))
+
+
+def build_tile(spatial_index, suggester, z, x, y, extent=4096, thin_max_zoom=10, thin_grid=64, layer='pois'):
+    """生成一个 POI 瓦片。
+
+    z <= thin_max_zoom 时把瓦片划分为 thin_grid x thin_grid 个网格, 每格只保留等级最高 (同级 id 最小) 的一个点,
+    并用 point_count 属性记录该格内的点数; 更高的缩放级别输出全部点。
+    """
+    ids, lons, lats = spatial_index.query_bbox(*tile_bounds(z, x, y))
+    if len(ids) == 0:
+        return b''
+    tx, ty = tiles_of(lons, lats, z)
+    # 落在瓦片边界上的点只属于 tiles_of 计算出的那一个瓦片, 与缓存失效的计算保持一致
+    inside = (tx == x) & (ty == y)
+    if not inside.any():
+        return b''
+    wx, wy = world_xy(lons[inside], lats[inside], z)
+    ids = ids[inside]
+    px = np.clip(np.floor((wx - x) * extent), 0, extent - 1).astype(np.int64)
+    py = np.clip(np.floor((wy - y) * extent), 0, extent - 1).astype(np.int64)
+
+    docs = suggester.describe(ids.tolist())
+    tiers = np.array([docs[i][0] if i in docs else 99 for i in ids.tolist()], dtype=np.int64)
+    counts = None
+    if z <= thin_max_zoom:
+        cell = extent // thin_grid
+        cells = (py // cell) * thin_grid + (px // cell)
+        order = np.lexsort((ids, tiers, cells)) # 按网格, 再按等级、id 排序, 每格第一个为代表点
+        cells = cells[order]
+        first = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        counts = np.diff(np.r_[first, len(cells)])
+        keep = order[first]
+        ids, px, py, tiers = ids[keep], px[keep], py[keep], tiers[keep]
+    # 高等级的点排在前面, 渲染端按要素顺序做标注避让时优先显示
+    order = np.lexsort((ids, tiers))
+
+    features = []
+    for slot in order.tolist():
+        poi_id = int(ids[slot])
+        doc = docs.get(poi_id, (None, {}))[1]
+        properties = {'name': doc.get('name'), 'category': doc.get('category')}
+        if counts is not None:
+            properties['point_count'] = int(counts[slot])
+        features.append((poi_id, int(px[slot]), int(py[slot]), properties))
+    return encode_point_layer(layer, features, extent)
+
+
+def fingerprint_rows(rows):
+    """由 (id, name, lon, lat, category) 计算瓦片内容的数据指纹, 用于区分磁盘缓存的代数"""
+    digest = hashlib.sha1()
+    for row in sorted(rows, key=lambda r: r[0]):
+        digest.update(repr(tuple(row)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class TileCache:
+    """编码后瓦片的缓存: 进程内 LRU, 可选以 TILE_CACHE_DIR 目录作为磁盘二级缓存。
+
+    POI 写入后只失效包含其新旧坐标的瓦片 (每个缩放级别一个), 其余瓦片保持有效。
+    生成瓦片前先取 write_count(), 写入时传给 set(): 生成期间有失效或重置时不写入, 避免缓存写入前读到的旧数据。
+    磁盘缓存按数据指纹分目录存放, 启动重建索引时数据有变化 (如命令行导入) 则换用新目录并删除旧目录。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.max_zoom = 18
+        self.directory = None
+        self.generation = None
+        self.backend = MemoryCacheBackend(max_entries=4096, ttl=86400)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._writes = 0 # invalidate_points / reset 的次数
+
+    def init_app(self, app):
+        self.enabled = app.config.get('TILE_CACHE_ENABLED', True)
+        self.max_zoom = app.config.get('TILE_MAX_ZOOM', self.max_zoom)
+        self.directory = app.config.get('TILE_CACHE_DIR')
+        self.backend = MemoryCacheBackend(max_entries=app.config.get('TILE_CACHE_MAX_ENTRIES', 4096),
+                                          ttl=app.config.get('TILE_CACHE_TTL', 86400))
+        app.extensions['poi_tile_cache'] = self
+
+    def _path(self, z, x, y):
+        return os.path.join(self.directory, self.generation, str(z), str(x), f"{y}.mvt")
+
+    def _disk_enabled(self):
+        return self.directory is not None and self.generation is not None
+
+    def write_count(self):
+        return self._writes
+
+    def reset(self, generation):
+        """索引整体重建后调用: 清空内存缓存, 切换磁盘缓存目录"""
+        with self._lock:
+            self._writes += 1
+            self.generation = generation
+        self.backend.clear()
+        if not self._disk_enabled() or not os.path.isdir(self.directory):
+            return
+        for entry in os.listdir(self.directory):
+            if entry != generation:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def get(self, z, x, y):
+        if not self.enabled:
+            return None
+        data = self.backend.get((z, x, y))
+        if data is None and self._disk_enabled():
+            try:
+                with open(self._path(z, x, y), 'rb') as fp:
+                    data = fp.read()
+            except OSError:
+                data = None
+            if data is not None:
+                self.backend.set((z, x, y), data)
+                with self._lock:
+                    self.disk_hits += 1
+                return data
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, z, x, y, data, write_count=None):
+        """写入瓦片; write_count 为生成前取得的 write_count(), 其后有失效或重置时不写入"""
+        if not self.enabled:
+            return
+        # 持锁写入: 失效在递增计数之后才删除瓦片, 检查通过的写入要么先于失效完成 (随后被删除), 要么被跳过
+        with self._lock:
+            if write_count is not None and write_count != self._writes:
+                return
+            self.backend.set((z, x, y), data)
+            if self._disk_enabled():
+                path = self._path(z, x, y)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, 'wb') as fp:
+                    fp.write(data)
+                os.replace(tmp, path) # 原子替换, 并发读取不会读到半个文件
+
+    def invalidate_points(self, points):
+        """失效包含这些坐标 (lon, lat) 的所有缩放级别的瓦片"""
+        points = [point for point in points if point is not None]
+        with self._lock:
+            self._writes += 1
+        if not points:
+            return
+        lons = np.array([point[0] for point in points], dtype=np.float64)
+        lats = np.array([point[1] for point in points], dtype=np.float64)
+        keys = set()
+        for z in range(self.max_zoom + 1):
+            xs, ys = tiles_of(lons, lats, z)
+            keys.update((z, tx, ty) for tx, ty in zip(xs.tolist(), ys.tolist()))
+        for z, x, y in keys:
+            self.backend.pop((z, x, y))
+            if self._disk_enabled():
+                try:
+                    os.remove(self._path(z, x, y))
+                except OSError:
+                    pass
+        with self._lock:
+            self.invalidated += len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.backend),
+                'disk_dir': self.directory,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'invalidated_tiles': self.invalidated,
+            }
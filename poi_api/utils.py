@@ -1,7 +1,27 @@
 import jwt
 import datetime
+from types import SimpleNamespace
 from flask import current_app
-from .models import User, APIKey as APIKeyModel
+from .models import User, Role, APIKey as APIKeyModel, APIKeyRevocation
+from .extensions import db, auth_cache
+
+
+class Principal:
+    """认证通过的用户快照, 缓存在 auth_cache 中, 提供与 User 模型相同的只读属性 (id, username, email, role.name)"""
+    __slots__ = ('id', 'username', 'email', 'role')
+
+    def __init__(self, id, username, email, role_name):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = SimpleNamespace(name=role_name)
+
+    def __repr__(self):
+        return f"<Principal {self.username}>"
+
+
+# 用户与角色一次 JOIN 查出, 避免再懒加载 user.role
+_principal_columns = (User.id, User.username, User.email, Role.name)
 
 def generate_token(user_id, username, role_name):
     """生成JWT Token"""
@@ -37,15 +57,37 @@ def decode_token(token):
         current_app.logger.error(f"Error decoding token: {e}")
         return 'Token decoding error.'
 
+def _load_principal(user_id):
+    row = db.session.query(*_principal_columns).join(Role, User.role_id == Role.id).filter(User.id == user_id).first()
+    return Principal(*row) if row else None
+
+def _load_principal_by_apikey(api_key_value):
+    row = db.session.query(*_principal_columns).join(Role, User.role_id == Role.id) \
+        .join(APIKeyModel, APIKeyModel.user_id == User.id) \
+        .filter(APIKeyModel.key == api_key_value, APIKeyModel.is_active == True).first()
+    return Principal(*row) if row else None
+
 def get_user_from_payload(payload):
+    """通过JWT载荷获取用户快照 (经 auth_cache 缓存)"""
     if isinstance(payload, str): # Error message from decode_token
         return None
     user_id = payload.get('sub')
-    return User.query.filter_by(id=user_id).first()
+    if user_id is None:
+        return None
+    return auth_cache.get_user(user_id, _load_principal)
 
 def get_user_by_apikey(api_key_value):
-    """通过API Key获取用户"""
-    api_key_obj = APIKeyModel.query.filter_by(key=api_key_value, is_active=True).first()
-    if api_key_obj:
-        return api_key_obj.user
-    return None
\ No newline at end of file
+    """通过API Key获取用户快照 (经 auth_cache 缓存)"""
+    return auth_cache.get_apikey_user(api_key_value, _load_principal_by_apikey)
+
+def revoke_apikey(api_key_obj):
+    """删除API Key并写入撤销记录 (由调用方提交), 其他 worker 据此清除认证缓存; 顺带清理超出轮询时间范围的旧记录"""
+    expired = datetime.datetime.utcnow() - datetime.timedelta(seconds=auth_cache.revocation_window)
+    APIKeyRevocation.query.filter(APIKeyRevocation.revoked_on < expired).delete(synchronize_session=False)
+    db.session.add(APIKeyRevocation(key=api_key_obj.key))
+    db.session.delete(api_key_obj)
+
+def recent_apikey_revocations(window_seconds):
+    """最近 window_seconds 秒内撤销的API Key (auth_cache 的撤销轮询)"""
+    since = datetime.datetime.utcnow() - datetime.timedelta(seconds=window_seconds)
+    return [key for key, in db.session.query(APIKeyRevocation.key).filter(APIKeyRevocation.revoked_on >= since)]
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# 配置类在导入时读取 DATABASE_URL, 必须在导入 poi_api 之前指向临时的 SQLite 数据库
+_DB_DIR = tempfile.mkdtemp(prefix='poi_api_test_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DB_DIR, 'test.db')
+for _name in ('SNAPSHOT_ENABLED', 'SNAPSHOT_FILE', 'TILE_CACHE_DIR'):
+    os.environ.pop(_name, None)
+
+from poi_api.app import create_app
+from poi_api.extensions import db, limiter
+from poi_api.indexes import rebuild_indexes
+from poi_api.models import POI
+
+SAMPLE_POIS = [
+    ('故宫博物院', 39.916345, 116.397155, '北京市', '5A'),
+    ('天坛公园', 39.882171, 116.406605, '北京市', '5A'),
+    ('颐和园', 39.999982, 116.275475, '北京市', '5A'),
+    ('北京动物园', 39.938858, 116.339051, '北京市', '4A'),
+    ('上海博物馆', 31.228326, 121.475365, '上海市', '4A'),
+    ('东方明珠广播电视塔', 31.239689, 121.499755, '上海市', '5A'),
+    ('西湖风景名胜区', 30.242865, 120.148902, '浙江省', '5A'),
+    ('杭州动物园', 30.221031, 120.153592, '浙江省', '3A'),
+]
+
+
+@pytest.fixture(scope='session')
+def app():
+    """整个测试会话共用一个应用 (扩展都是模块级单例), 数据库为临时目录中的 SQLite 文件"""
+    app = create_app('dev')
+    app.config['TESTING'] = True
+    limiter.enabled = False
+    with app.app_context():
+        db.session.add_all(POI(name=name, latitude=lat, longitude=lon, province=province, category=category)
+                           for name, lat, lon, province, category in SAMPLE_POIS)
+        db.session.commit()
+        rebuild_indexes()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    response = app.test_client().post('/api/v1/auth/login',
+                                      json={'email': 'admin@example.com', 'password': 'adminpassword'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+from sqlalchemy import delete, func, insert, select
+
+from poi_api.changes import latest_change_seq, read_changes
+from poi_api.extensions import db
+from poi_api.models import POIChange
+
+# 这些用例直接向 poi_changes 写入指定序号的记录来制造空缺; 记录都是对不存在的 POI 的删除,
+# 其他用例与本进程的 ChangeFeed 读到它们时不会有副作用
+MISSING_POI = 10 ** 9
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+
+
+def add_change(seq, age_seconds=0):
+    changed_on = datetime.datetime.utcnow() - datetime.timedelta(seconds=age_seconds)
+    db.session.execute(insert(POIChange).values(id=seq, poi_id=MISSING_POI, op='delete', version=1,
+                                                changed_on=changed_on))
+    db.session.commit()
+
+
+def seqs(changes):
+    return [change['seq'] for change in changes]
+
+
+def test_read_changes_in_order(ctx):
+    start = latest_change_seq()
+    for seq in range(start + 1, start + 4):
+        add_change(seq)
+    changes, next_since, has_more, reset = read_changes(start, limit=2)
+    assert seqs(changes) == [start + 1, start + 2]
+    assert (next_since, has_more, reset) == (start + 2, True, False)
+    changes, next_since, has_more, reset = read_changes(next_since, limit=2)
+    assert seqs(changes) == [start + 3]
+    assert (next_since, has_more, reset) == (start + 3, False, False)
+    assert read_changes(next_since) == ([], start + 3, False, False)
+
+
+def test_recent_gap_waits_for_commit(ctx):
+    start = latest_change_seq()
+    add_change(start + 1)
+    add_change(start + 3) # start + 2 所在的事务尚未提交
+    skipped = []
+    changes, next_since, has_more, reset = read_changes(start, gap_wait=60, skipped=skipped)
+    assert seqs(changes) == [start + 1]
+    assert (next_since, has_more, reset) == (start + 1, False, False)
+    assert skipped == []
+
+    add_change(start + 2) # 事务提交后从空缺处继续
+    changes, next_since, _, _ = read_changes(next_since, gap_wait=60)
+    assert seqs(changes) == [start + 2, start + 3]
+    assert next_since == start + 3
+
+
+def test_old_gap_is_skipped(ctx):
+    start = latest_change_seq()
+    add_change(start + 3, age_seconds=120) # start + 1、start + 2 视为已回滚
+    add_change(start + 4)
+    skipped = []
+    changes, next_since, has_more, reset = read_changes(start, gap_wait=60, skipped=skipped)
+    assert seqs(changes) == [start + 3, start + 4]
+    assert (next_since, has_more, reset) == (start + 4, False, False)
+    assert skipped == [start + 1, start + 2]
+
+
+def test_trimmed_log_requests_reset(ctx):
+    start = latest_change_seq() + 1 # since 为 0 时从头读取, 不会判断清理; 先写入一条作为读取的起点
+    for seq in range(start, start + 5):
+        add_change(seq)
+    # 清理掉 start + 2 及之前的日志, 停在 start 之后的消费者已无法增量追上
+    db.session.execute(delete(POIChange).where(POIChange.id <= start + 2))
+    db.session.commit()
+    assert db.session.scalar(select(func.min(POIChange.id))) == start + 3
+
+    assert read_changes(start) == ([], start + 4, False, True)
+    assert read_changes(start + 1) == ([], start + 4, False, True)
+    changes, next_since, _, reset = read_changes(start + 2) # 恰好停在清理的边界上, 仍可增量读取
+    assert seqs(changes) == [start + 3, start + 4]
+    assert (next_since, reset) == (start + 4, False)
@@ -0,0 +1,33 @@
+import pytest
+
+from poi_api.errors import BusinessException
+from poi_api.resources.poi import _decode_cursor, _encode_cursor
+
+
+@pytest.mark.parametrize('name,poi_id', [
+    ('故宫博物院', 1),
+    ('', 0),
+    ('Beijing "Zoo", 北京', 2 ** 40),
+    ('a' * 300, 12345),
+    ('=+/?&', 7),
+])
+def test_cursor_round_trip(name, poi_id):
+    cursor = _encode_cursor(name, poi_id)
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor # 可以直接放在查询参数中
+    assert _decode_cursor(cursor) == (name, poi_id)
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not-base64!!',
+    _encode_cursor('x', 1)[:-3],
+    'WyJ4Il0', # ["x"]
+    'WyJ4IiwiMSJd', # ["x","1"]
+    'WzEsMV0', # [1,1]
+    '__8',
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(BusinessException) as excinfo:
+        _decode_cursor(cursor)
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.error_code == 'QUERY_INVALID_CURSOR'
@@ -0,0 +1,121 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from poi_api.serializers import POI_OUTPUT_FIELDS
+from poi_api.snapshot import (COLUMN_KINDS, SNAPSHOT_FILE_ERRORS, ColumnSnapshot, open_snapshot_file,
+                              write_snapshot_file)
+
+
+def make_rows(n=300):
+    """按 POI_OUTPUT_FIELDS 的顺序生成 id 升序的行, 字符串与布尔列带有空值"""
+    rng = np.random.default_rng(42)
+    base = datetime.datetime(2024, 1, 1)
+    provinces = ['北京市', '上海市', '浙江省', None]
+    rows = []
+    for i in range(1, n + 1):
+        values = {
+            'id': i * 3,
+            'name': f"景区{rng.integers(0, 50)}号",
+            'latitude': float(rng.uniform(18, 53)),
+            'longitude': float(rng.uniform(73, 135)),
+            'province': provinces[i % 4],
+            'has_image': [True, False, None][i % 3],
+            'created_on': base + datetime.timedelta(minutes=i),
+            'updated_on': base + datetime.timedelta(minutes=2 * i),
+            'version': i % 5 + 1,
+        }
+        row = []
+        for name in POI_OUTPUT_FIELDS:
+            if name in values:
+                row.append(values[name])
+            elif COLUMN_KINDS[name] == 'str':
+                row.append(None if i % 7 == 0 else f"{name}-{i % 11}")
+            elif COLUMN_KINDS[name] == 'bool':
+                row.append(i % 2 == 0)
+            elif COLUMN_KINDS[name] == 'datetime':
+                row.append(base)
+            elif COLUMN_KINDS[name] == 'int':
+                row.append(i)
+            else:
+                row.append(float(i))
+        rows.append(tuple(row))
+    return rows
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    return ColumnSnapshot.from_rows(make_rows(), grid_cell_deg=0.5, change_seq=17)
+
+
+def test_snapshot_file_round_trip(snapshot, tmp_path):
+    path = str(tmp_path / 'pois.snapshot')
+    write_snapshot_file(snapshot, path)
+    loaded, file_id = open_snapshot_file(path)
+
+    assert len(loaded) == len(snapshot)
+    assert loaded.change_seq == 17
+    assert file_id[-1] == (tmp_path / 'pois.snapshot').stat().st_size
+    for name in COLUMN_KINDS:
+        np.testing.assert_array_equal(loaded.columns[name], snapshot.columns[name])
+    for name, table in snapshot.dictionaries.items():
+        assert list(loaded.dictionaries[name]) == table
+    np.testing.assert_array_equal(loaded.name_order, snapshot.name_order)
+    assert loaded.grid[0] == snapshot.grid[0]
+    for loaded_part, part in zip(loaded.grid[1:], snapshot.grid[1:]):
+        np.testing.assert_array_equal(loaded_part, part)
+    positions = np.arange(len(snapshot))
+    assert loaded.rows(positions) == snapshot.rows(positions)
+
+
+def test_snapshot_file_queries_match(snapshot, tmp_path):
+    path = str(tmp_path / 'pois.snapshot')
+    write_snapshot_file(snapshot, path)
+    loaded, _ = open_snapshot_file(path)
+
+    bbox = (100.0, 25.0, 120.0, 40.0)
+    inside, _ = loaded.match(bbox=bbox)
+    assert inside.any()
+    np.testing.assert_array_equal(inside, snapshot.match(bbox=bbox)[0])
+    mask = loaded.equals('province', '北京市')
+    np.testing.assert_array_equal(mask, snapshot.equals('province', '北京市'))
+    after = (snapshot.name_at(snapshot.name_order[10]), int(snapshot.ids[snapshot.name_order[10]]))
+    np.testing.assert_array_equal(loaded.name_sorted(mask, after), snapshot.name_sorted(mask, after))
+
+
+def test_snapshot_file_replaces_existing(snapshot, tmp_path):
+    path = str(tmp_path / 'pois.snapshot')
+    write_snapshot_file(ColumnSnapshot.from_rows(make_rows(5)), path)
+    old, old_id = open_snapshot_file(path)
+    write_snapshot_file(snapshot, path)
+    new, new_id = open_snapshot_file(path)
+    assert len(old) == 5 and old.rows([0]) == ColumnSnapshot.from_rows(make_rows(5)).rows([0]) # 旧映射仍然可读
+    assert len(new) == len(snapshot)
+    assert new_id != old_id
+    assert list(tmp_path.iterdir()) == [tmp_path / 'pois.snapshot'] # 临时文件已被替换掉
+
+
+def test_empty_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'empty.snapshot')
+    write_snapshot_file(ColumnSnapshot.from_rows([]), path)
+    loaded, _ = open_snapshot_file(path)
+    assert len(loaded) == 0
+    assert len(loaded.match(bbox=(-180, -90, 180, 90))[0]) == 0
+
+
+@pytest.mark.parametrize('keep', [0, 5, 12, 40, 0.5, 0.9])
+def test_truncated_snapshot_file(snapshot, tmp_path, keep):
+    path = tmp_path / 'pois.snapshot'
+    write_snapshot_file(snapshot, str(path))
+    data = path.read_bytes()
+    path.write_bytes(data[:int(len(data) * keep) if isinstance(keep, float) else keep])
+    with pytest.raises(SNAPSHOT_FILE_ERRORS):
+        open_snapshot_file(str(path))
+
+
+def test_foreign_file_rejected(tmp_path):
+    path = tmp_path / 'pois.snapshot'
+    path.write_bytes(b'not a snapshot file at all' * 10)
+    with pytest.raises(ValueError):
+        open_snapshot_file(str(path))
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from poi_api.spatial import SpatialGridIndex, haversine_km
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = np.random.default_rng(20240601)
+    lons = rng.uniform(73.0, 135.0, 3000)
+    lats = rng.uniform(18.0, 53.0, 3000)
+    lons[:200] = rng.normal(116.4, 0.05, 200) # 一个密集的城市区域
+    lats[:200] = rng.normal(39.9, 0.05, 200)
+    return np.arange(1, 3001), lons, lats
+
+
+@pytest.fixture(scope='module')
+def index(points):
+    ids, lons, lats = points
+    index = SpatialGridIndex(cell_size=0.25)
+    index.rebuild(zip(ids.tolist(), lons.tolist(), lats.tolist()))
+    return index
+
+
+def brute_nearest(points, lat, lon, k, max_km=None):
+    ids, lons, lats = points
+    dists = haversine_km(lat, lon, lats, lons)
+    order = np.argsort(dists, kind='stable')
+    if max_km is not None:
+        order = order[dists[order] <= max_km]
+    return ids[order[:k]], dists[order[:k]]
+
+
+@pytest.mark.parametrize('bbox', [
+    (116.3, 39.8, 116.5, 40.0),
+    (100.0, 20.0, 110.5, 30.25),
+    (73.0, 18.0, 135.0, 53.0),
+    (60.0, 0.0, 70.0, 10.0),
+])
+def test_query_bbox_matches_linear_scan(index, points, bbox):
+    ids, lons, lats = points
+    min_lon, min_lat, max_lon, max_lat = bbox
+    inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+    found_ids, found_lons, found_lats = index.query_bbox(*bbox)
+    assert sorted(found_ids.tolist()) == ids[inside].tolist()
+    assert ((found_lons >= min_lon) & (found_lons <= max_lon)).all()
+    assert ((found_lats >= min_lat) & (found_lats <= max_lat)).all()
+
+
+@pytest.mark.parametrize('lat,lon', [(39.9, 116.4), (30.0, 100.0), (52.9, 134.9), (0.0, 0.0)])
+def test_nearest_matches_brute_force(index, points, lat, lon):
+    expected_ids, expected_dists = brute_nearest(points, lat, lon, 20)
+    found = []
+    for poi_id, dist in index.nearest(lat, lon):
+        found.append((poi_id, dist))
+        if len(found) == 20:
+            break
+    assert [poi_id for poi_id, _ in found] == expected_ids.tolist()
+    np.testing.assert_allclose([dist for _, dist in found], expected_dists)
+
+
+def test_nearest_respects_max_km(index, points):
+    expected_ids, _ = brute_nearest(points, 39.9, 116.4, 10 ** 6, max_km=5)
+    found = list(index.nearest(39.9, 116.4, max_km=5))
+    assert [poi_id for poi_id, _ in found] == expected_ids.tolist()
+    assert all(dist <= 5 for _, dist in found)
+
+
+def test_nearest_follows_upsert_and_remove(points):
+    ids, lons, lats = points
+    index = SpatialGridIndex(cell_size=0.25)
+    index.rebuild(zip(ids.tolist(), lons.tolist(), lats.tolist()))
+    index.upsert(99999, 10.0, 10.0)
+    assert next(index.nearest(10.0, 10.0))[0] == 99999
+    index.upsert(99999, 120.0, 30.0) # 移动后旧位置不再命中
+    assert next(index.nearest(10.0, 10.0))[0] != 99999
+    assert next(index.nearest(30.0, 120.0))[0] == 99999
+    index.remove(99999)
+    assert index.point(99999) is None
+    assert next(index.nearest(30.0, 120.0))[0] != 99999
+
+
+def test_nearest_batch_matches_brute_force(index, points):
+    rng = np.random.default_rng(7)
+    q_lats = rng.uniform(15.0, 55.0, 50)
+    q_lons = rng.uniform(70.0, 140.0, 50)
+    found_ids, found_dists = index.nearest_batch(q_lats, q_lons, k=5)
+    assert found_ids.shape == found_dists.shape == (50, 5)
+    for row, (lat, lon) in enumerate(zip(q_lats, q_lons)):
+        expected_ids, expected_dists = brute_nearest(points, lat, lon, 5)
+        np.testing.assert_allclose(found_dists[row], expected_dists, rtol=1e-9, atol=1e-6)
+        assert found_ids[row].tolist() == expected_ids.tolist()
+
+
+def test_nearest_batch_pads_missing_neighbours(index, points):
+    found_ids, found_dists = index.nearest_batch([39.9, 0.0], [116.4, 0.0], k=3, max_km=1)
+    expected_ids, _ = brute_nearest(points, 39.9, 116.4, 3, max_km=1)
+    n = len(expected_ids)
+    assert found_ids[0, :n].tolist() == expected_ids.tolist()
+    assert (found_ids[0, n:] == -1).all() and np.isinf(found_dists[0, n:]).all()
+    assert (found_ids[1] == -1).all() and np.isinf(found_dists[1]).all()
+
+
+def test_empty_index():
+    index = SpatialGridIndex()
+    index.rebuild([])
+    assert list(index.nearest(39.9, 116.4)) == []
+    ids, dists = index.nearest_batch([39.9], [116.4], k=2)
+    assert (ids == -1).all() and np.isinf(dists).all()
+    assert len(index.query_bbox(-180, -90, 180, 90)[0]) == 0
@@ -0,0 +1,92 @@
+import pytest
+
+from poi_api.textindex import NGramIndex, PrefixSuggester, normalize_text
+
+NAMES = {
+    1: '故宫博物院',
+    2: '上海博物馆',
+    3: '博物馆之夜',
+    4: 'Beijing Zoo',
+    5: '北京动物园',
+    6: '杭州动物园',
+    7: '物博物',
+    8: '',
+}
+
+
+@pytest.fixture
+def ngram():
+    index = NGramIndex()
+    index.rebuild(NAMES.items())
+    return index
+
+
+def linear_search(names, fragment):
+    fragment = normalize_text(fragment)
+    return sorted(doc_id for doc_id, text in names.items() if text and fragment in normalize_text(text))
+
+
+@pytest.mark.parametrize('fragment', ['博物', '博物馆', '博物院', '物院', '园', '动物园', 'zoo', ' ZOO ', '不存在', '物馆之'])
+def test_ngram_search_matches_substring_scan(ngram, fragment):
+    assert ngram.search(fragment).tolist() == linear_search(NAMES, fragment)
+
+
+def test_ngram_search_checks_bigram_order(ngram):
+    # "物博物" 含有 "博物博" 的全部 bigram (博物、物博), 但并不包含该子串
+    assert ngram.search('博物博').tolist() == []
+    assert ngram.search('物博物').tolist() == [7]
+
+
+def test_ngram_empty_fragment(ngram):
+    assert ngram.search('').tolist() == []
+    assert ngram.search('   ').tolist() == []
+
+
+def test_ngram_upsert_and_remove(ngram):
+    ngram.upsert(2, '上海自然博物馆')
+    assert 2 in ngram.search('自然').tolist()
+    assert 2 not in ngram.search('上海博').tolist()
+    ngram.remove(1)
+    assert ngram.search('故宫').tolist() == []
+    names = {**NAMES, 2: '上海自然博物馆'}
+    del names[1]
+    assert ngram.search('博物').tolist() == linear_search(names, '博物')
+
+
+@pytest.fixture
+def suggester():
+    suggester = PrefixSuggester()
+    suggester.rebuild([
+        (1, '北京动物园', '4A', '北京市'),
+        (2, '北京欢乐谷', '4A', '北京市'),
+        (3, '北京故宫博物院', '5A', '北京市'),
+        (4, '北京植物园', None, '北京市'),
+        (5, '北海公园', '4A', '北京市'),
+        (6, '上海博物馆', '4A', '上海市'),
+        (7, '', '5A', '北京市'),
+    ])
+    return suggester
+
+
+def test_suggest_orders_by_grade_then_key(suggester):
+    assert [item['id'] for item in suggester.suggest('北京')] == [3, 1, 2, 4]
+    assert [item['id'] for item in suggester.suggest('北')] == [3, 1, 2, 5, 4]
+
+
+def test_suggest_limit_and_fields(suggester):
+    assert suggester.suggest('北', limit=2) == [
+        {'id': 3, 'name': '北京故宫博物院', 'category': '5A', 'province': '北京市'},
+        {'id': 1, 'name': '北京动物园', 'category': '4A', 'province': '北京市'},
+    ]
+    assert suggester.suggest('北', limit=0) == []
+    assert suggester.suggest('') == []
+    assert suggester.suggest('南京') == []
+
+
+def test_suggest_follows_upsert_and_remove(suggester):
+    suggester.upsert(6, '北京天文馆', '5A', '北京市')
+    assert [item['id'] for item in suggester.suggest('北京', limit=2)] == [6, 3]
+    assert suggester.suggest('上海') == []
+    suggester.remove(3)
+    assert [item['id'] for item in suggester.suggest('北京', limit=2)] == [6, 1]
+    assert suggester.describe([3, 6]) == {6: (0, {'id': 6, 'name': '北京天文馆', 'category': '5A', 'province': '北京市'})}
@@ -0,0 +1,126 @@
+import struct
+
+from poi_api.tiles import encode_point_layer
+
+
+def read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def read_fields(data):
+    """按 protobuf 线格式拆出 [(字段号, 值)], 长度前缀字段的值为 bytes"""
+    fields, pos = [], 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        else:
+            raise AssertionError(f"unexpected wire type {wire_type}")
+        fields.append((field, value))
+    return fields
+
+
+def read_packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_value(data):
+    (field, value), = read_fields(data)
+    if field == 1:
+        return value.decode('utf-8')
+    if field == 3:
+        return struct.unpack('<d', value)[0]
+    if field == 5:
+        return value
+    if field == 6:
+        return unzigzag(value)
+    if field == 7:
+        return bool(value)
+    raise AssertionError(f"unexpected value field {field}")
+
+
+def decode_tile(data):
+    """解码只含点要素的瓦片, 返回 {图层名: 图层 dict}"""
+    layers = {}
+    for field, layer_bytes in read_fields(data):
+        assert field == 3
+        layer = {'features': [], 'keys': [], 'values': []}
+        for f, value in read_fields(layer_bytes):
+            if f == 15:
+                layer['version'] = value
+            elif f == 1:
+                layer['name'] = value.decode('utf-8')
+            elif f == 2:
+                layer['features'].append(dict(read_fields(value)))
+            elif f == 3:
+                layer['keys'].append(value.decode('utf-8'))
+            elif f == 4:
+                layer['values'].append(decode_value(value))
+            elif f == 5:
+                layer['extent'] = value
+        layers[layer['name']] = layer
+    return layers
+
+
+def test_encode_point_layer():
+    features = [
+        (1, 10, 20, {'name': '故宫博物院', 'category': '5A', 'rank': 3, 'score': 4.5, 'open': True}),
+        (2, 4095, 0, {'name': '天坛公园', 'category': '5A', 'rank': -2, 'address': None}),
+        (300, 0, 4096, {}),
+    ]
+    layers = decode_tile(encode_point_layer('pois', features, extent=4096))
+    assert list(layers) == ['pois']
+    layer = layers['pois']
+    assert layer['version'] == 2
+    assert layer['extent'] == 4096
+    assert len(layer['features']) == 3
+    # 相同的键和值只编码一次
+    assert sorted(layer['keys']) == ['category', 'name', 'open', 'rank', 'score']
+    assert layer['values'].count('5A') == 1
+
+    decoded = []
+    for feature in layer['features']:
+        assert feature[3] == 1 # POINT
+        command, x, y = read_packed(feature[4])
+        assert command == 9 # MoveTo, 1 个点
+        tags = read_packed(feature.get(2, b''))
+        properties = {layer['keys'][k]: layer['values'][v] for k, v in zip(tags[::2], tags[1::2])}
+        decoded.append((feature[1], unzigzag(x), unzigzag(y), properties))
+    assert decoded == [
+        (1, 10, 20, {'name': '故宫博物院', 'category': '5A', 'rank': 3, 'score': 4.5, 'open': True}),
+        (2, 4095, 0, {'name': '天坛公园', 'category': '5A', 'rank': -2}),
+        (300, 0, 4096, {}),
+    ]
+
+
+def test_encode_point_layer_keeps_value_types_apart():
+    features = [(1, 0, 0, {'a': 1}), (2, 0, 0, {'a': True}), (3, 0, 0, {'a': 1.0}), (4, 0, 0, {'a': '1'})]
+    layer = decode_tile(encode_point_layer('pois', features))['pois']
+    values = layer['values']
+    assert len(values) == 4
+    assert [type(v) for v in values] == [int, bool, float, str]
+
+
+def test_encode_point_layer_empty():
+    assert encode_point_layer('pois', []) == b''
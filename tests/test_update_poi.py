@@ -0,0 +1,76 @@
+import pytest
+
+from poi_api.changes import latest_change_seq
+from poi_api.extensions import db, name_index, spatial_index
+from poi_api.models import POI
+
+
+@pytest.fixture
+def poi_id(app):
+    with app.app_context():
+        poi = POI(name='测试景区', latitude=35.0, longitude=110.0, province='山西省', category='3A')
+        db.session.add(poi)
+        db.session.commit()
+        return poi.id
+
+
+def load(app, poi_id):
+    with app.app_context():
+        poi = db.session.get(POI, poi_id)
+        return poi.version, poi.name, poi.updated_on
+
+
+def test_patch_with_matching_etag(app, client, admin_headers, poi_id):
+    response = client.patch(f'/api/v1/pois/{poi_id}', json={'name': '测试景区新名'},
+                            headers={**admin_headers, 'If-Match': f'"poi-{poi_id}-v1"'})
+    assert response.status_code == 200, response.get_json()
+    assert response.headers['ETag'] == f'"poi-{poi_id}-v2"'
+    body = response.get_json()
+    assert body['message'] == 'POI更新成功'
+    assert body['poi']['name'] == '测试景区新名' and body['poi']['version'] == 2
+    assert load(app, poi_id)[:2] == (2, '测试景区新名')
+    assert poi_id in name_index.search('新名').tolist()
+
+
+def test_patch_with_stale_etag_returns_412(app, client, admin_headers, poi_id):
+    client.patch(f'/api/v1/pois/{poi_id}', json={'name': '第一次修改'}, headers=admin_headers)
+    before = load(app, poi_id)
+    with app.app_context():
+        seq = latest_change_seq()
+
+    response = client.patch(f'/api/v1/pois/{poi_id}', json={'name': '第二次修改', 'latitude': 36.0},
+                            headers={**admin_headers, 'If-Match': f'"poi-{poi_id}-v1"'})
+    assert response.status_code == 412
+    assert response.get_json()['error_code'] == 'POI_VERSION_MISMATCH'
+    assert load(app, poi_id) == before
+    assert spatial_index.point(poi_id) == (110.0, 35.0)
+    with app.app_context():
+        assert latest_change_seq() == seq
+
+
+def test_patch_with_wildcard_etag(client, admin_headers, poi_id):
+    response = client.patch(f'/api/v1/pois/{poi_id}', json={'category': '4A'},
+                            headers={**admin_headers, 'If-Match': '*'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"poi-{poi_id}-v2"'
+
+
+def test_patch_without_changes_does_not_write(app, client, admin_headers, poi_id):
+    before = load(app, poi_id)
+    with app.app_context():
+        seq = latest_change_seq()
+
+    response = client.patch(f'/api/v1/pois/{poi_id}', json={'name': '测试景区', 'latitude': 35.0},
+                            headers={**admin_headers, 'If-Match': f'"poi-{poi_id}-v1"'})
+    assert response.status_code == 200
+    assert response.get_json()['message'] == 'POI没有变化'
+    assert response.headers['ETag'] == f'"poi-{poi_id}-v1"'
+    assert load(app, poi_id) == before # 版本号与更新时间都不变
+    with app.app_context():
+        assert latest_change_seq() == seq # 没有写变更日志
+
+
+def test_patch_missing_poi(client, admin_headers):
+    response = client.patch('/api/v1/pois/99999999', json={'name': 'x'}, headers=admin_headers)
+    assert response.status_code == 404
+    assert response.get_json()['error_code'] == 'POI_NOT_FOUND'